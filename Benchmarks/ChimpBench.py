@@ -0,0 +1,105 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Scripts'))
+from ChimpTest import ChimpTest  # noqa: E402
+from DetectionKernels import warm_up  # noqa: E402
+from GlyphMatcher import SEED_DIGITS, seed_bitmap  # noqa: E402
+from InputBackend import RecordingInput  # noqa: E402
+
+# Board reading speed and accuracy of the Chimp Test solver on synthetic boards:
+# the 8 x 5 square grid of the real page on the blue background, squares with a
+# half-white border and white numbers. Nothing is clicked.
+
+BACKGROUND = (0x2b, 0x87, 0xd1)
+BORDER = (0x95, 0xc3, 0xe8)  # 50% white over the background
+
+
+class FakeCapture:
+    def grab(self, region):
+        raise RuntimeError("The benchmark feeds frames to read_board directly")
+
+
+def scaled_glyph(digit: str, height: int) -> np.ndarray:
+    """Seed digit scaled to the given height (nearest neighbour)."""
+    bitmap = seed_bitmap(digit)
+    scale = height / bitmap.shape[0]
+    ys = (np.arange(height) / scale).astype(int)
+    xs = (np.arange(int(round(bitmap.shape[1] * scale))) / scale).astype(int)
+    return bitmap[ys[:, None], xs[None, :]]
+
+
+def synthetic_board(rng, count: int, cell: int = 96, square: int = 80, digit_height: int = 34):
+    """Frame with count numbered squares on random cells, plus the expected (number, x, y)."""
+    cols, rows = 8, 5
+    margin = 60
+    frame = np.empty((rows * cell + 2 * margin, cols * cell + 2 * margin, 4), dtype=np.uint8)
+    frame[...] = (BACKGROUND[2], BACKGROUND[1], BACKGROUND[0], 255)
+    cells = rng.choice(cols * rows, size=count, replace=False)
+    expected = []
+    for number, index in enumerate(cells, start=1):
+        top = margin + (index // cols) * cell + (cell - square) // 2
+        left = margin + (index % cols) * cell + (cell - square) // 2
+        frame[top:top + square, left:left + square, :3] = BORDER[::-1]
+        frame[top + 3:top + square - 3, left + 3:left + square - 3, :3] = BACKGROUND[::-1]
+
+        glyphs = [scaled_glyph(d, digit_height) for d in str(number)]
+        spacing = digit_height // 6
+        total_width = sum(g.shape[1] for g in glyphs) + spacing * (len(glyphs) - 1)
+        x = left + (square - total_width) // 2
+        y = top + (square - digit_height) // 2
+        for glyph in glyphs:
+            region = frame[y:y + glyph.shape[0], x:x + glyph.shape[1]]
+            region[glyph] = (255, 255, 255, 255)
+            x += glyph.shape[1] + spacing
+        expected.append((number, left + square // 2, top + square // 2))
+    return frame, expected
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Chimp Test board reading benchmark on synthetic boards")
+    parser.add_argument("--boards", type=int, default=50, help="boards per square count")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--budget-ms", type=float, default=1000 / 60, help="detection budget (one frame at 60Hz)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    solver = ChimpTest(capture=FakeCapture(), input_backend=RecordingInput())
+    warm_up()
+    assert set(SEED_DIGITS) == set("0123456789")
+
+    print(f"{'squares':>8}{'correct':>10}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    failures = []
+    for count in (4, 10, 20, 30, 40):
+        times = []
+        correct = 0
+        for _ in range(args.boards):
+            frame, expected = synthetic_board(rng, count)
+            start = time.perf_counter()
+            numbers, _ = solver.read_board(frame)
+            times.append(time.perf_counter() - start)
+            if (solver.is_complete_level(numbers) and len(numbers) == count and
+                    all(abs(x - ex) <= 8 and abs(y - ey) <= 8 for (_, x, y), (_, ex, ey) in zip(numbers, expected))):
+                correct += 1
+        times_ms = np.array(times) * 1000
+        p50, p99 = np.percentile(times_ms, [50, 99])
+        print(f"{count:>8}{correct:>6}/{args.boards:<3}{p50:>9.2f}{p99:>9.2f}{times_ms.max():>9.2f}")
+        if p99 > args.budget_ms:
+            failures.append(f"{count} squares: p99 {p99:.2f}ms over the {args.budget_ms:.1f}ms budget")
+        if correct < args.boards:
+            failures.append(f"{count} squares: {args.boards - correct} of {args.boards} boards misread")
+
+    if failures:
+        print("\nFailures:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print(f"\nBudget {args.budget_ms:.1f}ms per board: met, every board read correctly")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+import argparse
+import ctypes
+import multiprocessing as mp
+import os
+import select
+import shutil
+import subprocess
+import sys
+import time
+from contextlib import nullcontext
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Scripts'))
+from InputBackend import UinputInput, XTestInput  # noqa: E402
+from X11Backend import XEvent, X11Display  # noqa: E402
+
+# Input dispatch latency of the Linux backends under Xvfb. A listener process
+# is an ordinary X client with a full-screen window that takes key and button
+# presses and stamps each one when it comes out of its event queue. The
+# benchmark injects bursts of clicks and key presses through each backend and
+# reports how long after the burst started its first and last event reached
+# the listener, plus what injecting one event costs the caller.
+#
+# uinput events go through the kernel to X input drivers, Xvfb has none, so
+# that backend only makes sense with --use-current-display on a real X server
+# (and needs write access to /dev/uinput).
+
+KEY_PRESS, BUTTON_PRESS = 2, 4  # X event types
+KEY_PRESS_MASK, BUTTON_PRESS_MASK = 1 << 0, 1 << 2
+REVERT_TO_PARENT, CURRENT_TIME = 2, 0
+KEYS = [ord(c) for c in "ASDFJKL"]  # Virtual-key codes typed in the key bursts
+
+
+def listener(conn) -> None:
+    """
+    Separate X client: a window over the whole screen with keyboard focus.
+    Receives (expected, timeout) per round and sends back [(event type, perf_counter)].
+    """
+    display = X11Display()
+    lib = display.lib
+    lib.XCreateSimpleWindow.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.c_int, ctypes.c_int,
+                                        ctypes.c_uint, ctypes.c_uint, ctypes.c_uint, ctypes.c_ulong, ctypes.c_ulong]
+    lib.XCreateSimpleWindow.restype = ctypes.c_ulong
+    lib.XMapWindow.argtypes = [ctypes.c_void_p, ctypes.c_ulong]
+    lib.XSelectInput.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.c_long]
+    lib.XSetInputFocus.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.c_int, ctypes.c_ulong]
+
+    window = lib.XCreateSimpleWindow(display.dpy, display.root, 0, 0, display.width, display.height, 0, 0, 0)
+    lib.XSelectInput(display.dpy, window, KEY_PRESS_MASK | BUTTON_PRESS_MASK)
+    lib.XMapWindow(display.dpy, window)
+    lib.XSync(display.dpy, 0)
+    time.sleep(0.5)
+    lib.XSetInputFocus(display.dpy, window, REVERT_TO_PARENT, CURRENT_TIME)
+    lib.XSync(display.dpy, 0)
+    conn.send("ready")
+
+    event = XEvent()
+    while True:
+        job = conn.recv()
+        if job is None:
+            break
+        expected, timeout = job
+        conn.send("armed")
+        stamps = []
+        deadline = time.perf_counter() + timeout
+        while len(stamps) < expected and time.perf_counter() < deadline:
+            if not lib.XPending(display.dpy):
+                select.select([display.fd], [], [], 0.05)  # Sleep until the server writes, like a toolkit loop
+                continue
+            lib.XNextEvent(display.dpy, ctypes.byref(event))
+            now = time.perf_counter()
+            if event.type in (KEY_PRESS, BUTTON_PRESS):
+                stamps.append((event.type, now))
+        conn.send(stamps)
+    display.close()
+
+
+def inject(backend, kind: str, bursts: int, burst: int, gap: float, batched: bool, size) -> tuple:
+    """
+    Bursts of clicks or key presses. Returns (start of each burst, seconds spent inside the backend calls).
+    """
+    width, height = size
+    starts, busy = [], 0.0
+    for i in range(bursts):
+        time.sleep(gap)
+        start = time.perf_counter()
+        with backend.batch() if batched else nullcontext():
+            for j in range(burst):
+                if kind == "click":
+                    backend.click(width // 4 + (i * burst + j) * 7 % (width // 2), height // 2)
+                else:
+                    backend.key_press(KEYS[j % len(KEYS)])
+        busy += time.perf_counter() - start
+        starts.append(start)
+    return starts, busy
+
+
+def run_round(conn, backend, kind: str, batched: bool, args, size) -> dict:
+    expected = args.bursts * args.burst
+    conn.send((expected, args.bursts * (args.gap + 0.5) + 5.0))
+    conn.recv()
+    starts, busy = inject(backend, kind, args.bursts, args.burst, args.gap, batched, size)
+    wanted = BUTTON_PRESS if kind == "click" else KEY_PRESS
+    received = [t for event_type, t in conn.recv() if event_type == wanted]
+
+    first, last = [], []
+    for i, start in enumerate(starts):
+        stamps = received[i * args.burst:(i + 1) * args.burst]
+        if len(stamps) == args.burst:
+            first.append(stamps[0] - start)
+            last.append(stamps[-1] - start)
+    stats = {"received": len(received), "expected": expected, "inject_us": busy / expected * 1e6}
+    if first:
+        stats["first_p50"], stats["first_p99"] = np.percentile(np.array(first) * 1000, [50, 99])
+        stats["last_p50"], stats["last_p99"] = np.percentile(np.array(last) * 1000, [50, 99])
+    return stats
+
+
+def start_xvfb(display: str) -> subprocess.Popen:
+    if shutil.which("Xvfb") is None:
+        sys.exit("Xvfb not found (install the xvfb package)")
+    proc = subprocess.Popen(["Xvfb", display, "-screen", "0", "1280x720x24", "-nolisten", "tcp"],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.environ["DISPLAY"] = display
+    time.sleep(1.0)
+    return proc
+
+
+def open_backend(name: str, size):
+    if name == "uinput":
+        return UinputInput(*size)
+    return XTestInput()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Linux input backend dispatch latency, measured by an X client")
+    parser.add_argument("--backends", default="xtest,xtest-batch",
+                        help="comma separated: xtest, xtest-batch, uinput, uinput-batch")
+    parser.add_argument("--bursts", type=int, default=50, help="bursts per backend and event kind")
+    parser.add_argument("--burst", type=int, default=5, help="events per burst")
+    parser.add_argument("--gap", type=float, default=0.05, help="seconds between bursts")
+    parser.add_argument("--display", default=":97", help="display number for the private Xvfb")
+    parser.add_argument("--use-current-display", action="store_true", help="use $DISPLAY instead of starting Xvfb")
+    args = parser.parse_args()
+
+    xvfb = None if args.use_current_display else start_xvfb(args.display)
+    rows = []
+    try:
+        screen = X11Display()
+        size = (screen.width, screen.height)
+        screen.close()
+        parent, child = mp.Pipe()
+        proc = mp.Process(target=listener, args=(child,), daemon=True)
+        proc.start()
+        parent.recv()
+        try:
+            for name in args.backends.split(","):
+                try:
+                    backend = open_backend(name.removesuffix("-batch"), size)
+                except OSError as e:
+                    print(f"{name}: unavailable ({e})")
+                    continue
+                try:
+                    for kind in ("click", "key"):
+                        rows.append((name, kind, run_round(parent, backend, kind, name.endswith("-batch"), args, size)))
+                finally:
+                    backend.close()
+        finally:
+            parent.send(None)
+            proc.join(timeout=5)
+    finally:
+        if xvfb is not None:
+            xvfb.terminate()
+
+    print(f"{'backend':<14}{'kind':<7}{'received':>10}{'first p50':>11}{'p99':>8}{'last p50':>10}{'p99':>8}"
+          f"{'us/event':>10}")
+    for name, kind, s in rows:
+        if "first_p50" in s:
+            latency = f"{s['first_p50']:>9.3f}ms{s['first_p99']:>6.3f}ms{s['last_p50']:>8.3f}ms{s['last_p99']:>6.3f}ms"
+        else:
+            latency = f"{'-':>11}{'-':>8}{'-':>10}{'-':>8}"
+        print(f"{name:<14}{kind:<7}{s['received']:>5}/{s['expected']:<4}{latency}{s['inject_us']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
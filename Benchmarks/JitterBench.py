@@ -0,0 +1,70 @@
+import argparse
+import multiprocessing as mp
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Scripts'))
+from PerfMode import JitterRecorder, NullPerformanceMode, PerformanceMode  # noqa: E402
+
+# Per-iteration jitter of a synthetic detection spin loop, with and without performance mode.
+# The loop body mimics AimTrainer.scan_and_click: grid-sample a BGRA frame and compare colours,
+# allocating a little garbage every iteration like the real loop does.
+
+
+def background_load(stop) -> None:
+    while not stop.is_set():
+        sum(i * i for i in range(10_000))
+
+
+def spin(duration: float, perf_mode) -> dict:
+    frame = np.random.randint(0, 255, (600, 1200, 4), dtype=np.uint8)
+    target = np.array([0xe8, 0xc3, 0x95], dtype=np.int16)  # #95c3e8 as BGR
+    jitter = JitterRecorder()
+    iterations = 0
+    with perf_mode:
+        end = time.perf_counter() + duration
+        while time.perf_counter() < end:
+            jitter.tick()
+            samples = frame[::53, ::53, :3].astype(np.int16)
+            hits = np.argwhere(np.all(np.abs(samples - target) <= 10, axis=-1))
+            garbage = [(int(y), int(x), time.time()) for y, x in hits]  # like recent_clicks churn
+            del garbage
+            iterations += 1
+            if iterations % 5000 == 0:
+                perf_mode.checkpoint()
+    return jitter.summary()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Busy-loop jitter with and without performance mode")
+    parser.add_argument("--seconds", type=float, default=3.0, help="run time per mode")
+    parser.add_argument("--cores", default="", help="comma separated cores to pin to in performance mode")
+    parser.add_argument("--load", type=int, default=os.cpu_count() or 1, help="background busy processes")
+    args = parser.parse_args()
+    cores = [int(c) for c in args.cores.split(",") if c.strip()] or None
+
+    stop = mp.Event()
+    workers = [mp.Process(target=background_load, args=(stop,), daemon=True) for _ in range(args.load)]
+    for worker in workers:
+        worker.start()
+    try:
+        results = {
+            "normal": spin(args.seconds, NullPerformanceMode()),
+            "performance": spin(args.seconds, PerformanceMode(cores=cores)),
+        }
+    finally:
+        stop.set()
+        for worker in workers:
+            worker.join(timeout=2)
+
+    print(f"\n{'mode':<13}{'iters':>9}{'p50 us':>10}{'p90 us':>10}{'p99 us':>10}{'p99.9 us':>10}{'max us':>11}")
+    for mode, r in results.items():
+        print(f"{mode:<13}{r['iterations']:>9}{r['p50_us']:>10.1f}{r['p90_us']:>10.1f}"
+              f"{r['p99_us']:>10.1f}{r['p99.9_us']:>10.1f}{r['max_us']:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
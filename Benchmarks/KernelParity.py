@@ -0,0 +1,138 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Scripts'))
+import DetectionKernels as K  # noqa: E402
+
+# Checks that the numba kernels give exactly the NumPy results on synthetic
+# frames, then times both. Exits with status 1 on any mismatch.
+
+TARGET = (0x95, 0xc3, 0xe8)  # AimTrainer target colour
+GAP = (0x2b, 0x87, 0xd1)  # CubeGridCounter gap colour
+PALETTE = np.array([(0xce, 0x26, 0x36), (0x4b, 0xdb, 0x6a), GAP], dtype=np.int32)  # ReactionTime screens
+
+
+def synthetic_aim_frame(rng, height: int = 600, width: int = 1200, targets: int = 5) -> np.ndarray:
+    frame = np.empty((height, width, 4), dtype=np.uint8)
+    frame[...] = (GAP[2], GAP[1], GAP[0], 255)
+    yy, xx = np.mgrid[0:height, 0:width]
+    for _ in range(targets):
+        cy, cx, radius = rng.integers(40, height - 40), rng.integers(40, width - 40), rng.integers(20, 80)
+        disc = (yy - cy) ** 2 + (xx - cx) ** 2 <= radius ** 2
+        # Slightly off-target shades so the tolerance boundary gets exercised
+        shade = rng.integers(-12, 13, size=3)
+        frame[disc, :3] = np.clip(np.array(TARGET[::-1]) + shade, 0, 255)
+    return frame
+
+
+def synthetic_scan_line(rng, length: int = 800) -> np.ndarray:
+    line = np.empty((length, 4), dtype=np.uint8)
+    line[:] = (0xc1, 0x73, 0x25, 255)  # Cube colour
+    position = 0
+    while position < length:
+        position += rng.integers(20, 120)
+        gap = rng.integers(1, 12)
+        line[position:position + gap, :3] = np.array(GAP[::-1]) + rng.integers(-6, 7, size=3)
+        position += gap
+    return line
+
+
+def check_parity(cases: int, seed: int) -> int:
+    rng = np.random.default_rng(seed)
+    failures = 0
+    for case in range(cases):
+        frame = synthetic_aim_frame(rng)
+        noise = rng.integers(0, 256, size=(97, 131, 4), dtype=np.uint8)
+        for img in (frame, noise, frame[13:411, 7:903]):  # Includes a non-contiguous view
+            for step in (1, 7, 53):
+                a = K.grid_color_hits_numpy(img, step, TARGET, 10)
+                b = K.grid_color_hits_numba(img, step, TARGET, 10)
+                if not np.array_equal(a, b):
+                    print(f"grid_color_hits mismatch (case {case}, step {step})")
+                    failures += 1
+                rows = np.ascontiguousarray(img[::step])  # What a strip capture returns
+                for compact in (rows, img[::step]):
+                    if not (np.array_equal(a, K.grid_color_hits_numpy(compact, step, TARGET, 10, compact=True)) and
+                            np.array_equal(a, K.grid_color_hits_numba(compact, step, TARGET, 10, compact=True))):
+                        print(f"grid_color_hits compact rows mismatch (case {case}, step {step})")
+                        failures += 1
+            if not np.array_equal(K.white_mask_numpy(img, 240), K.white_mask_numba(img, 240)):
+                print(f"white_mask mismatch (case {case})")
+                failures += 1
+            if not np.array_equal(K.off_color_mask_numpy(img, GAP, 60), K.off_color_mask_numba(img, GAP, 60)):
+                print(f"off_color_mask mismatch (case {case})")
+                failures += 1
+
+        for _ in range(20):
+            patch = np.empty((64, 4), dtype=np.uint8)
+            patch[:, :3] = PALETTE[rng.integers(len(PALETTE)), ::-1] + rng.integers(-40, 41, size=(64, 3))
+            patch[rng.random(64) < rng.random()] = rng.integers(0, 256, size=4, dtype=np.uint8)  # Cursor / artefacts
+            for tolerance, quorum in ((30, 33), (30, 10), (200, 33)):  # 200: colours overlap
+                a = K.majority_color_numpy(patch, PALETTE, tolerance, quorum)
+                b = K.majority_color_numba(patch, PALETTE, tolerance, quorum)
+                if a != b:
+                    print(f"majority_color mismatch (case {case}): {a} != {b}")
+                    failures += 1
+
+        line = synthetic_scan_line(rng)
+        for candidate in (line, frame[:, rng.integers(0, frame.shape[1])]):
+            a = K.count_color_runs_numpy(candidate, GAP, 5)
+            b = K.count_color_runs_numba(candidate, GAP, 5)
+            if a != b:
+                print(f"count_color_runs mismatch (case {case}): {a} != {b}")
+                failures += 1
+    return failures
+
+
+def time_call(fn, *args, repeat: int = 200) -> float:
+    fn(*args)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(*args)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def benchmark(seed: int) -> None:
+    rng = np.random.default_rng(seed)
+    frame = synthetic_aim_frame(rng, 1080, 1920)
+    line = synthetic_scan_line(rng)
+    cubes = frame[::97, ::97].reshape(-1, 4)
+    patch = frame[500:508, 900:908].reshape(-1, 4)
+    rows = [
+        ("grid_color_hits step 53", K.grid_color_hits_numpy, K.grid_color_hits_numba, (frame, 53, TARGET, 10)),
+        ("grid_color_hits step 5", K.grid_color_hits_numpy, K.grid_color_hits_numba, (frame, 5, TARGET, 10)),
+        ("count_color_runs 800px", K.count_color_runs_numpy, K.count_color_runs_numba, (line, GAP, 5)),
+        ("white_mask 240 pixels", K.white_mask_numpy, K.white_mask_numba, (cubes, 240)),
+        ("off_color_mask 1080p", K.off_color_mask_numpy, K.off_color_mask_numba, (frame, GAP, 60)),
+        ("majority_color 8x8", K.majority_color_numpy, K.majority_color_numba, (patch, PALETTE, 30, 33)),
+    ]
+    print(f"\n{'kernel':<26}{'numpy us':>10}{'numba us':>10}{'speedup':>9}")
+    for name, numpy_fn, numba_fn, args in rows:
+        t_numpy = time_call(numpy_fn, *args)
+        t_numba = time_call(numba_fn, *args)
+        print(f"{name:<26}{t_numpy:>10.1f}{t_numba:>10.1f}{t_numpy / t_numba:>8.1f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Parity and speed of the numba vs NumPy detection kernels")
+    parser.add_argument("--cases", type=int, default=20, help="random synthetic frames to compare")
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args()
+
+    if not K.USING_NUMBA:
+        print("numba is not installed, only the NumPy kernels are available - nothing to compare")
+        return
+
+    failures = check_parity(args.cases, args.seed)
+    print(f"Parity: {'OK' if failures == 0 else f'{failures} mismatches'} over {args.cases} cases")
+    benchmark(args.seed)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
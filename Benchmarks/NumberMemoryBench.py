@@ -0,0 +1,63 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Scripts'))
+from InputBackend import RecordingInput  # noqa: E402
+from NumberMemory import NumberMemory  # noqa: E402
+from DetectionKernels import warm_up  # noqa: E402
+from ChimpBench import BACKGROUND, FakeCapture, scaled_glyph  # noqa: E402
+
+# Number reading speed and accuracy of the Number Memory solver on synthetic
+# frames: a big white number over a thin timer bar on the blue background.
+
+
+def synthetic_number(rng, digits: int, digit_height: int = 60, width: int = 1600, height: int = 500):
+    frame = np.empty((height, width, 4), dtype=np.uint8)
+    frame[...] = (BACKGROUND[2], BACKGROUND[1], BACKGROUND[0], 255)
+    text = "".join(str(d) for d in rng.integers(0, 10, size=digits))
+    if text[0] == "0":
+        text = "1" + text[1:]
+    glyphs = [scaled_glyph(d, digit_height) for d in text]
+    spacing = digit_height // 8
+    total_width = sum(g.shape[1] for g in glyphs) + spacing * (len(glyphs) - 1)
+    x = (width - total_width) // 2
+    y = height // 2 - digit_height
+    for glyph in glyphs:
+        region = frame[y:y + glyph.shape[0], x:x + glyph.shape[1]]
+        region[glyph] = (255, 255, 255, 255)
+        x += glyph.shape[1] + spacing
+    bar_top = y + digit_height + 40
+    frame[bar_top:bar_top + 8, width // 3:2 * width // 3] = (255, 255, 255, 255)  # Timer bar
+    return frame, text
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Number Memory reading benchmark on synthetic frames")
+    parser.add_argument("--frames", type=int, default=50, help="frames per number length")
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    solver = NumberMemory(capture=FakeCapture(), input_backend=RecordingInput())
+    warm_up()
+
+    print(f"{'digits':>7}{'correct':>10}{'p50 ms':>9}{'p99 ms':>9}")
+    for digits in (1, 5, 10, 20, 30):
+        times = []
+        correct = 0
+        for _ in range(args.frames):
+            frame, text = synthetic_number(rng, digits)
+            start = time.perf_counter()
+            read, _, _ = solver.read_number(frame)
+            times.append(time.perf_counter() - start)
+            correct += read == text
+        p50, p99 = np.percentile(np.array(times) * 1000, [50, 99])
+        print(f"{digits:>7}{correct:>6}/{args.frames:<3}{p50:>9.2f}{p99:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
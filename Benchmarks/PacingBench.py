@@ -0,0 +1,141 @@
+import argparse
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Scripts'))
+from AimTrainer import AimTrainer  # noqa: E402
+from RefreshPacer import RefreshPacer  # noqa: E402
+
+# Aim Trainer on a simulated display: the frame only changes on refresh
+# boundaries (every 1/hz seconds, on the perf_counter clock), a target stays
+# up until it's clicked and the next one appears on the following refresh,
+# like the real page. Runs the spinning loop and the refresh-paced loop for the
+# same time and compares CPU use and refresh-to-click latency.
+
+BACKGROUND = (0x2b, 0x87, 0xd1)
+TARGET = (0x95, 0xc3, 0xe8)
+
+
+class SimulatedDisplay:
+    """Capture and input backend in one: clicks on the target make the next one appear."""
+
+    def __init__(self, hz: float, area: tuple, radius: int = 60, seed: int = 5) -> None:
+        self.period = 1 / hz
+        self.t0 = time.perf_counter()
+        self.area = area
+        self.radius = radius
+        self.rng = np.random.default_rng(seed)
+        x1, y1, x2, y2 = area
+        self.frame = np.empty((y2 - y1, x2 - x1, 4), dtype=np.uint8)
+        self.frame[...] = (BACKGROUND[2], BACKGROUND[1], BACKGROUND[0], 255)
+        yy, xx = np.mgrid[-radius:radius + 1, -radius:radius + 1]
+        self.disc = yy ** 2 + xx ** 2 <= radius ** 2
+        self.drawn = None  # Target currently in the frame
+        self.shown_refresh = -1
+        self.target = None  # (x, y) on screen
+        self.target_due = 0  # Refresh index the next target appears on
+        self.target_shown_at = None  # Refresh time the current target appeared
+        self.latencies = []
+        self.dirty = True  # Redraw on the next refresh
+        self.cursor = (0, 0)
+
+    def refresh_index(self) -> int:
+        return math.floor((time.perf_counter() - self.t0) / self.period)
+
+    def grab(self, region: dict) -> np.ndarray:
+        index = self.refresh_index()
+        if index != self.shown_refresh:
+            self.shown_refresh = index
+            if self.target is None and index >= self.target_due:
+                x1, y1, x2, y2 = self.area
+                r = self.radius
+                self.target = (int(self.rng.integers(x1 + r, x2 - r)), int(self.rng.integers(y1 + r, y2 - r)))
+                self.target_shown_at = self.t0 + index * self.period
+                self.dirty = True
+            if self.dirty:
+                self.draw()
+                self.dirty = False
+        return self.frame
+
+    def box(self, target) -> np.ndarray:
+        x1, y1, _, _ = self.area
+        cx, cy, r = target[0] - x1, target[1] - y1, self.radius
+        return self.frame[cy - r:cy + r + 1, cx - r:cx + r + 1]
+
+    def draw(self) -> None:
+        # Only the target's box changes, a full redraw would cost more than the scan under test
+        if self.drawn is not None:
+            self.box(self.drawn)[...] = (BACKGROUND[2], BACKGROUND[1], BACKGROUND[0], 255)
+        if self.target is not None:
+            self.box(self.target)[self.disc, :3] = TARGET[::-1]
+        self.drawn = self.target
+
+    # Input backend
+    def cursor_pos(self):
+        return self.cursor
+
+    def move(self, x, y):
+        self.cursor = (x, y)
+
+    def click(self, x, y, hold=0.0):
+        self.cursor = (x, y)
+        if self.target is not None and (x - self.target[0]) ** 2 + (y - self.target[1]) ** 2 <= self.radius ** 2:
+            self.latencies.append(time.perf_counter() - self.target_shown_at)
+            self.target = None
+            self.target_due = self.refresh_index() + 1  # The next one is drawn on the next refresh
+            self.dirty = True
+
+
+def run(paced: bool, hz: float, seconds: float) -> dict:
+    area = (100, 100, 1300, 800)
+    display = SimulatedDisplay(hz, area)
+    trainer = AimTrainer(target_size=120, capture=display, input_backend=display)
+    trainer.scan_area = area
+    trainer.click_memory_duration = 0.0  # Each target is new, the duplicate guard isn't under test
+    trainer.verify_clicks = False  # Nor is hit verification, every click lands here
+    pacer = RefreshPacer(paced=paced, calibrate_time=0.5)
+
+    capture = trainer.capture
+    trainer.capture = pacer.watch(capture)
+    deadline = time.perf_counter() + seconds
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        while time.perf_counter() < deadline:
+            pacer.wait()
+            trainer.scan_and_click()
+            pacer.done()
+    finally:
+        sys.stdout = stdout
+        trainer.capture = capture
+
+    stats = pacer.summary()
+    latencies = np.array(display.latencies) * 1000
+    stats["targets"] = latencies.size
+    if latencies.size:
+        stats["click_p50_ms"], stats["click_p99_ms"] = np.percentile(latencies, [50, 99])
+    return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Spinning vs refresh-paced Aim Trainer loop on a simulated display")
+    parser.add_argument("--hz", type=float, nargs="+", default=[60.0, 144.0], help="display refresh rates")
+    parser.add_argument("--seconds", type=float, default=5.0, help="run time per mode")
+    args = parser.parse_args()
+
+    print(f"{'display':>8} {'mode':<6}{'scans/s':>9}{'CPU %':>7}{'estimated':>11}{'targets':>9}"
+          f"{'click p50':>11}{'click p99':>11}")
+    for hz in args.hz:
+        for paced in (False, True):
+            stats = run(paced, hz, args.seconds)
+            print(f"{hz:>6.0f}Hz {stats['mode']:<6}{stats['scans_per_s']:>9.0f}{stats['cpu_percent']:>7.0f}"
+                  f"{stats['refresh_hz']:>9.1f}Hz{stats['targets']:>9}"
+                  f"{stats.get('click_p50_ms', float('nan')):>9.2f}ms{stats.get('click_p99_ms', float('nan')):>9.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
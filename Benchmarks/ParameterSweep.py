@@ -0,0 +1,433 @@
+import argparse
+import contextlib
+import itertools
+import multiprocessing as mp
+import os
+import sys
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Scripts'))
+from AimTrainer import AimTrainer  # noqa: E402
+from DetectionKernels import warm_up  # noqa: E402
+from GlyphMatcher import find_components  # noqa: E402
+from InputBackend import RecordingInput  # noqa: E402
+from VisualMemory import CubeGridCounter  # noqa: E402
+
+# Offline tuning of the detection parameters. A frame sequence (synthetic, or
+# recorded and saved as .npz) is replayed through a solver for every point of
+# a parameter grid, one grid point per task in a process pool. The frames sit
+# in shared memory, drawn once by the pool (or copied in from the recording),
+# and every worker reads the same buffer. Each point is scored on its mistakes
+# and on the mean time the solver spent per frame, and the points no other
+# point beats on all of those at once (the Pareto front) are printed, with the
+# solver's current defaults marked.
+#
+# The replay is open loop: frames don't react to clicks, so a target stays up
+# for as many frames as it did when recorded, which is what the Aim Trainer's
+# duplicate suppression is there for.
+#
+#   python Benchmarks/ParameterSweep.py aim
+#   python Benchmarks/ParameterSweep.py visual --grid tolerance=2,5,10 --grid scan_margin=0.02,0.1
+#   python Benchmarks/ParameterSweep.py aim --save aim.npz      keep the synthetic sequence
+#   python Benchmarks/ParameterSweep.py aim --frames aim.npz    replay a saved or recorded one
+#
+# Recordings are .npz files with `frames` (N, H, W, 4) BGRA uint8 and `times`
+# (N,) seconds; frame coordinates are the solver's screen coordinates. Aim
+# recordings also have `target_size`, the targets are found in the frames by
+# colour. Visual Memory recordings have `area` (x1, y1, x2, y2 of the cubes),
+# `sizes` (N,) grid size per frame (0: not scored, e.g. mid transition) and
+# `whites` (N, 144) white cube flags in row-major cube order.
+
+BACKGROUND = (0x2b, 0x87, 0xd1)  # Page blue, also the Visual Memory gap colour
+AIM_TARGET = (0x95, 0xc3, 0xe8)
+CUBE = (0x25, 0x73, 0xc1)
+CLICKED = (0x15, 0x43, 0x68)
+WHITE = (0xff, 0xff, 0xff)
+FRAME_TIME = 1 / 60
+MAX_CUBES = 144
+
+DEFAULT_GRIDS = {
+    "aim": {"step_size": [10, 15, 20, 25, 30], "tolerance": [2, 5, 10, 20],
+            "click_distance_threshold": [24.0, 48.0, 72.0], "click_memory_duration": [0.02, 0.05, 0.1, 0.2]},
+    "visual": {"tolerance": [2, 5, 10, 15, 25], "scan_x_offset": [0.01, 0.05, 0.1],
+               "scan_margin": [0.02, 0.05, 0.1]},
+}
+
+
+def bgra(rgb) -> np.ndarray:
+    return np.array((rgb[2], rgb[1], rgb[0], 255), dtype=np.uint8)
+
+
+def add_noise(frame: np.ndarray, rng, noise: int) -> None:
+    """Compression-like noise: every pixel's colour off by up to `noise` per channel."""
+    if noise:
+        shade = rng.integers(-noise, noise + 1, size=frame.shape[:2] + (3,), dtype=np.int16)
+        frame[..., :3] = np.clip(frame[..., :3] + shade, 0, 255)
+
+
+class AimSequence:
+    """
+    Aim Trainer targets one after another, each up for `visible` frames with a
+    blank frame between. A target pops in at 60% of its size for its first
+    frame and has an anti-aliased rim.
+    """
+
+    def __init__(self, seed: int, targets: int = 80, visible: int = 3, width: int = 480, height: int = 320,
+                 target_size: int = 60, noise: int = 4) -> None:
+        self.seed, self.noise = seed, noise
+        self.target_size = target_size
+        self.shape = (height, width)
+        rng = np.random.default_rng(seed)
+        radius = target_size // 2
+        self.scenes = []  # (target id, cx, cy, radius) or None per frame
+        for target in range(targets):
+            cx, cy = int(rng.integers(radius, width - radius)), int(rng.integers(radius, height - radius))
+            self.scenes.append((target, cx, cy, radius * 0.6))
+            self.scenes.extend([(target, cx, cy, radius)] * (visible - 1))
+            self.scenes.append(None)
+        self.times = np.arange(len(self.scenes)) * FRAME_TIME
+
+    def __len__(self) -> int:
+        return len(self.scenes)
+
+    def render(self, i: int) -> np.ndarray:
+        frame = np.empty(self.shape + (4,), dtype=np.uint8)
+        frame[...] = bgra(BACKGROUND)
+        if self.scenes[i] is not None:
+            _, cx, cy, radius = self.scenes[i]
+            yy, xx = np.mgrid[0:self.shape[0], 0:self.shape[1]]
+            distance = np.sqrt((xx - cx) ** 2 + (yy - cy) ** 2)
+            cover = np.clip(radius + 0.5 - distance, 0, 1)[..., None]  # Rim pixels blend into the background
+            frame[..., :3] = (cover * bgra(AIM_TARGET)[:3] + (1 - cover) * bgra(BACKGROUND)[:3]).astype(np.uint8)
+        add_noise(frame, np.random.default_rng((self.seed, i)), self.noise)
+        return frame
+
+    def truth(self, i: int) -> list:
+        """(target id, cx, cy, radius) of the targets in frame i."""
+        return [] if self.scenes[i] is None else [self.scenes[i]]
+
+
+class VisualSequence:
+    """
+    Visual Memory levels of growing grid size: the empty grid, the pattern
+    flashing white, the player's clicks (clicked cubes darker), then a frame
+    of bare page between levels.
+    """
+
+    def __init__(self, seed: int, sizes=range(3, 13), side: int = 600, margin: int = 20, gap: int = 8,
+                 noise: int = 4) -> None:
+        self.seed, self.noise, self.gap = seed, noise, gap
+        self.area = (margin, margin, margin + side, margin + side)
+        self.shape = (side + 2 * margin, side + 2 * margin)
+        rng = np.random.default_rng(seed)
+        self.scenes = []  # (size, white cubes, clicked cubes) per frame, size 0 between levels
+        for size in sizes:
+            pattern = set(rng.choice(size * size, size=min(size + 1, size * size), replace=False).tolist())
+            clicked = set(list(pattern)[:len(pattern) // 2])
+            self.scenes += [(size, set(), set())] * 2 + [(size, pattern, set())] * 3 + [(size, set(), clicked)] * 2
+            self.scenes.append((0, set(), set()))
+        self.times = np.arange(len(self.scenes)) * FRAME_TIME
+
+    def __len__(self) -> int:
+        return len(self.scenes)
+
+    def render(self, i: int) -> np.ndarray:
+        frame = np.empty(self.shape + (4,), dtype=np.uint8)
+        frame[...] = bgra(BACKGROUND)
+        size, white, clicked = self.scenes[i]
+        if size:
+            left, top, right, bottom = self.area
+            cell_w, cell_h = (right - left) / size, (bottom - top) / size
+            for index in range(size * size):
+                row, col = divmod(index, size)
+                color = WHITE if index in white else CLICKED if index in clicked else CUBE
+                frame[int(top + row * cell_h + self.gap / 2):int(top + (row + 1) * cell_h - self.gap / 2),
+                      int(left + col * cell_w + self.gap / 2):int(left + (col + 1) * cell_w - self.gap / 2)] = bgra(color)
+        add_noise(frame, np.random.default_rng((self.seed, i)), self.noise)
+        return frame
+
+    def truth(self, i: int) -> tuple:
+        """(grid size, white cube indices) of frame i."""
+        size, white, _ = self.scenes[i]
+        return size, white
+
+
+class RecordedSequence:
+    """
+    A saved sequence (see the top of the file), with the same interface as the
+    synthetic ones. `frames` is dropped once they are in shared memory.
+    """
+
+    def __init__(self, path: str, game: str) -> None:
+        data = np.load(path)
+        self.frames = data["frames"]
+        self.shape = self.frames.shape[1:3]
+        self.times = data["times"]
+        if game == "aim":
+            self.target_size = int(data["target_size"])
+            self.targets = track_targets(self.frames, self.target_size)
+        else:
+            self.area = tuple(int(v) for v in data["area"])
+            self.sizes = data["sizes"]
+            self.whites = data["whites"]
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def truth(self, i: int):
+        if hasattr(self, "targets"):
+            return self.targets[i]
+        return int(self.sizes[i]), set(np.flatnonzero(self.whites[i]).tolist())
+
+
+def track_targets(frames: np.ndarray, target_size: int, tolerance: int = 24) -> list:
+    """
+    Aim targets of recorded frames: blobs of the target colour at least a
+    quarter of a target across, with an id that carries over to the next frame
+    while the blob's centre stays within a quarter of a target.
+    """
+    color = bgra(AIM_TARGET)[:3].astype(np.int16)
+    targets, previous, next_id = [], [], 0
+    for frame in frames:
+        mask = (np.abs(frame[..., :3].astype(np.int16) - color) <= tolerance).all(axis=2)
+        current = []
+        for x1, y1, x2, y2, _ in find_components(mask):
+            if max(x2 - x1, y2 - y1) + 1 < target_size / 4:
+                continue
+            cx, cy, radius = (x1 + x2) / 2, (y1 + y2) / 2, (max(x2 - x1, y2 - y1) + 1) / 2
+            match = next((t for t, px, py, _ in previous if (px - cx) ** 2 + (py - cy) ** 2 <= (target_size / 4) ** 2),
+                         None)
+            if match is None:
+                match, next_id = next_id, next_id + 1
+            current.append((match, cx, cy, radius))
+        targets.append(current)
+        previous = current
+    return targets
+
+
+def save_sequence(sequence, path: str, game: str) -> None:
+    frames = np.stack([sequence.render(i) for i in range(len(sequence))])
+    if game == "aim":
+        np.savez_compressed(path, frames=frames, times=sequence.times, target_size=sequence.target_size)
+    else:
+        whites = np.zeros((len(sequence), MAX_CUBES), dtype=bool)
+        sizes = np.zeros(len(sequence), dtype=np.int32)
+        for i in range(len(sequence)):
+            sizes[i], white = sequence.truth(i)
+            whites[i, list(white)] = True
+        np.savez_compressed(path, frames=frames, times=sequence.times, area=np.array(sequence.area),
+                            sizes=sizes, whites=whites)
+    print(f"Saved {len(sequence)} frames to {path}")
+
+
+def open_sequence(game: str, frames_path, seed: int):
+    if frames_path:
+        return RecordedSequence(frames_path, game)
+    return AimSequence(seed) if game == "aim" else VisualSequence(seed)
+
+
+class ReplayCapture:
+    """Capture over the frame being replayed: grab(region) is a view of it."""
+
+    def __init__(self) -> None:
+        self.frame = None
+
+    def grab(self, region: dict) -> np.ndarray:
+        top, left = region['top'], region['left']
+        return self.frame[top:top + region['height'], left:left + region['width']]
+
+
+def replay_aim(sequence, frames: np.ndarray, params: dict) -> dict:
+    capture, recorder = ReplayCapture(), RecordingInput()
+    trainer = AimTrainer(target_size=sequence.target_size, capture=capture, input_backend=recorder)
+    trainer.verify_clicks = False  # Verification waits on the page reacting, a replay never does
+    height, width = sequence.shape
+    trainer.scan_area = (0, 0, width, height)
+    for name, value in params.items():
+        setattr(trainer, name, value)
+    now = 0.0
+    trainer.clock = lambda: now
+    hit, targets, duplicates, stray, busy = set(), set(), 0, 0, 0.0
+    for i in range(len(sequence)):
+        capture.frame = frames[i]
+        now = float(sequence.times[i])
+        truth = sequence.truth(i)
+        targets.update(t for t, _, _, _ in truth)
+        recorder.clear()
+        start = time.perf_counter()
+        trainer.scan_and_click()
+        busy += time.perf_counter() - start
+        for x, y in recorder.clicks():
+            on = next((t for t, cx, cy, r in truth if (x - cx) ** 2 + (y - cy) ** 2 <= r ** 2), None)
+            if on is None:
+                stray += 1
+            elif on in hit:
+                duplicates += 1
+            else:
+                hit.add(on)
+    count = max(len(targets), 1)
+    return {"missed": 1 - len(hit) / count, "bad_clicks": (duplicates + stray) / count,
+            "frame_us": busy / len(sequence) * 1e6, "detail": f"{len(hit)}/{len(targets)} hit, "
+                                                              f"{duplicates} duplicate, {stray} stray"}
+
+
+def replay_visual(sequence, frames: np.ndarray, params: dict) -> dict:
+    capture = ReplayCapture()
+    counter = CubeGridCounter(capture=capture, input_backend=RecordingInput())
+    x1, y1, x2, y2 = sequence.area
+    counter.coords = [(x1, y1), (x2, y2)]
+    for name, value in params.items():
+        setattr(counter, name, value)
+    wrong_size, wrong_whites, scored, busy = 0, 0, 0, 0.0
+    for i in range(len(sequence)):
+        capture.frame = frames[i]
+        size, white = sequence.truth(i)
+        start = time.perf_counter()
+        screenshot = counter.take_screenshot()
+        counter.check_grid(screenshot)
+        found = counter.scan_for_white_cubes(screenshot)
+        busy += time.perf_counter() - start
+        if not size:
+            continue
+        scored += 1
+        if counter.grid_size != size:
+            wrong_size += 1
+        elif found != white:
+            wrong_whites += 1
+    scored = max(scored, 1)
+    return {"wrong_size": wrong_size / scored, "wrong_whites": wrong_whites / scored,
+            "frame_us": busy / len(sequence) * 1e6, "detail": f"{scored - wrong_size - wrong_whites}/{scored} frames right"}
+
+
+OBJECTIVES = {"aim": ("missed", "bad_clicks", "frame_us"), "visual": ("wrong_size", "wrong_whites", "frame_us")}
+REPLAY = {"aim": replay_aim, "visual": replay_visual}
+
+_worker = {}
+
+
+def frame_buffer(shm: shared_memory.SharedMemory, sequence) -> np.ndarray:
+    return np.ndarray((len(sequence),) + tuple(sequence.shape) + (4,), dtype=np.uint8, buffer=shm.buf)
+
+
+def init_worker(game: str, sequence, shm_name: str, repeats: int) -> None:
+    sys.stdout = open(os.devnull, "w")  # The solvers print every click and level change
+    warm_up()  # Or the first grid point of every worker pays for compiling the kernels
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _worker.update(game=game, sequence=sequence, shm=shm, frames=frame_buffer(shm, sequence), repeats=repeats)
+
+
+def render_frame(i: int) -> None:
+    _worker["frames"][i] = _worker["sequence"].render(i)
+
+
+def evaluate(params: dict) -> dict:
+    """
+    Replay with params `repeats` times: the mistakes are the same every time,
+    the cost is the best pass (a preempted worker or the first touch of the
+    shared frames only slow one down).
+    """
+    passes = [REPLAY[_worker["game"]](_worker["sequence"], _worker["frames"], params)
+              for _ in range(_worker["repeats"])]
+    result = min(passes, key=lambda r: r["frame_us"])
+    result["params"] = params
+    return result
+
+
+def pareto_front(results: list, objectives: tuple, cost_tolerance: float = 0.0) -> list:
+    """
+    Results no other result is at least as good as on every objective and
+    better on one. Costs (frame_us) within cost_tolerance of each other count
+    as equal, timings are only that repeatable.
+    """
+    values = np.array([[r[key] for key in objectives] for r in results])
+    slack = np.array([1 + cost_tolerance if key == "frame_us" else 1.0 for key in objectives])
+    front = []
+    for i, row in enumerate(values):
+        dominated = ((values <= row * slack).all(axis=1) & (values < row / slack).any(axis=1)).any()
+        if not dominated:
+            front.append(results[i])
+    return front
+
+
+def defaults(game: str, names) -> dict:
+    """Current values of the swept parameters on a freshly made solver."""
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        if game == "aim":
+            solver = AimTrainer(target_size=60, capture=ReplayCapture(), input_backend=RecordingInput())
+        else:
+            solver = CubeGridCounter(capture=ReplayCapture(), input_backend=RecordingInput())
+    return {name: getattr(solver, name) for name in names}
+
+
+def parse_grid(game: str, overrides: list) -> dict:
+    grid = dict(DEFAULT_GRIDS[game])
+    for item in overrides:
+        name, _, values = item.partition("=")
+        grid[name] = [float(v) if "." in v else int(v) for v in values.split(",")]
+    return grid
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Parameter sweep of the solvers over replayed frames, Pareto front")
+    parser.add_argument("game", choices=sorted(REPLAY))
+    parser.add_argument("--frames", help="replay this .npz sequence instead of a synthetic one")
+    parser.add_argument("--save", help="save the synthetic sequence to this .npz file and exit")
+    parser.add_argument("--grid", action="append", default=[], metavar="NAME=V1,V2,...",
+                        help="values of one parameter (replaces its default range, adds it if new)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="processes in the pool")
+    parser.add_argument("--repeats", type=int, default=3, help="replays per setting, the fastest counts")
+    parser.add_argument("--cost-tolerance", type=float, default=0.25,
+                        help="frame costs this close (0.25 = 25%%) count as equal on the front")
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    if args.save:
+        save_sequence(open_sequence(args.game, None, args.seed), args.save, args.game)
+        return
+
+    grid = parse_grid(args.game, args.grid)
+    names = list(grid)
+    points = [dict(zip(names, values)) for values in itertools.product(*grid.values())]
+    current = defaults(args.game, names)
+    if current not in points:
+        points.append(current)
+    objectives = OBJECTIVES[args.game]
+
+    sequence = open_sequence(args.game, args.frames, args.seed)
+    print(f"Sweeping {len(points)} settings of {', '.join(names)} over {len(sequence)} frames "
+          f"with {args.workers} workers...")
+    start = time.perf_counter()
+    shm = shared_memory.SharedMemory(create=True, size=len(sequence) * int(np.prod(sequence.shape)) * 4)
+    try:
+        recorded = getattr(sequence, "frames", None)
+        if recorded is not None:
+            frame_buffer(shm, sequence)[...] = recorded
+            sequence.frames = None  # Workers read the shared copy, don't pickle this one to them
+        with mp.Pool(args.workers, initializer=init_worker, initargs=(args.game, sequence, shm.name, args.repeats)) as pool:
+            if recorded is None:
+                pool.map(render_frame, range(len(sequence)))
+            results = list(pool.imap_unordered(evaluate, points))
+    finally:
+        shm.close()
+        shm.unlink()
+    print(f"Done in {time.perf_counter() - start:.1f}s")
+
+    front = sorted(pareto_front(results, objectives, args.cost_tolerance), key=lambda r: tuple(r[key] for key in objectives))
+    print(f"\nPareto front ({len(front)} of {len(results)} settings), * = current defaults:")
+    print("  " + "".join(f"{name:>{max(len(name), 8) + 2}}" for name in names) +
+          "".join(f"{key:>14}" for key in objectives) + "  detail")
+    for result in front:
+        print(("* " if result["params"] == current else "  ") +
+              "".join(f"{result['params'][name]!s:>{max(len(name), 8) + 2}}" for name in names) +
+              "".join(f"{result[key]:>14.3f}" for key in objectives) + f"  {result['detail']}")
+    if not any(r["params"] == current for r in front):
+        result = next(r for r in results if r["params"] == current)
+        print("\nCurrent defaults are dominated: " + ", ".join(f"{key} {result[key]:.3f}" for key in objectives) +
+              f" ({result['detail']})")
+
+
+if __name__ == "__main__":
+    main()
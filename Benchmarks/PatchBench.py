@@ -0,0 +1,171 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Scripts'))
+from DetectionKernels import warm_up  # noqa: E402
+from PixelProbe import select_probe  # noqa: E402
+from ReactionTime import PATCH_PALETTE, READY, WAIT, PatchDetector  # noqa: E402
+
+# Reaction Time detection with one watched pixel vs the 8x8 patch majority
+# vote, on a simulated screen: the test area is red for a random time, then
+# green. While it's red the cursor passes over the watched spot and the
+# encoder shades the area a little, like on a real page. Reports false clicks
+# (a change seen while the screen was still red), missed greens and the
+# red-to-green detection latency, plus what one read costs each way.
+#
+# Both loops read through the same in-memory probe, so the difference is only
+# the classification. With --display the 1x1 and 8x8 reads are also timed on
+# the real screen, where the grab itself is what costs.
+
+CX, CY = 32, 32
+CURSOR = 11, 16  # Width and height of an arrow cursor's bounding box
+ys, xs = np.mgrid[0:CURSOR[1], 0:CURSOR[0]]
+ARROW = xs <= ys * 0.7  # Tip top left, like the usual pointer
+OUTLINE = ARROW & ~(np.roll(ARROW, 1, axis=0) & np.roll(ARROW, -1, axis=1) & (xs > 0))
+
+
+class SimulatedTest:
+    """
+    Screen area whose content is a function of perf_counter: red until
+    `green_at`, green after. Noise events (start, end, kind, offset) are drawn
+    over it while they are active.
+    """
+
+    def __init__(self) -> None:
+        self.frame = np.empty((64, 64, 4), dtype=np.uint8)
+        self.green_at = float('inf')
+        self.events = []
+        self.drawn = None
+
+    def schedule(self, rng, start: float, wait: float, noise_rate: float) -> None:
+        self.green_at = start + wait
+        self.events = []
+        t = start
+        while True:
+            t += rng.exponential(1 / noise_rate)
+            if t >= self.green_at:
+                break
+            kind = "cursor" if rng.random() < 0.5 else "shade"
+            offset = (int(rng.integers(-3, 1)), int(rng.integers(-3, 1)))  # The pointer rests on the watched spot
+            self.events.append((t, t + rng.uniform(0.002, 0.01), kind, offset))
+
+    def draw(self, now: float) -> None:
+        color = PATCH_PALETTE[READY if now >= self.green_at else WAIT]
+        active = tuple(i for i, (start, end, _, _) in enumerate(self.events) if start <= now < end)
+        state = (now >= self.green_at, active)
+        if state == self.drawn:
+            return
+        self.frame[..., :3] = color[::-1]
+        self.frame[..., 3] = 255
+        for i in active:
+            _, _, kind, (dx, dy) = self.events[i]
+            if kind == "cursor":  # Tip at or just before the watched pixel, white with a black outline
+                box = self.frame[CY + dy:CY + dy + CURSOR[1], CX + dx:CX + dx + CURSOR[0], :3]
+                box[ARROW] = 255
+                box[OUTLINE] = 0
+            else:  # Compression shading over the area
+                shade = np.random.default_rng(i).integers(-12, 13, size=(24, 24, 3))
+                area = self.frame[CY - 12:CY + 12, CX - 12:CX + 12, :3]  # Shades the cursor too, if it's up
+                area[...] = np.clip(area.astype(np.int16) + shade, 0, 255)
+        self.drawn = state
+
+
+class MemoryProbe:
+    """Probe over the simulated screen, raw BGRA bytes like the X11 and GDI probes."""
+    name = "memory"
+
+    def __init__(self, test: SimulatedTest, x: int, y: int, width: int = 1, height: int = 1) -> None:
+        self.test = test
+        self.rect = (x, y, width, height)
+
+    def read(self) -> bytes:
+        self.test.draw(time.perf_counter())
+        x, y, w, h = self.rect
+        return self.test.frame[y:y + h, x:x + w].tobytes()
+
+    def close(self) -> None:
+        pass
+
+
+def run(mode: str, trials: int, noise_rate: float, seed: int) -> dict:
+    rng = np.random.default_rng(seed)  # Same schedule for both modes
+    test = SimulatedTest()
+    if mode == "pixel":
+        probe = MemoryProbe(test, CX, CY)
+        read = probe.read
+    else:
+        detector = PatchDetector(CX, CY, 8, probe=MemoryProbe(test, CX - 4, CY - 4, 8, 8))
+        read = detector.read
+    false_clicks, missed, latencies, reads, busy = 0, 0, [], 0, 0.0
+    for _ in range(trials):
+        start = time.perf_counter()
+        test.schedule(rng, start, rng.uniform(0.05, 0.15), noise_rate)
+        test.drawn = None
+        initial = read()
+        deadline = test.green_at + 0.05
+        while True:
+            before = time.perf_counter()
+            value = read()
+            now = time.perf_counter()
+            reads += 1
+            busy += now - before
+            triggered = value != initial if mode == "pixel" else value == READY
+            if triggered:
+                if now < test.green_at:
+                    false_clicks += 1
+                else:
+                    latencies.append(now - test.green_at)
+                break
+            if now > deadline:
+                missed += 1
+                break
+    stats = {"mode": mode, "false": false_clicks, "missed": missed, "read_us": busy / reads * 1e6}
+    if latencies:
+        stats["p50_us"], stats["p99_us"] = np.percentile(np.array(latencies) * 1e6, [50, 99])
+    return stats
+
+
+def time_real_probes(x: int, y: int) -> None:
+    for label, (width, height) in (("1x1 pixel", (1, 1)), ("8x8 patch", (8, 8))):
+        try:
+            probe, _ = select_probe(x, y, width, height, verbose=False)
+        except Exception as e:
+            print(f"  {label}: no probe works here ({e})")
+            return
+        try:
+            read = probe.read
+            for _ in range(50):
+                read()
+            start = time.perf_counter()
+            for _ in range(500):
+                read()
+            print(f"  {label}: {probe.name} probe {(time.perf_counter() - start) / 500 * 1e6:.1f} us/read")
+        finally:
+            probe.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Single pixel vs 8x8 patch vote for Reaction Time detection")
+    parser.add_argument("--trials", type=int, default=100)
+    parser.add_argument("--noise-rate", type=float, default=10.0, help="cursor / shading events per second of red")
+    parser.add_argument("--seed", type=int, default=9)
+    parser.add_argument("--display", action="store_true", help="also time 1x1 and 8x8 reads on the real screen")
+    args = parser.parse_args()
+
+    warm_up()
+    print(f"{'mode':<7}{'false clicks':>13}{'missed':>8}{'read us':>9}{'latency p50':>13}{'p99':>10}")
+    for mode in ("pixel", "patch"):
+        s = run(mode, args.trials, args.noise_rate, args.seed)
+        print(f"{s['mode']:<7}{s['false']:>8}/{args.trials:<4}{s['missed']:>8}{s['read_us']:>9.2f}"
+              f"{s.get('p50_us', float('nan')):>11.1f}us{s.get('p99_us', float('nan')):>8.1f}us")
+    if args.display:
+        print("Real screen reads:")
+        time_real_probes(CX, CY)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,698 @@
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Scripts'))
+from AimTrainer import AimTrainer  # noqa: E402
+from ClipboardSession import MemoryClipboard  # noqa: E402
+from DetectionKernels import USING_NUMBA, warm_up  # noqa: E402
+from InputBackend import VK_SHIFT, RecordingInput  # noqa: E402
+from LatencyStats import LatencyHistogram  # noqa: E402
+from ReactionTime import PATCH_PALETTE, READY, RESULT, UNKNOWN, WAIT, PatchDetector, run_trials, trial_stats  # noqa: E402
+from StripCapture import RegionStrips  # noqa: E402
+from TypingTest import MouseController  # noqa: E402
+from VisualMemory import CubeGridCounter  # noqa: E402
+from sequenceMemory import FlashSampler, PacingTuner, PixelChecker, feedback_results  # noqa: E402
+
+# Headless microbenchmarks and regression checks of the solver hot paths:
+# every solver runs against an in-memory screen and a RecordingInput, so this
+# works on Linux without a display and nothing is clicked or typed.
+#
+# Each case checks its result first (a fast wrong answer is a failure too),
+# then one call of the hot path is timed over several rounds. The median is
+# the best of the round medians, so a noisy neighbour on the machine doesn't
+# read as a regression. Timings are compared with the JSON baseline; a case
+# fails when its median is more than `tolerance` slower than the baseline or
+# its p99 is over the case's absolute budget.
+#
+#   python Benchmarks/RegressionSuite.py            check against the baseline
+#   python Benchmarks/RegressionSuite.py --update   record a new baseline
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+BACKGROUND = (0x2b, 0x87, 0xd1)  # Page blue, also the Visual Memory gap colour
+AIM_TARGET = (0x95, 0xc3, 0xe8)
+CUBE = (0x25, 0x73, 0xc1)
+WHITE = (0xff, 0xff, 0xff)
+WRONG_CUBE = (0x15, 0x43, 0x68)  # A clicked cube that wasn't in the pattern
+
+PASSAGE = ("The quick brown fox jumps over the lazy dog! Pack my box with five dozen liquor jugs? "
+           "(Sphinx of black quartz, judge my vow) - 1234567890 \"quotes\", 'apostrophes' & symbols: @#$%^*_+=[]{};<>/|~`")
+
+
+class SyntheticScreen:
+    """
+    Capture over an in-memory screen: grab(region) returns a zero-copy slice
+    of the current frame, like the mss buffer views the solvers normally get.
+    """
+
+    def __init__(self, width: int = 1920, height: int = 1080) -> None:
+        self.frame = np.empty((height, width, 4), dtype=np.uint8)
+        self.fill(BACKGROUND)
+        self.grabs = 0
+
+    def fill(self, rgb, top: int = 0, left: int = 0, bottom: int = None, right: int = None) -> None:
+        self.frame[top:bottom, left:right] = (rgb[2], rgb[1], rgb[0], 255)
+
+    def grab(self, region: dict) -> np.ndarray:
+        self.grabs += 1
+        top, left = region['top'], region['left']
+        return self.frame[top:top + region['height'], left:left + region['width']]
+
+
+def quiet():
+    """Silence the solvers' per-click prints while a case runs."""
+    return contextlib.redirect_stdout(open(os.devnull, "w"))
+
+
+def timed(function, repeat: int, rounds: int, warmup: int = 20) -> np.ndarray:
+    """Nanoseconds per call of function(), (rounds, repeat), after a few untimed calls."""
+    for _ in range(warmup):
+        function()
+    times = np.empty((rounds, repeat), dtype=np.int64)
+    for r in range(rounds):
+        for i in range(repeat):
+            start = time.perf_counter_ns()
+            function()
+            times[r, i] = time.perf_counter_ns() - start
+    return times
+
+
+CASES = []
+
+
+def case(name: str, budget_us: float):
+    """Register a case: a function(rng) -> (the call to time, list of errors)."""
+    def register(function):
+        CASES.append((name, budget_us, function))
+        return function
+    return register
+
+
+@case("aim_scan_and_click", budget_us=2000)
+def aim_scan_and_click(rng):
+    screen = SyntheticScreen()
+    recorder = RecordingInput()
+    trainer = AimTrainer(target_size=160, capture=screen, input_backend=recorder)
+    trainer.scan_area = (200, 150, 1700, 950)
+    trainer.verify_clicks = False  # Targets never disappear here, verification has its own case
+    x1, y1, x2, y2 = trainer.scan_area
+    yy, xx = np.mgrid[0:screen.frame.shape[0], 0:screen.frame.shape[1]]
+    errors = []
+
+    for _ in range(50):
+        screen.fill(BACKGROUND)
+        cx, cy = int(rng.integers(x1 + 80, x2 - 80)), int(rng.integers(y1 + 80, y2 - 80))
+        disc = (xx - cx) ** 2 + (yy - cy) ** 2 <= 80 ** 2
+        screen.frame[disc, :3] = AIM_TARGET[::-1]
+        trainer.recent_clicks.clear()
+        recorder.clear()
+        trainer.scan_and_click()
+        clicks = recorder.clicks()
+        if not clicks:
+            errors.append(f"target at ({cx}, {cy}) not clicked")
+        elif any((x - cx) ** 2 + (y - cy) ** 2 > 80 ** 2 for x, y in clicks):
+            errors.append(f"click outside the target at ({cx}, {cy}): {clicks}")
+
+    screen.fill(BACKGROUND)
+    recorder.clear()
+    trainer.scan_and_click()
+    if recorder.clicks():
+        errors.append(f"clicks on an empty frame: {recorder.clicks()}")
+    # Timed on the empty frame: that is what the loop sees between targets
+    return trainer.scan_and_click, errors
+
+
+@case("aim_scan_strips", budget_us=2000)
+def aim_scan_strips(rng):
+    # Same scan with only the sampled rows captured, one strip grab per row
+    screen = SyntheticScreen()
+    full, strips = RecordingInput(), RecordingInput()
+    trainers = [AimTrainer(target_size=160, capture=capture, input_backend=recorder)
+                for capture, recorder in ((screen, full), (RegionStrips(screen), strips))]
+    for trainer in trainers:
+        trainer.scan_area = (200, 150, 1700, 950)
+        trainer.verify_clicks = False
+    x1, y1, x2, y2 = trainers[0].scan_area
+    yy, xx = np.mgrid[0:screen.frame.shape[0], 0:screen.frame.shape[1]]
+    errors = []
+
+    for _ in range(50):
+        screen.fill(BACKGROUND)
+        cx, cy = int(rng.integers(x1 + 80, x2 - 80)), int(rng.integers(y1 + 80, y2 - 80))
+        screen.frame[(xx - cx) ** 2 + (yy - cy) ** 2 <= 80 ** 2, :3] = AIM_TARGET[::-1]
+        for trainer, recorder in zip(trainers, (full, strips)):
+            trainer.recent_clicks.clear()
+            recorder.clear()
+            trainer.scan_and_click()
+        if not strips.clicks() or strips.clicks() != full.clicks():
+            errors.append(f"target at ({cx}, {cy}): strips clicked {strips.clicks()}, full frame {full.clicks()}")
+
+    screen.fill(BACKGROUND)
+    return trainers[1].scan_and_click, errors
+
+
+class TargetPage(RecordingInput):
+    """
+    Input that records and plays the page: a click on the target erases it,
+    except the first `ignore` clicks (a miss, e.g. the page wasn't ready).
+    """
+
+    def __init__(self, screen: SyntheticScreen, radius: int) -> None:
+        super().__init__()
+        self.screen = screen
+        self.radius = radius
+        self.target = None
+        self.ignore = 0
+
+    def show(self, cx: int, cy: int, ignore: int = 0) -> None:
+        r = self.radius
+        yy, xx = np.mgrid[-r:r + 1, -r:r + 1]
+        self.screen.frame[cy - r:cy + r + 1, cx - r:cx + r + 1][yy ** 2 + xx ** 2 <= r ** 2, :3] = AIM_TARGET[::-1]
+        self.target, self.ignore = (cx, cy), ignore
+
+    def click(self, x: int, y: int, hold: float = 0.0) -> None:
+        super().click(x, y, hold)
+        if self.target is None or (x - self.target[0]) ** 2 + (y - self.target[1]) ** 2 > self.radius ** 2:
+            return
+        if self.ignore:
+            self.ignore -= 1
+            return
+        cx, cy, r = *self.target, self.radius
+        self.screen.fill(BACKGROUND, cy - r, cx - r, cy + r + 1, cx + r + 1)
+        self.target = None
+
+
+@case("aim_click_verification", budget_us=300)
+def aim_click_verification(rng):
+    screen = SyntheticScreen()
+    page = TargetPage(screen, 80)
+    trainer = AimTrainer(target_size=160, capture=screen, input_backend=page)
+    trainer.scan_area = (200, 150, 1700, 950)
+    trainer.verify_timeout = 0.0  # A frame that still shows the target is a miss
+    x1, y1, x2, y2 = trainer.scan_area
+    errors = []
+
+    def play(frames: int = 5) -> None:
+        # Loop frames until no click is waiting on its target
+        for _ in range(frames):
+            trainer.scan_and_click()
+            if not trainer.pending_clicks:
+                break
+
+    with quiet():
+        for i in range(30):
+            missed = i % 3  # Hit at once, after one re-click, after two
+            cx, cy = int(rng.integers(x1 + 80, x2 - 80)), int(rng.integers(y1 + 80, y2 - 80))
+            page.show(cx, cy, ignore=missed)
+            page.clear()
+            trainer.scan_and_click()
+            if len(page.clicks()) != 1:
+                errors.append(f"target at ({cx}, {cy}) got {len(page.clicks())} clicks from its first frame")
+            play()
+            clicks = page.clicks()
+            if len(clicks) != missed + 1:
+                errors.append(f"target at ({cx}, {cy}) ignoring {missed} clicks got {len(clicks)} clicks")
+            if page.target is not None:
+                errors.append(f"target at ({cx}, {cy}) left on screen")
+            if trainer.recent_clicks:
+                errors.append(f"suppression entry kept after a confirmed hit: {trainer.recent_clicks}")
+            # A new target right where the last one was is clicked at once
+            page.show(cx, cy)
+            page.clear()
+            play()
+            if len(page.clicks()) != 1:
+                errors.append(f"target reappearing at ({cx}, {cy}) got {len(page.clicks())} clicks")
+        # Misses past max_reclicks are given up on
+        page.show(960, 540, ignore=trainer.max_reclicks + 1)
+        play()
+        if trainer.unconfirmed != 1 or trainer.hits != 60 or trainer.pending_clicks:
+            errors.append(f"{trainer.hits} hits, {trainer.unconfirmed} unconfirmed and {len(trainer.pending_clicks)} "
+                          f"pending, expected 60, 1 and 0")
+
+    screen.fill(BACKGROUND)
+    frame = trainer.capture_scan_rows()
+    point = (x1 + 14 * trainer.step_size, y1 + 7 * trainer.step_size)
+
+    def confirm():
+        trainer.pending_clicks = [(*point, 0, 0.0, 0.0)]
+        trainer.check_pending_clicks(frame)
+
+    # Timed: confirming a click whose target is gone in the next frame
+    return confirm, errors
+
+
+def draw_cube_grid(screen: SyntheticScreen, area: tuple, size: int, white=(), gap: int = 8, wrong=()) -> None:
+    left, top, right, bottom = area
+    screen.fill(BACKGROUND, top - gap, left - gap, bottom + gap, right + gap)
+    cell_w = (right - left) / size
+    cell_h = (bottom - top) / size
+    for index in range(size * size):
+        row, col = divmod(index, size)
+        cube_top = int(top + row * cell_h + gap / 2)
+        cube_left = int(left + col * cell_w + gap / 2)
+        cube_bottom = int(top + (row + 1) * cell_h - gap / 2)
+        cube_right = int(left + (col + 1) * cell_w - gap / 2)
+        colour = WHITE if index in white else WRONG_CUBE if index in wrong else CUBE
+        screen.fill(colour, cube_top, cube_left, cube_bottom, cube_right)
+
+
+def grid_counter(screen: SyntheticScreen, area: tuple) -> CubeGridCounter:
+    counter = CubeGridCounter(capture=screen, input_backend=RecordingInput())
+    counter.coords = [(area[0], area[1]), (area[2], area[3])]
+    return counter
+
+
+class ScreenProbe:
+    """PixelProbe over a SyntheticScreen: raw BGRA bytes of a fixed area."""
+
+    def __init__(self, screen: SyntheticScreen, x: int, y: int, width: int, height: int) -> None:
+        self.screen = screen
+        self.region = {'top': y, 'left': x, 'width': width, 'height': height}
+
+    def read(self) -> bytes:
+        return self.screen.grab(self.region).tobytes()
+
+    def close(self) -> None:
+        pass
+
+
+@case("reaction_patch_read", budget_us=100)
+def reaction_patch_read(rng):
+    screen = SyntheticScreen()
+    detector = PatchDetector(960, 540, 8, probe=ScreenProbe(screen, 956, 536, 8, 8))
+    errors = []
+    for state in (WAIT, READY, RESULT):
+        screen.fill(PATCH_PALETTE[state])
+        shade = rng.integers(-12, 13, size=(8, 8, 3))
+        patch = screen.frame[536:544, 956:964, :3]
+        patch[...] = np.clip(patch.astype(np.int16) + shade, 0, 255)
+        patch[2:8, 4:8] = 255  # A cursor over a corner of the patch
+        if detector.read() != state:
+            errors.append(f"{state} patch with a cursor read as {detector.read()}")
+    screen.fill(WHITE)
+    if detector.read() != UNKNOWN:
+        errors.append(f"white patch read as {detector.read()}")
+    screen.fill(PATCH_PALETTE[WAIT])
+    return detector.read, errors
+
+
+class ScriptedTest:
+    """
+    Reaction Time page as the patch reads it: one scripted state per read,
+    the last one repeating. Counts reads and notes which read each click followed.
+    """
+
+    def __init__(self, script: list, limit: int = 10000) -> None:
+        self.script = script
+        self.limit = limit  # A runner that never clicks would spin forever
+        self.reads = 0
+        self.clicks = []
+
+    def read(self) -> int:
+        self.reads += 1
+        if self.reads > self.limit:
+            raise RuntimeError(f"no click after {self.limit} reads")
+        return self.script[min(self.reads, len(self.script)) - 1]
+
+    def click(self) -> None:
+        self.clicks.append(self.reads)
+
+
+@case("reaction_run_trials", budget_us=500)
+def reaction_run_trials(rng):
+    # (reads, read the click has to follow): green after a transition frame, green without red seen
+    # first (the armed loop was left early), green still up for a few reads after its click
+    scripts = [
+        ([WAIT, WAIT, UNKNOWN, READY, READY, RESULT], 4),
+        ([UNKNOWN, READY, READY, RESULT], 3),
+        ([WAIT, READY, READY, READY, READY, RESULT], 2),
+    ]
+    errors = []
+    for script, expected in scripts:
+        test = ScriptedTest(script)
+        try:
+            run_trials(test.read, test.click, trials=1, advance_timeout=0.0, stats=trial_stats(live=False))
+        except RuntimeError as e:
+            errors.append(f"{[int(state) for state in script]}: {e}")
+            continue
+        if test.clicks != [expected]:
+            errors.append(f"{[int(state) for state in script]}: clicks after reads {test.clicks}, expected [{expected}]")
+
+    def trial():
+        test = ScriptedTest([WAIT] * 20 + [READY, RESULT])
+        run_trials(test.read, test.click, trials=1, advance_timeout=0.0, stats=trial_stats(live=False))
+    return trial, errors
+
+
+@case("visual_detect_grid_size", budget_us=500)
+def visual_detect_grid_size(rng):
+    screen = SyntheticScreen()
+    area = (660, 240, 1260, 840)
+    counter = grid_counter(screen, area)
+    errors = []
+    for size in range(3, 8):
+        draw_cube_grid(screen, area, size)
+        found = counter.detect_grid_size()
+        if found != size:
+            errors.append(f"{size}x{size} grid detected as {found}")
+    return counter.detect_grid_size, errors
+
+
+@case("visual_scan_for_white_cubes", budget_us=2000)
+def visual_scan_for_white_cubes(rng):
+    screen = SyntheticScreen()
+    area = (660, 240, 1260, 840)
+    counter = grid_counter(screen, area)
+    errors = []
+    for size in range(3, 8):
+        cubes = rng.choice(size * size, size=size + 2, replace=False).tolist()
+        white, wrong = set(cubes[:size]), set(cubes[size:])
+        draw_cube_grid(screen, area, size, white, wrong=wrong)
+        counter.grid_size = size
+        counter.calculate_cube_centers()
+        found = counter.scan_for_white_cubes()
+        if found != white:
+            errors.append(f"{size}x{size} grid: white cubes {sorted(white)} found as {sorted(found)}")
+        misclicks = counter.count_wrong_cubes(counter.take_screenshot())
+        if misclicks != len(wrong):
+            errors.append(f"{size}x{size} grid: {len(wrong)} wrong cubes counted as {misclicks}")
+    return counter.scan_for_white_cubes, errors
+
+
+@case("visual_grid_signature", budget_us=300)
+def visual_grid_signature(rng):
+    screen = SyntheticScreen()
+    area = (660, 240, 1260, 840)
+    counter = grid_counter(screen, area)
+    errors = []
+    seen = {}
+    with quiet():
+        for size in range(3, 10):  # The scan line skips the outer tenths, larger grids lose their edge gaps
+            draw_cube_grid(screen, area, size)
+            counter.force_grid_update()
+            if counter.grid_size != size:
+                errors.append(f"{size}x{size} grid detected as {counter.grid_size}")
+            if counter.grid_signature in seen:
+                errors.append(f"{size}x{size} grid has the signature of {seen[counter.grid_signature]}x")
+            seen[counter.grid_signature] = size
+            # Cubes lighting up or being clicked are not a level change
+            draw_cube_grid(screen, area, size, set(rng.choice(size * size, size=size, replace=False).tolist()))
+            if counter.check_grid(counter.take_screenshot()) or counter.redetections:
+                errors.append(f"{size}x{size} grid re-detected with white cubes showing")
+            counter.redetections = 0
+    screenshot = counter.take_screenshot()
+    return lambda: counter.check_grid(screenshot), errors
+
+
+@case("sequence_monitor_tick", budget_us=200)
+def sequence_monitor_tick(rng):
+    screen = SyntheticScreen()
+    recorder = RecordingInput()
+    checker = PixelChecker(capture=screen, input_backend=recorder)
+    tile, spacing = 100, 120
+    board_left, board_top = 780, 360
+    tiles = [(board_left + col * spacing, board_top + row * spacing) for row in range(3) for col in range(3)]
+    checker.coords = [(x + tile // 2, y + tile // 2) for x, y in tiles]
+
+    def draw(lit=None):
+        screen.fill(BACKGROUND)
+        for i, (x, y) in enumerate(tiles):
+            screen.fill(WHITE if i == lit else CUBE, y, x, y + tile, x + tile)
+
+    # Play a sequence in simulated time: 30 samples per flash and per pause
+    errors = []
+    sequence = rng.integers(0, 9, size=8).tolist()
+    sampler = FlashSampler(len(checker.coords))
+    now = 0.0
+    executed = False
+    for lit in [s for step in sequence for s in [step] * 30 + [None] * 30] + [None] * 400:
+        draw(lit)
+        now += 0.01
+        executed |= checker.monitor_tick(sampler, now, timeout=3.0)
+    clicked = [checker.coords.index(point) for point in recorder.clicks()]
+    if not executed or clicked != sequence:
+        errors.append(f"sequence {sequence} clicked as {clicked}")
+
+    draw()
+    sampler.reset()
+    ticks = iter(range(1, 1 << 62))
+    return lambda: checker.monitor_tick(sampler, next(ticks) * 1e-3, timeout=3.0), errors
+
+
+class FeedbackBoard(RecordingInput):
+    """
+    Sequence Memory board that answers clicks: a click flashes its tile white
+    for `flash` seconds, unless it was held shorter than min_hold or came less
+    than min_gap after the previous click ended, then it's dropped. The board
+    is drawn as of perf_counter on every grab, so it is the capture too.
+    """
+
+    def __init__(self, min_hold: float, min_gap: float, flash: float, tile: int = 100, spacing: int = 120) -> None:
+        super().__init__(sleep=True)
+        self.screen = SyntheticScreen(3 * spacing, 3 * spacing)
+        self.tiles = [(col * spacing, row * spacing) for row in range(3) for col in range(3)]
+        self.size = tile
+        self.min_hold, self.min_gap, self.flash = min_hold, min_gap, flash
+        self.lit_until = [0.0] * 9
+        self.drawn = [None] * 9
+        self.last_up = float('-inf')
+        self.sent = []  # (tile, time the click was sent), like the solver sees them
+        self.dropped = 0
+
+    def centers(self) -> list:
+        return [(x + self.size // 2, y + self.size // 2) for x, y in self.tiles]
+
+    def click(self, x: int, y: int, hold: float = 0.0) -> None:
+        tile = self.centers().index((x, y))
+        down = time.perf_counter()
+        self.sent.append((tile, down))
+        super().click(x, y, hold)
+        up = time.perf_counter()
+        if hold >= self.min_hold and down - self.last_up >= self.min_gap:
+            self.lit_until[tile] = up + self.flash
+        else:
+            self.dropped += 1
+        self.last_up = up
+
+    def grab(self, region: dict) -> np.ndarray:
+        now = time.perf_counter()
+        for i, (x, y) in enumerate(self.tiles):
+            lit = now < self.lit_until[i]
+            if lit != self.drawn[i]:
+                self.screen.fill(WHITE if lit else CUBE, y, x, y + self.size, x + self.size)
+                self.drawn[i] = lit
+        return self.screen.grab(region)
+
+
+@case("sequence_pacing_tuner", budget_us=200)
+def sequence_pacing_tuner(rng):
+    # Clicks need a 2ms hold and 4ms between them, tuning starts at 10ms / 10ms
+    board = FeedbackBoard(min_hold=0.002, min_gap=0.004, flash=0.008)
+    checker = PixelChecker(capture=board, input_backend=board)
+    checker.coords = board.centers()
+    checker.feedback_timeout = 0.02
+    checker.tune_pacing(PacingTuner(start=(0.01, 0.01)))
+    tuner = checker.tuner
+    errors = []
+    for _ in range(60):
+        checker.white_sequence.extend(rng.integers(0, 9, size=6).tolist())
+        dropped = board.dropped
+        results = checker.execute_watched_sequence(FlashSampler(9))
+        if results.count(True) > 6 - (board.dropped - dropped):
+            errors.append(f"dropped clicks confirmed: {board.dropped - dropped} dropped, feedback {results}")
+        tuner.record(results)
+        checker.click_hold, checker.click_gap = tuner.pacing()
+        if tuner.done:
+            break
+    checker.finish_tuning()
+    if not tuner.done:
+        errors.append(f"tuner not finished after {tuner.levels} levels")
+    elif not (0.002 <= checker.click_hold and 0.0035 <= checker.click_gap <= 0.008):
+        errors.append(f"tuned to hold {checker.click_hold * 1000:.2f}ms gap {checker.click_gap * 1000:.2f}ms "
+                      f"for a 2ms / 4ms game")
+
+    # The tuned pacing plays a level without drops
+    board.dropped = 0
+    board.sent.clear()
+    sampler = FlashSampler(9)
+    checker.white_sequence.extend(rng.permutation(9).tolist())
+    results = checker.execute_watched_sequence(sampler)
+    if board.dropped:  # Not `False in results`, a busy machine can sleep through a whole 8ms flash
+        errors.append(f"tuned pacing dropped {board.dropped} clicks, feedback {results}")
+    clicks = [(tile, sent, True) for tile, sent in board.sent]
+    return lambda: feedback_results(clicks, sampler.flashes, checker.feedback_timeout), errors
+
+
+@case("typing_keystrokes", budget_us=100)
+def typing_keystrokes(rng):
+    recorder = RecordingInput()
+    controller = MouseController(typing_delay=0, input_backend=recorder)
+    errors = []
+    for char in PASSAGE:
+        recorder.clear()
+        controller.type_char_robust(char)
+        vk, shift = controller.get_char_vk_and_shift(char)
+        expected = [("key_down", vk), ("key_up", vk)]
+        if shift:
+            expected = [("key_down", VK_SHIFT)] + expected + [("key_up", VK_SHIFT)]
+        if recorder.keys() != expected:
+            errors.append(f"{char!r} typed as {recorder.keys()}")
+
+    chars = itertools.cycle(PASSAGE)
+
+    def type_next():
+        controller.type_char_robust(next(chars))
+        if len(recorder.events) > 10000:
+            recorder.clear()
+    return type_next, errors
+
+
+@case("typing_clipboard_paste", budget_us=500)
+def typing_clipboard_paste(rng):
+    clipboard = MemoryClipboard("user's clipboard")
+    recorder = RecordingInput()
+    controller = MouseController(typing_delay=0, input_backend=recorder, clipboard_backend=clipboard)
+    controller.paste_settle = 0.0
+    errors = []
+
+    # Ctrl+C answered by "the browser" 5ms later: copy() has to return its text, not the old one
+    copied = controller.clipboard.copy(lambda: clipboard.write_later(PASSAGE, 0.005))
+    waited = [seconds for what, seconds, _ in controller.clipboard.waits if what == "copy"]
+    if copied != PASSAGE:
+        errors.append(f"copy returned {copied!r}")
+    elif not 0.005 <= waited[-1] < 0.5:
+        errors.append(f"copy wait recorded as {waited[-1] * 1000:.2f}ms for a 5ms write")
+    if controller.clipboard.copy(lambda: None, timeout=0.01) is not None:
+        errors.append("copy with nothing written did not time out")
+
+    opens = clipboard.opens
+    controller.paste_text_fast(PASSAGE[:40])
+    if clipboard.opens - opens != 2:
+        errors.append(f"one paste opened the clipboard {clipboard.opens - opens} times")
+    if clipboard.get_text() != PASSAGE:
+        errors.append(f"clipboard not restored after the paste: {clipboard.get_text()!r}")
+
+    def paste():
+        controller.paste_text_fast("x")
+        recorder.clear()
+        controller.clipboard.waits.clear()
+    return paste, errors
+
+
+@case("latency_histogram_record", budget_us=20)
+def latency_histogram_record(rng):
+    # Loop times from a few hundred ns to seconds, with a slow tail
+    values = np.concatenate((rng.lognormal(11, 1.0, 50000), rng.lognormal(16, 2.0, 5000))).astype(np.int64)
+    first, second = LatencyHistogram(), LatencyHistogram()
+    for i, ns in enumerate(values.tolist()):
+        (first if i % 2 else second).record(ns)
+    size = len(first.counts)
+    first.record(1 << 50)  # Past the range: last bucket, exact max
+    second.record(values[0])  # numpy integers count like ints
+    merged = LatencyHistogram.from_dict(first.to_dict()).merge(second)
+    errors = []
+    if len(merged.counts) != size:
+        errors.append(f"histogram grew from {size} to {len(merged.counts)} buckets")
+    if merged.count != values.size + 2 or merged.max != 1 << 50 or merged.min != values.min():
+        errors.append(f"merged count {merged.count}, min {merged.min}, max {merged.max}")
+    qs = [1, 10, 50, 90, 99, 99.9]
+    expected = np.percentile(np.append(values, [values[0], 1 << 50]), qs, method="inverted_cdf")
+    for q, got, want in zip(qs, merged.percentiles(qs), expected):
+        if abs(got - want) > want * 0.01:
+            errors.append(f"p{q} {got:.0f}ns, exact {want:.0f}ns")
+
+    samples = itertools.cycle(values[:1000].tolist())
+    hist = LatencyHistogram()
+    return lambda: hist.record(next(samples)), errors
+
+
+def run_cases(names, repeat: int, rounds: int, seed: int) -> dict:
+    results = {}
+    for name, budget_us, function in CASES:
+        if names and name not in names:
+            continue
+        with quiet():
+            call, errors = function(np.random.default_rng(seed))
+            times_us = timed(call, repeat, rounds) / 1000
+        p50 = np.median(times_us, axis=1).min()
+        p99 = np.percentile(times_us, 99, axis=1).min()
+        results[name] = {"p50_us": float(p50), "p99_us": float(p99), "max_us": float(times_us.max()),
+                         "budget_us": budget_us, "errors": errors}
+    return results
+
+
+def environment() -> dict:
+    return {"host": platform.node(), "platform": platform.platform(), "python": platform.python_version(),
+            "numpy": np.__version__, "numba": USING_NUMBA}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Headless benchmark and regression check of the solver hot paths")
+    parser.add_argument("cases", nargs="*", help="cases to run (default: all)")
+    parser.add_argument("--repeat", type=int, default=2000, help="timed calls per round")
+    parser.add_argument("--rounds", type=int, default=5, help="rounds per case, the best round counts")
+    parser.add_argument("--seed", type=int, default=3)
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    # The regressions worth failing on are algorithmic (a per-pixel Python loop
+    # costs 10x and more); on a shared machine whole runs drift up to 2x
+    parser.add_argument("--tolerance", type=float, default=1.5,
+                        help="allowed slowdown of the median against the baseline (1.5 = 2.5x)")
+    parser.add_argument("--update", action="store_true", help="save this run as the new baseline")
+    args = parser.parse_args()
+
+    unknown = set(args.cases) - {name for name, _, _ in CASES}
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(sorted(unknown))}")
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    if baseline and not args.update and baseline.get("environment", {}).get("host") != platform.node():
+        print(f"Note: baseline recorded on {baseline['environment'].get('host')}, timings may not compare")
+
+    warm_up()
+    results = run_cases(args.cases, args.repeat, args.rounds, args.seed)
+
+    failures = []
+    print(f"{'case':<30}{'p50 us':>10}{'p99 us':>10}{'budget':>10}{'baseline':>10}{'change':>9}  result")
+    for name, result in results.items():
+        reference = baseline.get("cases", {}).get(name)
+        change = result["p50_us"] / reference["p50_us"] - 1 if reference else None
+        problems = list(result["errors"])
+        if result["p99_us"] > result["budget_us"]:
+            problems.append(f"p99 {result['p99_us']:.1f}us over the {result['budget_us']:.0f}us budget")
+        if change is not None and change > args.tolerance and not args.update:
+            problems.append(f"median {change:+.0%} against the baseline")
+        print(f"{name:<30}{result['p50_us']:>10.2f}{result['p99_us']:>10.2f}{result['budget_us']:>10.0f}"
+              f"{reference['p50_us'] if reference else float('nan'):>10.2f}"
+              f"{f'{change:+.0%}' if change is not None else '':>9}  {'FAIL' if problems else 'ok'}")
+        failures.extend(f"{name}: {problem}" for problem in problems)
+
+    if args.update:
+        cases = dict(baseline.get("cases", {}))
+        cases.update({name: {key: result[key] for key in ("p50_us", "p99_us", "max_us")}
+                      for name, result in results.items()})
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({"environment": environment(), "cases": cases}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\nBaseline saved to {args.baseline}")
+
+    if failures:
+        print("\nFailures:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("\nAll cases passed")
+
+
+if __name__ == "__main__":
+    main()
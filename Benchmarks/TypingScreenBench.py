@@ -0,0 +1,170 @@
+import argparse
+import os
+import string
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Scripts'))
+from PassageReader import GlyphAtlas  # noqa: E402
+
+# Passage reading speed and accuracy of the Typing Test screen reader on
+# synthetic pages. There is no font renderer here, so the page uses a
+# procedural bitmap font with the same traits as a real one: letters of
+# different widths on a common baseline, ascenders and descenders, punctuation
+# by position (, . ' -), a quote in two pieces and a few letter pairs drawn
+# touching. The atlas is learned from one passage holding every character,
+# then other passages are read with it.
+
+BACKGROUND = (0xf0, 0xf0, 0xf0)
+INK = (0x33, 0x33, 0x33)
+ASCENDERS = set("bdfhklt") | set(string.ascii_uppercase) | set(string.digits) | set("!?()[]{}/|&%$#@\\'\"")
+DESCENDERS = set("gjpqy,;()[]{}|")
+TOUCHING = {"rt", "ty", "fo", "Te", "yo", "ff"}  # Drawn without letter spacing
+CHARSET = string.ascii_letters + string.digits + ".,;:!?'\"-()&%$#@/"
+WORDS = ["the", "quick", "brown", "fox", "jumps", "over", "lazy", "dog", "pack", "my", "box", "with", "five",
+         "dozen", "liquor", "jugs", "sphinx", "of", "black", "quartz", "judge", "vow", "typing", "test", "forty",
+         "party", "effort", "yoyo", "Tea", "Texas", "rotten", "history", "after", "offer", "coffee", "rhythm"]
+
+
+class ProceduralFont:
+    def __init__(self, seed: int = 7, x_height: int = 14, ascent: int = 20, descent: int = 6) -> None:
+        rng = np.random.default_rng(seed)
+        self.ascent, self.descent, self.x_height = ascent, descent, x_height
+        self.glyphs = {}
+        seen = set()
+        for char in CHARSET:
+            glyph = self._glyph(rng, char)
+            while (glyph[0].tobytes(), glyph[0].shape, glyph[1]) in seen:  # Every character drawn differently
+                glyph = self._glyph(rng, char)
+            seen.add((glyph[0].tobytes(), glyph[0].shape, glyph[1]))
+            self.glyphs[char] = glyph
+
+    def _glyph(self, rng, char: str):
+        """(bitmap, top relative to the baseline) of one character."""
+        if char in ".,;:":
+            width, top, bottom = 3, -3, 4 if char in ",;" else 0
+            bitmap = np.ones((bottom - top, width), dtype=bool)
+            if char in ":;":
+                bitmap = np.zeros((self.x_height, width), dtype=bool)
+                bitmap[:3] = bitmap[-3 if char == ":" else -5:] = True
+                top = -self.x_height
+                if char == ";":
+                    bitmap = np.vstack((bitmap, np.ones((2, width), dtype=bool)))
+            return bitmap, top
+        if char == "'":
+            return np.ones((6, 2), dtype=bool), -self.ascent
+        if char == '"':
+            bitmap = np.zeros((6, 6), dtype=bool)
+            bitmap[:, :2] = bitmap[:, 4:] = True  # Two pieces
+            return bitmap, -self.ascent
+        if char == "-":
+            return np.ones((2, 7), dtype=bool), -self.x_height // 2
+        top = -self.ascent if char in ASCENDERS else -self.x_height
+        bottom = self.descent if char in DESCENDERS else 0
+        width = int(rng.integers(6, 13)) if char not in "il!|" else 3
+        cells = rng.random((6, max(2, width // 2))) < 0.55
+        cells[rng.integers(0, 6, size=cells.shape[1]), np.arange(cells.shape[1])] = True  # No empty columns
+        ys = (np.arange(bottom - top) * 6 // (bottom - top))
+        xs = (np.arange(width) * cells.shape[1] // width)
+        return cells[ys[:, None], xs[None, :]], top
+
+    def word_width(self, word: str) -> int:
+        return sum(self.glyphs[c][0].shape[1] for c in word) + sum(self.spacing(a, b) for a, b in zip(word, word[1:]))
+
+    @staticmethod
+    def spacing(a: str, b: str) -> int:
+        return 0 if a + b in TOUCHING else 2
+
+
+def render(font: ProceduralFont, text: str, rng, width: int = 1000, height: int = 400, left: int = 40,
+           top: int = 40, line_pitch: int = 40, space: int = 8) -> np.ndarray:
+    """Frame with text wrapped at spaces into lines no wider than the frame margins."""
+    frame = np.empty((height, width, 4), dtype=np.uint8)
+    frame[...] = (*BACKGROUND[::-1], 255)
+    frame[:, :, :3] += rng.integers(0, 6, size=(height, width, 1), dtype=np.uint8)  # Uneven background
+    frame[10:16, left:left + 200, :3] = INK[::-1]  # A heading bar above the passage
+    x, baseline = left, top + font.ascent
+    for word in text.split():
+        if x > left and x + font.word_width(word) > width - left:
+            x, baseline = left, baseline + line_pitch
+        previous = None
+        for char in word:
+            if previous is not None:
+                x += font.spacing(previous, char)
+            bitmap, offset = font.glyphs[char]
+            region = frame[baseline + offset:baseline + offset + bitmap.shape[0], x:x + bitmap.shape[1]]
+            region[bitmap, :3] = INK[::-1]
+            x += bitmap.shape[1]
+            previous = char
+        x += space
+    return frame
+
+
+def random_passage(rng, words: int) -> str:
+    out = []
+    for _ in range(words):
+        word = WORDS[rng.integers(len(WORDS))]
+        roll = rng.random()
+        if roll < 0.15:
+            word += ".,;:!?"[rng.integers(6)]
+        elif roll < 0.2:
+            word = f'"{word}"'
+        elif roll < 0.25:
+            word = f"({word})"
+        elif roll < 0.3:
+            word = str(rng.integers(0, 10000))
+        out.append(word)
+    return " ".join(out)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Typing Test passage reading on synthetic pages")
+    parser.add_argument("--passages", type=int, default=50, help="passages to read after learning")
+    parser.add_argument("--words", type=int, default=40, help="words per passage")
+    parser.add_argument("--seed", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    font = ProceduralFont()
+    anchor = 40 + font.ascent - 5  # A row of the first line, like the registered coordinate
+
+    # Learned from a passage that holds every character once, plus ordinary words
+    lesson = " ".join(CHARSET) + " " + " ".join(WORDS)
+    atlas = GlyphAtlas()
+    start = time.perf_counter()
+    learned = atlas.learn(render(font, lesson, rng), anchor, lesson)
+    learn_ms = (time.perf_counter() - start) * 1000
+    if not learned:
+        print("Learning the atlas failed")
+        sys.exit(1)
+    print(f"Atlas learned in {learn_ms:.1f}ms: {sum(len(t) for t in atlas.bank.templates.values())} templates, "
+          f"{len(atlas.bank.templates)} labels")
+
+    times, correct, fallbacks, wrong = [], 0, 0, []
+    for _ in range(args.passages):
+        text = random_passage(rng, args.words)
+        frame = render(font, text, rng)
+        start = time.perf_counter()
+        read = atlas.read(frame, anchor)
+        times.append(time.perf_counter() - start)
+        if read is None:
+            fallbacks += 1
+        elif read == text:
+            correct += 1
+        else:
+            wrong.append((text, read))
+
+    p50, p99 = np.percentile(np.array(times) * 1000, [50, 99])
+    print(f"{args.passages} passages of {args.words} words: {correct} read correctly, {fallbacks} fell back "
+          f"to the clipboard, {len(wrong)} wrong")
+    print(f"Read time p50 {p50:.2f}ms p99 {p99:.2f}ms")
+    for text, read in wrong[:3]:
+        print(f"  expected {text!r}\n  read     {read!r}")
+    if wrong:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Scripts'))
+from InputBackend import RecordingInput  # noqa: E402
+from VerbalMemory import VerbalMemory  # noqa: E402
+from DetectionKernels import warm_up  # noqa: E402
+from BitmapHash import MultiIndexHashSet  # noqa: E402
+from ChimpBench import BACKGROUND, FakeCapture  # noqa: E402
+
+# Word hashing and lookup of the Verbal Memory solver on synthetic word images.
+# Letters are random 5 x 7 bitmaps (fixed per run), words are random letter
+# strings rendered large on the blue background with the smaller lives/score
+# line above them. Repeats are re-rendered with pixel noise, so lookups have to
+# tolerate near-collisions. Nothing is clicked. A last pass checks that a lost
+# life is told apart from the score line getting longer.
+
+LETTERS = "abcdefghijklmnopqrstuvwxyz"
+
+
+def make_font(rng) -> dict:
+    return {c: rng.random((7, 5)) < 0.5 for c in LETTERS + "0123456789"}
+
+
+def render(font: dict, text: str, scale: int) -> np.ndarray:
+    glyphs = [np.kron(font[c], np.ones((scale, scale), dtype=bool)) for c in text]
+    gap = np.zeros((7 * scale, scale), dtype=bool)
+    parts = []
+    for glyph in glyphs:
+        parts += [glyph, gap]
+    return np.hstack(parts[:-1])
+
+
+def header(font: dict, lives: int, score: int) -> np.ndarray:
+    """The "Lives | 3   Score | 12" line: label and value close together, a wide gap between the halves."""
+    parts = [render(font, "lives", 2), render(font, str(lives), 2), render(font, "score", 2), render(font, str(score), 2)]
+    gaps = [np.zeros((14, width), dtype=bool) for width in (12, 60, 12)]
+    return np.hstack([parts[0], gaps[0], parts[1], gaps[1], parts[2], gaps[2], parts[3]])
+
+
+def word_frame(font: dict, word: str, rng, noise: float = 0.0, width: int = 1200, height: int = 400,
+               lives: int = 3, score: int = 0) -> np.ndarray:
+    frame = np.empty((height, width, 4), dtype=np.uint8)
+    frame[...] = (BACKGROUND[2], BACKGROUND[1], BACKGROUND[0], 255)
+    label = header(font, lives, score)
+    left = (width - label.shape[1]) // 2  # Centred, so it moves when the score gets a digit longer
+    frame[40:40 + label.shape[0], left:left + label.shape[1]][label] = 255
+    bitmap = render(font, word, 8)
+    if noise:
+        # Anti-aliasing jitter: only pixels on an ink edge flip, the extent of the word stays
+        padded = np.pad(bitmap, 1)
+        edge = ((padded[1:-1, 1:-1] != padded[:-2, 1:-1]) | (padded[1:-1, 1:-1] != padded[2:, 1:-1]) |
+                (padded[1:-1, 1:-1] != padded[1:-1, :-2]) | (padded[1:-1, 1:-1] != padded[1:-1, 2:]))
+        rows = np.flatnonzero(bitmap.any(axis=1))
+        cols = np.flatnonzero(bitmap.any(axis=0))
+        inside = np.zeros_like(edge)
+        inside[rows[0] + 1:rows[-1], cols[0] + 1:cols[-1]] = True  # Keep the ink bounding box as rendered
+        edge &= inside
+        bitmap = bitmap ^ (edge & (rng.random(bitmap.shape) < noise))
+    top = 160
+    left = (width - bitmap.shape[1]) // 2
+    frame[top:top + bitmap.shape[0], left:left + bitmap.shape[1]][bitmap] = 255
+    return frame
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Verbal Memory hashing and lookup benchmark on synthetic words")
+    parser.add_argument("--words", type=int, default=5000, help="distinct words in the run")
+    parser.add_argument("--repeat", type=float, default=0.5, help="share of answers that are repeats")
+    parser.add_argument("--noise", type=float, default=0.01, help="flip rate of edge pixels on repeated words")
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    font = make_font(rng)
+    vocabulary = set()
+    while len(vocabulary) < args.words:
+        vocabulary.add("".join(rng.choice(list(LETTERS), size=rng.integers(3, 11))))
+    vocabulary = list(vocabulary)
+
+    solver = VerbalMemory(capture=FakeCapture(), input_backend=RecordingInput())
+    warm_up()
+
+    shown = []
+    hashes = []  # Every new word's hash, for the memory pass
+    next_new = 0
+    errors = {"seen": 0, "new": 0}
+    window = []
+    checkpoints = sorted({500, 1000, 2000, 5000, 10000, args.words})
+    rows = []
+    while next_new < len(vocabulary):
+        if shown and rng.random() < args.repeat:
+            word, noise, expected = shown[rng.integers(len(shown))], args.noise, "seen"
+        else:
+            word, noise, expected = vocabulary[next_new], 0.0, "new"
+            next_new += 1
+            shown.append(word)
+        frame = word_frame(font, word, rng, noise)
+
+        start = time.perf_counter()
+        value = solver.word_hash(frame)
+        hashed = time.perf_counter()
+        answer = solver.answer(value)
+        window.append((hashed - start, time.perf_counter() - hashed))
+        if answer != expected:
+            errors[expected] += 1
+        if expected == "new":
+            hashes.append(value)
+            if next_new in checkpoints:
+                rows.append((next_new, len(window), *(np.median(np.array(window), axis=0) * 1e6)))
+                window = []
+
+    # Memory is measured on its own pass, tracemalloc slows every allocation down
+    memory = {}
+    index = MultiIndexHashSet(max_distance=solver.seen.max_distance)
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    for count, value in enumerate(hashes, start=1):
+        index.add(value)
+        if count in checkpoints:
+            memory[count] = (tracemalloc.get_traced_memory()[0] - base) / count
+    tracemalloc.stop()
+
+    print(f"{'stored':>7}{'answers':>9}{'hash us':>9}{'lookup us':>11}{'bytes/word':>12}")
+    for stored, answers, hash_us, lookup_us in rows:
+        print(f"{stored:>7}{answers:>9}{hash_us:>9.0f}{lookup_us:>11.1f}{memory[stored]:>12.0f}")
+    print(f"\nWrong answers: {errors['seen']} repeats answered new, {errors['new']} new words answered seen")
+
+    # Frames before and after an answer: a wrong one costs a life, a right one adds to the score
+    missed = false = 0
+    for _ in range(200):
+        lives, score = int(rng.integers(1, 4)), int(rng.choice([rng.integers(0, 1200), 9, 99, 999]))
+        wrong = rng.random() < 0.5
+        before = word_frame(font, vocabulary[rng.integers(len(vocabulary))], rng, lives=lives, score=score)
+        after = word_frame(font, vocabulary[rng.integers(len(vocabulary))], rng,
+                           lives=lives - wrong, score=score + (not wrong))
+        lost = solver.lost_life(before, after)
+        missed += wrong and not lost
+        false += lost and not wrong
+    print(f"Lives: {missed} lost lives missed, {false} right answers taken for a lost life (of 200)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,59 +1,97 @@
 import mss
 import numpy as np
-import win32api, win32con
 import time
 from typing import Optional
 import math
+from CalibrationCache import CalibrationCache
+from GameLocator import locate_scan_area, print_scan_area, reference_points, register_corners, scan_region
+from CaptureMultiplexer import MssCapture
+from InputBackend import DeferredInput
+from PerfMode import JitterRecorder, NullPerformanceMode, ask_performance_mode
+from LatencyStats import LoopStats
+from RefreshPacer import RefreshPacer
+from StripCapture import sampled_rows, select_row_capture
+from MetricsStore import MetricsSession, NullMetrics
+from DetectionKernels import grid_color_hits, off_color_mask, warm_up
+
+CORNER_PROMPT = ("Please position your mouse over 2 corner positions and press 'C' to register each coordinate.\n"
+                 "These will define the rectangular scanning area.")
 
 class AimTrainer:
-    def __init__(self, step_size: Optional[int] = None, target_size: int = 160, target_color: str = "#95c3e8") -> None:
+    def __init__(self, step_size: Optional[int] = None, target_size: int = 160, target_color: str = "#95c3e8",
+                 capture=None, input_backend=None) -> None:
         self.target_size = target_size
         # Auto-calculate step size if not provided - use target_size/3 for guaranteed coverage
         self.step_size = step_size if step_size is not None else max(target_size // 3, 15)
         self.target_color = target_color
         self.target_rgb = self.hex_to_rgb(target_color)
+        self.tolerance = 10  # Per-channel distance from target_color that still counts as target
         self.coords = []  # List of (x, y) coordinates for corners
-        self.sct = mss.mss()
+        self.sct = mss.mss() if capture is None else None  # Locator and cache open their own when None
+        self.capture = capture if capture is not None else MssCapture(self.sct)  # Anything with grab(region)
+        self.input = input_backend if input_backend is not None else DeferredInput()  # Mouse and keyboard events
         self.scan_area = None  # Will store (x1, y1, x2, y2)
         
         # Fast duplicate prevention - track recent clicks
         self.recent_clicks = []  # List of (x, y, timestamp)
         self.click_distance_threshold = target_size * 0.8  # 80% of target size
         self.click_memory_duration = 0.1  # Keep clicks in memory for 100ms
+        self.clock = time.time  # Timestamps of the click memory (the parameter sweep replays frame times)
+        
+        # Hit verification - check the frames the loop captures anyway until the target leaves each click
+        self.verify_clicks = True
+        self.verify_radius = max(target_size // 8, 2)
+        self.verify_timeout = 0.04  # No change this long after a click is a miss (a couple of refreshes)
+        self.max_reclicks = 2
+        self.pending_clicks = []  # (x, y, re-clicks so far, first click time, deadline) waiting for their target to go
+        self.hits = 0  # Clicks confirmed by verification
+        self.reclicks = 0  # Clicks repeated after a miss
+        self.unconfirmed = 0  # Targets still there after the last re-click
+        self.metrics = NullMetrics()  # Set by monitor_and_click
+        self.stats = LoopStats("Scan loop")  # Frame, capture-to-click and click dispatch times
 
     def hex_to_rgb(self, hex_color: str) -> tuple:
         """Convert hex color to RGB tuple."""
         hex_color = hex_color.lstrip('#')
         return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
 
-    def collect_coordinates(self) -> list:
+    def step_size_note(self) -> str:
+        """Printed with the scan area."""
+        return f"Using step size: {self.step_size} pixels (auto-calculated from target size: {self.target_size})"
+
+    def collect_coordinates(self, timeout: float = 10.0) -> list:
+        """Locate the play area from a full-screen capture, registering corners by hand if that fails."""
+        self.coords, self.scan_area = locate_scan_area(self.sct, timeout, CORNER_PROMPT, self.step_size_note())
+        return self.coords
+
+    def register_corners(self) -> list:
         """Collect two corner coordinates using mouse position upon 'C' key press."""
-        print("Please position your mouse over 2 corner positions and press 'C' to register each coordinate.")
-        print("These will define the rectangular scanning area.")
-        prev_key_state = 0
-        while len(self.coords) < 2:
-            curr_key_state = win32api.GetKeyState(0x43)  # 'C' key
-
-            # Detect press (transition from not pressed to pressed)
-            if curr_key_state < 0 and prev_key_state >= 0:
-                x, y = win32api.GetCursorPos()
-                self.coords.append((x, y))
-                print(f"Corner {len(self.coords)} registered: ({x}, {y})")
-                time.sleep(0.2)  # debounce delay
-            prev_key_state = curr_key_state
-            time.sleep(0.01)
-            
-        # Define scan area from the two corners
-        x1, y1 = self.coords[0]
-        x2, y2 = self.coords[1]
-        self.scan_area = (min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
-        print(f"Scan area defined: ({self.scan_area[0]}, {self.scan_area[1]}) to ({self.scan_area[2]}, {self.scan_area[3]})")
-        print(f"Using step size: {self.step_size} pixels (auto-calculated from target size: {self.target_size})")
+        self.coords, self.scan_area = register_corners(CORNER_PROMPT, self.step_size_note())
+        return self.coords
+
+    def scan_area_reference_points(self) -> list:
+        """Points just inside the scan area corners, used to check a cached layout."""
+        return reference_points(self.scan_area)
+
+    def load_or_collect_coordinates(self) -> list:
+        """Reuse the cached scan area if it still matches the screen, otherwise register it by hand."""
+        cache = CalibrationCache("AimTrainer", self.sct)
+        entry = cache.load_verified()
+        if entry is not None:
+            self.coords = [tuple(c) for c in entry["coords"]]
+            self.scan_area = tuple(entry["scan_area"])
+            print_scan_area(self.scan_area)
+            return self.coords
+
+        input("Press Enter, then switch to the Aim Trainer page...")
+        self.collect_coordinates()
+        cache.save({"coords": self.coords, "scan_area": list(self.scan_area)},
+                   self.scan_area_reference_points())
         return self.coords
 
     def is_too_close_to_recent_click(self, x: int, y: int) -> bool:
         """Check if coordinates are too close to a recent click to avoid duplicates."""
-        current_time = time.time()
+        current_time = self.clock()
         
         # Clean old clicks (older than click_memory_duration)
         self.recent_clicks = [(cx, cy, ct) for cx, cy, ct in self.recent_clicks 
@@ -66,78 +104,163 @@ class AimTrainer:
                 return True
         return False
 
-    def click_at(self, x: int, y: int) -> None:
-        """Simulate a mouse click at the specified (x, y) position with no delays."""
+    def click_at(self, x: int, y: int) -> bool:
+        """Simulate a mouse click at the specified (x, y) position with no delays. False if skipped as a duplicate."""
         # Check if too close to recent click
         if self.is_too_close_to_recent_click(x, y):
-            return
+            return False
             
-        old_x, old_y = win32api.GetCursorPos()  # Save current position
-        win32api.SetCursorPos((x, y))
-        win32api.mouse_event(win32con.MOUSEEVENTF_LEFTDOWN, x, y, 0, 0)
-        win32api.mouse_event(win32con.MOUSEEVENTF_LEFTUP, x, y, 0, 0)
+        sent = time.perf_counter_ns()
+        self.input.click(x, y)
+        self.stats["dispatch"].record(time.perf_counter_ns() - sent)
         
         # Add to recent clicks
-        self.recent_clicks.append((x, y, time.time()))
+        self.recent_clicks.append((x, y, self.clock()))
         print(f"Target found and clicked at ({x}, {y})")
+        return True
+
+    def release_click(self, x: int, y: int) -> None:
+        """Forget a click once its target is confirmed gone, so a new target there isn't skipped."""
+        self.recent_clicks = [(cx, cy, ct) for cx, cy, ct in self.recent_clicks if (cx, cy) != (x, y)]
+
+    def check_pending_clicks(self, img: np.ndarray) -> None:
+        """
+        Check the clicks waiting for their target to go against a new capture of the sampled rows. A click
+        is always on a sampled row, so the frame shows whether target colour is left within verify_radius
+        of it on that row. A hit releases the click's duplicate suppression entry; no change by
+        verify_timeout is a miss and re-clicks (up to max_reclicks times) before giving up.
+        """
+        x1, y1, x2, _ = self.scan_area
+        r = self.verify_radius
+        now = time.perf_counter()
+        pending = []
+        for x, y, attempt, start, deadline in self.pending_clicks:
+            row = (y - y1) // self.step_size
+            segment = img[row:row + 1, max(x - r, x1) - x1:min(x + r + 1, x2) - x1]
+            if off_color_mask(segment, self.target_rgb, self.tolerance).all():
+                self.release_click(x, y)
+                self.hits += 1
+                self.metrics.record("verify_ms", (now - start) * 1000, reclicks=attempt)
+            elif now < deadline:
+                pending.append((x, y, attempt, start, deadline))
+            elif attempt < self.max_reclicks:
+                self.input.click(x, y)
+                self.reclicks += 1
+                print(f"Target still at ({x}, {y}), clicked again")
+                pending.append((x, y, attempt + 1, start, time.perf_counter() + self.verify_timeout))
+            else:
+                self.unconfirmed += 1
+        self.pending_clicks = pending
+
+    def capture_region(self) -> dict:
+        """Screen region this solver reads, for registering with a shared capture."""
+        return scan_region(self.scan_area)
 
     def capture_scan_area(self) -> Optional[np.ndarray]:
         """Capture the entire scan area as a single screenshot for faster processing."""
         if not self.scan_area:
             return None
             
-        x1, y1, x2, y2 = self.scan_area
-        region = {'top': y1, 'left': x1, 'width': x2 - x1, 'height': y2 - y1}
-        screenshot = self.sct.grab(region)
-        return np.array(screenshot)
+        return self.capture.grab(self.capture_region())
+
+    def capture_scan_rows(self) -> Optional[np.ndarray]:
+        """Capture only the rows the scan samples (every step_size-th) as one compact array."""
+        if not self.scan_area:
+            return None
+
+        return sampled_rows(self.capture, self.capture_region(), self.step_size)
+
+    def tune_capture(self, duration: float = 0.2) -> None:
+        """Time full-frame and sparse strip capture of the scan area on this machine and keep the faster."""
+        print("Timing scan area capture strategies...")
+        self.capture, _ = select_row_capture(self.capture_region(), self.step_size, self.capture, duration)
 
-    def scan_and_click(self) -> None:
-        """Scan the defined area for target colors and click found targets instantly."""
+    def scan_and_click(self) -> int:
+        """Scan the defined area for target colors and click found targets instantly. Returns the clicks made."""
         if not self.scan_area:
             print("No scan area defined!")
-            return
+            return 0
 
-        # Capture entire area once
-        img = self.capture_scan_area()
+        # Capture the sampled rows once
+        start = time.perf_counter()
+        img = self.capture_scan_rows()
         if img is None:
-            return
+            return 0
             
+        if self.pending_clicks:
+            self.check_pending_clicks(img)
         x1, y1, x2, y2 = self.scan_area
-        targets_found = 0
-        target_r, target_g, target_b = self.target_rgb
-        tolerance = 10
+        clicks = 0
+        # Targets clicked from this capture or still being verified: their other scan points are stale
+        clicked = [(x, y) for x, y, *_ in self.pending_clicks]
         
-        # Check all scan points in the captured image
-        for y in range(y1, y2, self.step_size):
-            for x in range(x1, x2, self.step_size):
-                # Convert absolute coordinates to relative coordinates in the image
-                rel_x = x - x1
-                rel_y = y - y1
-                
-                # Check bounds
-                if rel_y < img.shape[0] and rel_x < img.shape[1]:
-                    b, g, r = img[rel_y, rel_x, 0], img[rel_y, rel_x, 1], img[rel_y, rel_x, 2]
-                    
-                    # Check if pixel matches target color
-                    if (abs(r - target_r) <= tolerance and 
-                        abs(g - target_g) <= tolerance and 
-                        abs(b - target_b) <= tolerance):
-                        self.click_at(x, y)
-                        targets_found += 1
-
-    def monitor_and_click(self, interval: float = 0) -> None:
-        """Continuously monitor the scan area and click targets as they appear."""
+        # Check all scan points in the captured image (compiled/vectorized kernel, row-major order)
+        for rel_y, rel_x in grid_color_hits(img, self.step_size, self.target_rgb, self.tolerance, compact=True):
+            x, y = x1 + int(rel_x), y1 + int(rel_y)
+            if any((x - cx) ** 2 + (y - cy) ** 2 <= self.target_size ** 2 for cx, cy in clicked):
+                continue
+            decided = time.perf_counter()
+            if self.click_at(x, y):
+                self.stats["detect"].record_seconds(decided - start)
+                self.metrics.record("click_ms", (time.perf_counter() - start) * 1000)  # Capture to click
+                clicks += 1
+                clicked.append((x, y))
+                if self.verify_clicks:
+                    sent = time.perf_counter()
+                    self.pending_clicks.append((x, y, 0, sent, sent + self.verify_timeout))
+        return clicks
+
+    def monitor_and_click(self, interval: float = 0, perf_mode=None, metrics=None, pacer=None) -> None:
+        """
+        Continuously monitor the scan area and click targets as they appear (optionally in performance mode).
+        The capture-to-click time of every click is recorded to metrics (MetricsStore.MetricsSession).
+        With a paced RefreshPacer the loop sleeps between display refreshes instead of spinning;
+        either way the loop's CPU use and change-to-scan latency are reported at the end.
+        Frame, detection and click dispatch percentiles are printed every few seconds while it runs.
+        """
         print(f"Monitoring scan area for color {self.target_color} (RGB: {self.target_rgb})")
         print(f"Target size: {self.target_size}px, Step size: {self.step_size}px")
         print(f"Duplicate prevention distance: {self.click_distance_threshold:.1f}px")
         print("Press Ctrl+C to exit.")
         
+        perf_mode = perf_mode or NullPerformanceMode()
+        self.metrics = metrics or NullMetrics()
+        pacer = pacer or RefreshPacer(paced=False)  # Unpaced it only measures
+        jitter = JitterRecorder(self.stats["frame"])
+        iterations = 0
+        warm_up()  # Compile the detection kernels before the first frame
+        capture = self.capture
+        self.capture = pacer.watch(capture)
         try:
-            while True:
-                self.scan_and_click()
-                # time.sleep(interval)
+            with perf_mode:
+                while True:
+                    pacer.wait()
+                    jitter.tick()
+                    self.scan_and_click()
+                    pacer.done()
+                    self.stats.tick()
+                    iterations += 1
+                    if iterations % 5000 == 0:
+                        perf_mode.checkpoint()  # Explicit young-generation collection while GC is off
         except KeyboardInterrupt:
             print("\nMonitoring stopped.")
+        finally:
+            self.capture = capture
+        self.stats.report()
+        pacer.report("Scan loop")
+        if self.verify_clicks:
+            print(f"Clicks verified: {self.hits} hits, {self.reclicks} re-clicks, {self.unconfirmed} unconfirmed")
+            self.metrics.record("reclicks", self.reclicks, hits=self.hits, unconfirmed=self.unconfirmed)
+        stats = jitter.summary()
+        if stats:
+            self.metrics.record("loop_p99_us", stats["p99_us"], iterations=stats["iterations"])
+        self.stats.save(self.metrics)
+        stats = pacer.summary()
+        if stats:
+            self.metrics.record("cpu_percent", stats["cpu_percent"], mode=stats["mode"])
+            if "latency_p50_ms" in stats:
+                self.metrics.record("change_latency_p50_ms", stats["latency_p50_ms"], mode=stats["mode"])
+                self.metrics.record("change_latency_p99_ms", stats["latency_p99_ms"], mode=stats["mode"])
 
 def get_user_input() -> tuple:
     """Get user preferences for target size, step size and target color."""
@@ -199,11 +322,18 @@ def main() -> None:
     
     trainer = AimTrainer(step_size=step_size, target_size=target_size, target_color=target_color)
     
-    input("Press Enter to begin coordinate registration...")
-    trainer.collect_coordinates()
+    trainer.load_or_collect_coordinates()
+    trainer.tune_capture()
+    perf_mode = ask_performance_mode()
+    paced = input("Sleep between display refreshes instead of spinning "
+                  "(far less CPU, same median click latency)? (Y/n): ").strip().lower() != "n"
+    
+    params = {"target_size": target_size, "step_size": trainer.step_size, "target_color": target_color,
+              "performance_mode": not isinstance(perf_mode, NullPerformanceMode), "paced": paced}
     
     print(f"\nStarting continuous monitoring and clicking.")
-    trainer.monitor_and_click(interval=0)
+    with MetricsSession("AimTrainer", params=params) as metrics:
+        trainer.monitor_and_click(interval=0, perf_mode=perf_mode, metrics=metrics, pacer=RefreshPacer(paced=paced))
 
 if __name__ == "__main__":
     # TODO - add a way to stop the program instead of reloading the website to not let the program see lmao
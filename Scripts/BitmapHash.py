@@ -0,0 +1,118 @@
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+# Perceptual hashes of binarised bitmaps (words, glyph strings) and a set that
+# finds stored hashes within a small Hamming distance in O(1) expected time.
+
+HASH_SHAPE = (16, 64)  # Cells of the hash grid (height, width), one bit each
+
+
+def bitmap_hash(bitmap: np.ndarray, shape: Tuple[int, int] = HASH_SHAPE) -> int:
+    """
+    Crop a boolean bitmap to its ink, stretch it onto the hash grid (4x
+    supersampled coverage per cell) and set a bit for every cell that is at
+    least half ink. Returns the bits as a Python int (row-major, MSB first).
+    """
+    return int.from_bytes(np.packbits(hash_bits(bitmap, shape)).tobytes(), "big")
+
+
+def hash_bits(bitmap: np.ndarray, shape: Tuple[int, int] = HASH_SHAPE) -> np.ndarray:
+    """
+    Boolean hash grid of a bitmap, flattened (see bitmap_hash).
+    """
+    rows = np.flatnonzero(bitmap.any(axis=1))
+    cols = np.flatnonzero(bitmap.any(axis=0))
+    height, width = shape
+    if rows.size == 0:
+        return np.zeros(height * width, dtype=bool)
+    ink = bitmap[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1]
+    sub = 4
+    ys = ((np.arange(height * sub) + 0.5) * ink.shape[0] / (height * sub)).astype(np.int64)
+    xs = ((np.arange(width * sub) + 0.5) * ink.shape[1] / (width * sub)).astype(np.int64)
+    coverage = ink[ys[:, None], xs[None, :]].reshape(height, sub, width, sub).mean(axis=(1, 3))
+    return (coverage >= 0.5).ravel()
+
+
+class MultiIndexHashSet:
+    """
+    Hashes split into `chunks` disjoint bit groups, one dict per group. Two
+    hashes within `max_distance` bits (max_distance < chunks) agree exactly on
+    at least one group, so looking up every group finds all near matches
+    without touching the other stored hashes.
+
+    The groups take their bits from a fixed random permutation, so each one
+    spans the whole bitmap instead of a (possibly blank) strip of it.
+    """
+
+    def __init__(self, bits: int = HASH_SHAPE[0] * HASH_SHAPE[1], chunks: int = 32, max_distance: int = 24,
+                 seed: int = 0) -> None:
+        if max_distance >= chunks:
+            raise ValueError("max_distance must be smaller than the number of chunks")
+        if bits % 8 or bits % chunks:
+            raise ValueError("bits must split into whole bytes and equal chunks")
+        self.bits = bits
+        self.chunks = chunks
+        self.max_distance = max_distance
+        self.permutation = np.random.default_rng(seed).permutation(bits)
+        self.hashes: List[int] = []
+        self.tables: List[Dict[int, Union[int, List[int]]]] = [{} for _ in range(chunks)]
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def _keys(self, value: int) -> List[int]:
+        bits = np.unpackbits(np.frombuffer(value.to_bytes(self.bits // 8, "big"), dtype=np.uint8))
+        groups = np.packbits(bits[self.permutation].reshape(self.chunks, -1), axis=1)
+        return [int.from_bytes(row.tobytes(), "big") for row in groups]
+
+    def _find(self, value: int, keys: List[int]) -> Optional[Tuple[int, int]]:
+        best = None
+        checked = set()
+        for table, key in zip(self.tables, keys):
+            bucket = table.get(key)
+            if bucket is None:
+                continue
+            for index in (bucket,) if isinstance(bucket, int) else bucket:
+                if index in checked:
+                    continue
+                checked.add(index)
+                distance = (self.hashes[index] ^ value).bit_count()
+                if distance <= self.max_distance and (best is None or distance < best[1]):
+                    best = (index, distance)
+        return best
+
+    def _add(self, value: int, keys: List[int]) -> int:
+        index = len(self.hashes)
+        self.hashes.append(value)
+        for table, key in zip(self.tables, keys):
+            bucket = table.get(key)
+            if bucket is None:
+                table[key] = index  # Almost every bucket holds one hash, no list for those
+            elif isinstance(bucket, int):
+                table[key] = [bucket, index]
+            else:
+                bucket.append(index)
+        return index
+
+    def find(self, value: int) -> Optional[Tuple[int, int]]:
+        """
+        (index, distance) of the closest stored hash within max_distance, or None.
+        """
+        return self._find(value, self._keys(value))
+
+    def add(self, value: int) -> int:
+        """
+        Store a hash and return its index.
+        """
+        return self._add(value, self._keys(value))
+
+    def check_and_add(self, value: int) -> bool:
+        """
+        True if a near match was already stored, otherwise store the hash and return False.
+        """
+        keys = self._keys(value)
+        if self._find(value, keys) is not None:
+            return True
+        self._add(value, keys)
+        return False
@@ -0,0 +1,161 @@
+import json
+import os
+import time
+from typing import List, Optional, Tuple
+
+import mss
+import numpy as np
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".human_benchmark_ai")
+CACHE_FILE = os.path.join(CACHE_DIR, "calibration.json")
+CACHE_VERSION = 1
+
+
+def current_zoom() -> str:
+    """
+    Browser zoom the layout was calibrated at (set HBAI_ZOOM, e.g. 160, when not using 100%).
+    """
+    return os.environ.get("HBAI_ZOOM", "100").strip().rstrip('%') or "100"
+
+
+def screen_key(sct, zoom: Optional[str] = None) -> str:
+    """
+    Build the cache key from the monitor geometry and browser zoom.
+    """
+    monitors = sct.monitors[1:] or sct.monitors[:1]
+    geometry = ";".join(f"{m['width']}x{m['height']}+{m['left']}+{m['top']}" for m in monitors)
+    return f"{geometry}@{zoom or current_zoom()}%"
+
+
+def grab_points(sct, points: List[Tuple[int, int]]) -> List[Tuple[int, int, int]]:
+    """
+    Read the RGB colour of every point with a single capture of their bounding box.
+    """
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    left, top = min(xs), min(ys)
+    region = {'top': top, 'left': left, 'width': max(xs) - left + 1, 'height': max(ys) - top + 1}
+    img = np.array(sct.grab(region))
+    colors = []
+    for x, y in points:
+        b, g, r = img[y - top, x - left, 0], img[y - top, x - left, 1], img[y - top, x - left, 2]
+        colors.append((int(r), int(g), int(b)))
+    return colors
+
+
+class CalibrationCache:
+    """
+    Saved coordinates/regions per game, keyed by screen geometry and zoom.
+
+    Every entry stores a few reference pixels (position + colour) taken at
+    calibration time, so a saved layout can be checked against one capture
+    before it is reused.
+    """
+
+    def __init__(self, game: str, sct=None, zoom: Optional[str] = None, path: str = CACHE_FILE) -> None:
+        self.game = game
+        self.sct = sct if sct is not None else mss.mss()
+        self.path = path
+        self.key = screen_key(self.sct, zoom)
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") == CACHE_VERSION:
+                return data
+        except (OSError, ValueError):
+            pass
+        return {"version": CACHE_VERSION, "entries": {}}
+
+    def _write(self, data: dict) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def load(self) -> Optional[dict]:
+        """
+        Return the saved entry for this game and screen, or None.
+        """
+        return self._read()["entries"].get(self.key, {}).get(self.game)
+
+    def save(self, data: dict, ref_points: List[Tuple[int, int]]) -> dict:
+        """
+        Save calibration data together with the current colours at ref_points.
+        """
+        ref_points = [(int(x), int(y)) for x, y in ref_points]
+        colors = grab_points(self.sct, ref_points)
+        entry = dict(data)
+        entry["refs"] = [[x, y, list(c)] for (x, y), c in zip(ref_points, colors)]
+        entry["saved_at"] = time.time()
+
+        cache = self._read()
+        cache["entries"].setdefault(self.key, {})[self.game] = entry
+        self._write(cache)
+        print(f"Calibration saved for {self.game} ({self.key})")
+        return entry
+
+    def update(self, data: dict) -> Optional[dict]:
+        """
+        Add or replace fields of the saved entry, keeping its reference pixels
+        (for data learned later, when the screen no longer shows the calibrated
+        layout). Returns the entry, or None if there is nothing saved to update.
+        """
+        cache = self._read()
+        entry = cache["entries"].get(self.key, {}).get(self.game)
+        if entry is None:
+            return None
+        entry.update(data)
+        self._write(cache)
+        return entry
+
+    def clear(self) -> None:
+        """
+        Drop the saved entry so the next run recalibrates.
+        """
+        cache = self._read()
+        if cache["entries"].get(self.key, {}).pop(self.game, None) is not None:
+            self._write(cache)
+
+    def verify(self, entry: dict, tolerance: int = 12, min_fraction: float = 1.0) -> bool:
+        """
+        Check the saved reference pixels against one fresh capture.
+        """
+        refs = entry.get("refs") or []
+        if not refs:
+            return False
+        try:
+            colors = grab_points(self.sct, [(x, y) for x, y, _ in refs])
+        except Exception:
+            return False
+        matches = sum(1 for (_, _, saved), now in zip(refs, colors)
+                      if all(abs(a - b) <= tolerance for a, b in zip(saved, now)))
+        return matches >= len(refs) * min_fraction
+
+    def load_verified(self, tolerance: int = 12, min_fraction: float = 1.0) -> Optional[dict]:
+        """
+        Return the saved entry only if it still matches the screen.
+        """
+        entry = self.load()
+        if entry is None:
+            return None
+        if self.verify(entry, tolerance, min_fraction):
+            print(f"Using cached calibration for {self.game}")
+            return entry
+        print(f"Cached calibration for {self.game} does not match the screen - recalibrating")
+        return None
+
+    def wait_until_verified(self, entry: dict, timeout: float = 10.0, poll: float = 0.05,
+                            tolerance: int = 12, min_fraction: float = 1.0) -> bool:
+        """
+        Poll until the saved layout is on screen (replaces fixed countdowns).
+        Returns False if it did not show up within the timeout.
+        """
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            if self.verify(entry, tolerance, min_fraction):
+                return True
+            time.sleep(poll)
+        return False
@@ -0,0 +1,198 @@
+import threading
+import time
+from typing import List, Optional
+
+import mss
+import numpy as np
+
+from PerfMode import NullPerformanceMode
+
+# Solvers read the screen through a capture object with a single method,
+# grab(region) -> BGRA numpy array (height x width x 4). MssCapture is the
+# default, one grab per call. CaptureMultiplexer shares one grab per tick
+# between any number of solvers.
+
+
+def frame_from_shot(shot) -> np.ndarray:
+    """
+    Zero-copy BGRA view over an mss ScreenShot buffer.
+    """
+    return np.frombuffer(shot.raw, dtype=np.uint8).reshape(shot.height, shot.width, 4)
+
+
+class MssCapture:
+    """
+    Default capture: every grab is its own mss call.
+    """
+
+    def __init__(self, sct=None) -> None:
+        self.sct = sct if sct is not None else mss.mss()
+
+    def grab(self, region: dict) -> np.ndarray:
+        return frame_from_shot(self.sct.grab(region))
+
+
+class MuxView:
+    """
+    Capture object handed to one solver. grab() waits for a frame the solver
+    has not seen yet and returns a zero-copy slice of it.
+    """
+
+    def __init__(self, mux: "CaptureMultiplexer", region: dict) -> None:
+        self.mux = mux
+        self.region = region
+        self.served = {}  # region key -> id of the last frame it was served from
+
+    def grab(self, region: Optional[dict] = None, timeout: float = 1.0) -> np.ndarray:
+        """
+        Different regions asked for in one solver iteration come from the same
+        frame; asking for the same region again waits for the next frame.
+        """
+        region = region or self.region
+        key = (region['left'], region['top'], region['width'], region['height'])
+        frame, origin, frame_id = self.mux.wait_for_frame(self.served.get(key, -1), timeout)
+        self.served[key] = frame_id
+        return self.mux.sub_view(frame, origin, region)
+
+
+class CaptureMultiplexer:
+    """
+    One capture per tick of the union bounding box of every registered region
+    (or of a whole monitor), shared by all registered solvers.
+
+    Frames are never written to after they are published (every grab gets a
+    new buffer), so views handed out stay valid while solvers work on them.
+    """
+
+    def __init__(self, monitor: Optional[dict] = None, min_interval: float = 0.0, perf_mode=None) -> None:
+        self.monitor = monitor  # Capture this whole monitor instead of the union of regions
+        self.min_interval = min_interval  # Optional pacing between grabs (seconds)
+        self.perf_mode = perf_mode  # PerfMode.PerformanceMode applied to the capture thread
+        self.regions: List[dict] = []
+        self.bbox: Optional[dict] = None
+        self.frame: Optional[np.ndarray] = None
+        self.frame_origin = (0, 0)  # Screen position of frame[0, 0]
+        self.frame_id = -1
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread: Optional[threading.Thread] = None
+        self.grabs = 0
+        self.views_served = 0
+
+    def register(self, region: dict) -> MuxView:
+        """
+        Add a region (mss style dict) and return the capture object for its solver.
+        """
+        with self.condition:
+            self.regions.append(dict(region))
+            self.bbox = self.monitor or self._union(self.regions)
+        return MuxView(self, dict(region))
+
+    @staticmethod
+    def _union(regions: List[dict]) -> dict:
+        left = min(r['left'] for r in regions)
+        top = min(r['top'] for r in regions)
+        right = max(r['left'] + r['width'] for r in regions)
+        bottom = max(r['top'] + r['height'] for r in regions)
+        return {'left': left, 'top': top, 'width': right - left, 'height': bottom - top}
+
+    def tick(self, sct) -> np.ndarray:
+        """
+        Take one shared capture and publish it to the waiting solvers.
+        """
+        with self.condition:
+            bbox = dict(self.bbox)
+        frame = frame_from_shot(sct.grab(bbox))
+        with self.condition:
+            self.frame = frame
+            self.frame_origin = (bbox['left'], bbox['top'])
+            self.frame_id += 1
+            self.grabs += 1
+            self.condition.notify_all()
+        return frame
+
+    def _run(self) -> None:
+        # mss handles are per thread, the capture thread owns its own
+        with mss.mss() as sct, self.perf_mode or NullPerformanceMode():
+            while self.running:
+                start = time.perf_counter()
+                self.tick(sct)
+                if self.min_interval > 0:
+                    remaining = self.min_interval - (time.perf_counter() - start)
+                    if remaining > 0:
+                        time.sleep(remaining)
+
+    def start(self) -> None:
+        if self.bbox is None:
+            raise ValueError("Register at least one region (or pass a monitor) before starting")
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="capture-mux", daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout=1.0)
+            self.thread = None
+
+    def wait_for_frame(self, last_frame_id: int, timeout: float = 1.0):
+        """
+        Block until a frame newer than last_frame_id is published.
+        """
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.frame_id > last_frame_id, timeout):
+                raise TimeoutError("No new frame from the capture multiplexer")
+            return self.frame, self.frame_origin, self.frame_id
+
+    def sub_view(self, frame: np.ndarray, origin: tuple, region: dict) -> np.ndarray:
+        """
+        Zero-copy slice of a shared frame for a screen region inside it.
+        """
+        x = region['left'] - origin[0]
+        y = region['top'] - origin[1]
+        if x < 0 or y < 0 or x + region['width'] > frame.shape[1] or y + region['height'] > frame.shape[0]:
+            raise ValueError(f"Region {region} is outside the shared capture")
+        self.views_served += 1
+        return frame[y:y + region['height'], x:x + region['width']]
+
+    def report(self) -> None:
+        print(f"Capture multiplexer: {self.grabs} grabs served {self.views_served} views "
+              f"for {len(self.regions)} regions")
+
+
+def main() -> None:
+    from AimTrainer import AimTrainer
+
+    print("===== Shared Capture Aim Trainers =====")
+    print("Runs one Aim Trainer per browser window, all fed from a single capture per frame.")
+    print("=======================================")
+    try:
+        count = int(input("How many Aim Trainer windows? (default 2): ").strip() or "2")
+    except ValueError:
+        count = 2
+
+    mux = CaptureMultiplexer()
+    trainers = []
+    for i in range(count):
+        print(f"\nWindow {i + 1}:")
+        trainer = AimTrainer()
+        trainer.register_corners()
+        trainer.capture = mux.register(trainer.capture_region())
+        trainers.append(trainer)
+
+    mux.start()
+    threads = [threading.Thread(target=t.monitor_and_click, daemon=True) for t in trainers]
+    for thread in threads:
+        thread.start()
+    try:
+        while True:
+            time.sleep(5)
+            mux.report()
+    except KeyboardInterrupt:
+        mux.stop()
+        mux.report()
+        print("\nMonitoring stopped.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+import mss
+import numpy as np
+import time
+from typing import List, Optional, Tuple
+from CalibrationCache import CalibrationCache
+from GameLocator import find_button, locate_scan_area, print_scan_area, reference_points, scan_region
+from CaptureMultiplexer import MssCapture
+from InputBackend import DeferredInput
+from DetectionKernels import white_mask, warm_up
+from MetricsStore import MetricsSession, NullMetrics
+from LatencyStats import LoopStats
+from GlyphMatcher import GlyphBank, find_components, group_into_words, normalise_glyphs
+
+
+class ChimpTest:
+    def __init__(self, capture=None, input_backend=None, min_score: float = 0.6) -> None:
+        self.coords = []  # List of (x, y) coordinates for corners
+        self.sct = mss.mss() if capture is None else None  # Locator and cache open their own when None
+        self.capture = capture if capture is not None else MssCapture(self.sct)  # Anything with grab(region)
+        self.input = input_backend if input_backend is not None else DeferredInput()  # Mouse and keyboard events
+        self.scan_area = None  # Will store (x1, y1, x2, y2)
+        self.bank = GlyphBank.seed_digits()  # Digit templates, learns the page font as levels pass
+        self.min_score = min_score  # Lowest template correlation accepted for a digit
+        self.levels_solved = 0
+        self.wrong_answers = 0  # Levels that cost a strike
+        self.level_size = 0  # Numbers on the board of the last level
+        self.read_time = 0.0  # Seconds from capture to click plan of the last level
+        self.stats = LoopStats("Chimp loop")  # Board reads, complete board to click plan, click batches
+
+    def collect_coordinates(self, timeout: float = 10.0) -> list:
+        """Locate the play area from a full-screen capture, registering corners by hand if that fails."""
+        self.coords, self.scan_area = locate_scan_area(self.sct, timeout)
+        return self.coords
+
+    def scan_area_reference_points(self) -> list:
+        """Points just inside the scan area corners, used to check a cached layout."""
+        return reference_points(self.scan_area)
+
+    def load_or_collect_coordinates(self) -> list:
+        """
+        Reuse the cached scan area (and the digit templates learned with it) if it
+        still matches the screen, otherwise locate it again.
+        """
+        cache = CalibrationCache("ChimpTest", self.sct)
+        entry = cache.load_verified()
+        if entry is not None:
+            self.coords = [tuple(c) for c in entry["coords"]]
+            self.scan_area = tuple(entry["scan_area"])
+            if "glyphs" in entry:
+                self.bank = GlyphBank.from_json(entry["glyphs"])
+            print_scan_area(self.scan_area)
+            return self.coords
+
+        input("Press Enter, then switch to the Chimp Test page...")
+        self.collect_coordinates()
+        self.save_calibration()
+        return self.coords
+
+    def save_calibration(self) -> None:
+        """Save the scan area and the digit templates for the next run."""
+        cache = CalibrationCache("ChimpTest", self.sct)
+        cache.save({"coords": [list(c) for c in self.coords], "scan_area": list(self.scan_area),
+                    "glyphs": self.bank.to_json()},
+                   self.scan_area_reference_points())
+
+    def capture_region(self) -> dict:
+        """Screen region this solver reads, for registering with a shared capture."""
+        return scan_region(self.scan_area)
+
+    def capture_scan_area(self) -> Optional[np.ndarray]:
+        """Capture the entire scan area as a single screenshot."""
+        if not self.scan_area:
+            return None
+
+        return self.capture.grab(self.capture_region())
+
+    def read_board(self, img: np.ndarray) -> Tuple[List[Tuple[int, int, int]], list]:
+        """
+        Find the numbered squares in one frame.
+        The numbers are the white ink on the board: every glyph is a connected
+        component, glyphs side by side form one number, and all glyphs are
+        classified against the template bank in a single batch.
+        Returns ([(number, x, y), ...] sorted by number, with x, y relative to
+        the frame) and the glyphs used, as (digit, bitmap, score) for learning.
+        """
+        mask = white_mask(img, 240)
+        boxes = find_components(mask)
+        if len(boxes) == 0:
+            return [], []
+
+        # Digits are a few dozen pixels tall, drop specks and the filled squares
+        # that replace the numbers once the first one is clicked
+        heights = boxes[:, 3] - boxes[:, 1] + 1
+        widths = boxes[:, 2] - boxes[:, 0] + 1
+        max_height = img.shape[0] // 4
+        boxes = boxes[(heights >= 6) & (heights <= max_height) & (widths <= heights * 2)]
+        if len(boxes) == 0:
+            return [], []
+
+        digits, scores = self.bank.classify(normalise_glyphs(mask, boxes, self.bank.size))
+
+        numbers = []
+        glyphs = []
+        for word in group_into_words(boxes):
+            if min(scores[i] for i in word) < self.min_score:
+                continue
+            number = int("".join(digits[i] for i in word))
+            x1 = boxes[word[0], 0]
+            x2 = boxes[word[-1], 2]
+            y1 = boxes[word, 1].min()
+            y2 = boxes[word, 3].max()
+            numbers.append((number, int(x1 + x2) // 2, int(y1 + y2) // 2))
+            glyphs.extend((digits[i], mask[boxes[i, 1]:boxes[i, 3] + 1, boxes[i, 0]:boxes[i, 2] + 1].copy(),
+                           float(scores[i])) for i in word)
+        numbers.sort()
+        return numbers, glyphs
+
+    @staticmethod
+    def is_complete_level(numbers: List[Tuple[int, int, int]], min_numbers: int = 4) -> bool:
+        """A level shows exactly the numbers 1..N (N >= 4), anything else is a partial or misread frame."""
+        return len(numbers) >= min_numbers and [n for n, _, _ in numbers] == list(range(1, len(numbers) + 1))
+
+    def click_batch(self, points: List[Tuple[int, int]], interval: float = 0.0) -> None:
+        """
+        Click every point in order, without prints or waits between the clicks.
+        Without an interval the clicks go out as one batch where the backend can.
+        """
+        if interval <= 0:
+            with self.input.batch():
+                for x, y in points:
+                    self.input.click(x, y)
+            return
+        for x, y in points:
+            self.input.click(x, y)
+            time.sleep(interval)
+
+    def learn_glyphs(self, glyphs: list, below: float = 0.9) -> None:
+        """Add the digits of a passed level that matched the templates only loosely."""
+        learned = set()
+        for digit, bitmap, score in sorted(glyphs, key=lambda g: g[2]):
+            if score < below and digit not in learned:
+                self.bank.learn(digit, bitmap)
+                learned.add(digit)
+
+    def solve_level(self) -> Optional[list]:
+        """
+        Wait for a complete level, then click all of its squares in one batch.
+        Returns the glyphs the level was read from, or None if no level showed up.
+        """
+        x1, y1, _, _ = self.scan_area
+        while True:
+            start = time.perf_counter()
+            img = self.capture_scan_area()
+            numbers, glyphs = self.read_board(img)
+            read = time.perf_counter()
+            self.stats["frame"].record_seconds(read - start)
+            if self.is_complete_level(numbers):
+                break
+            time.sleep(0.01 if numbers else 0.05)  # Numbers but no full level: board still fading in
+
+        self.read_time = read - start
+        self.level_size = len(numbers)
+        self.stats["detect"].record_seconds(self.read_time)
+        self.click_batch([(x1 + x, y1 + y) for _, x, y in numbers])
+        self.stats["dispatch"].record_seconds(time.perf_counter() - read)
+        print(f"Level with {len(numbers)} numbers read in {self.read_time * 1000:.1f}ms and clicked")
+        return glyphs
+
+    def press_continue(self, timeout: float = 3.0) -> bool:
+        """Click the Continue button once the level result screen shows it."""
+        x1, y1, _, _ = self.scan_area
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            button = find_button(self.capture_scan_area())
+            if button is not None:
+                time.sleep(0.1)  # The button fades in, an early click can be swallowed
+                self.click_batch([(x1 + button[0], y1 + button[1])])
+                return True
+            time.sleep(0.05)
+        return False
+
+    def settle_level(self, size: int, glyphs: list, next_size: int, metrics) -> None:
+        """
+        Score the previous level once the next board is up. Only a right answer
+        adds a number: a strike repeats the same count, a new game after the
+        third strike starts again at 4. Glyphs are only learned from right answers.
+        """
+        wrong = next_size <= size
+        metrics.record("wrong_answers", int(wrong), level=self.levels_solved + 1, numbers=size)
+        if wrong:
+            self.wrong_answers += 1
+            print(f"The level with {size} numbers was answered wrong (strike)")
+            return
+        self.levels_solved += 1
+        self.learn_glyphs(glyphs)
+
+    def run(self, max_levels: int = 40, metrics=None) -> None:
+        """
+        Solve levels until max_levels or Ctrl+C. Start the test by hand first.
+        The board read time and whether the answer was right are recorded per level to metrics
+        (MetricsStore.MetricsSession), read and click percentiles are printed every few seconds.
+        """
+        metrics = metrics or NullMetrics()
+        print("Press Ctrl+C to exit.")
+        warm_up()  # Compile the detection kernels before the first board
+        previous = None  # (numbers, glyphs) of the last level, right or wrong shows on the next board
+        try:
+            while self.levels_solved < max_levels:
+                glyphs = self.solve_level()
+                if previous is not None:
+                    self.settle_level(*previous, self.level_size, metrics)
+                previous = (self.level_size, glyphs)
+                metrics.record("read_ms", self.read_time * 1000, level=self.levels_solved + 1,
+                               digits=len(glyphs))
+                self.stats.tick()
+                if not self.press_continue():
+                    print("No Continue button after the level - stopping")
+                    break
+        except KeyboardInterrupt:
+            print("\nStopped.")
+
+        read = self.stats["detect"]
+        if read.count:
+            print(f"Solved {self.levels_solved} levels ({self.wrong_answers} wrong, the last one unscored), "
+                  f"board read mean {read.mean / 1e6:.1f}ms, max {read.max / 1e6:.1f}ms")
+            self.stats.report()
+            self.stats.save(metrics)
+        if self.levels_solved:
+            self.save_calibration()  # Keep the learned digit templates
+
+def main() -> None:
+    print("===== Chimp Test Solver =====")
+    print("Reads every number on the board from one screenshot and clicks them all in order.")
+    print("Start the test on the page yourself, the solver takes over from the first level.")
+    print("=============================")
+
+    solver = ChimpTest()
+    solver.load_or_collect_coordinates()
+    try:
+        max_levels = int(input("How many levels to solve? (default 40): ").strip() or "40")
+    except ValueError:
+        max_levels = 40
+
+    print("\nWaiting for the first level...")
+    with MetricsSession("ChimpTest", params={"max_levels": max_levels, "min_score": solver.min_score}) as metrics:
+        solver.run(max_levels=max_levels, metrics=metrics)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, List, Optional, Tuple
+
+try:
+    import win32clipboard
+except ImportError:
+    win32clipboard = None  # Only MemoryClipboard works without it
+
+# Clipboard text through a backend object, like input goes through InputBackend.
+# Every clipboard write bumps a sequence number, so instead of sleeping and
+# hoping, ClipboardSession waits until the number moves (or a timeout passes)
+# and records how long each wait took. Backends only need open/close,
+# get_text/set_text and sequence().
+
+
+class Win32Clipboard:
+    """
+    The Windows clipboard. Only one process can have it open at a time, so
+    open() can fail while another one is reading or writing it.
+    """
+
+    def sequence(self) -> int:
+        return win32clipboard.GetClipboardSequenceNumber()
+
+    def open(self) -> bool:
+        try:
+            win32clipboard.OpenClipboard()
+            return True
+        except win32clipboard.error:
+            return False
+
+    def close(self) -> None:
+        win32clipboard.CloseClipboard()
+
+    def get_text(self) -> str:
+        if not win32clipboard.IsClipboardFormatAvailable(win32clipboard.CF_UNICODETEXT):
+            return ""
+        return win32clipboard.GetClipboardData(win32clipboard.CF_UNICODETEXT)
+
+    def set_text(self, text: str) -> None:
+        win32clipboard.EmptyClipboard()
+        if text:
+            win32clipboard.SetClipboardText(text, win32clipboard.CF_UNICODETEXT)
+
+
+class MemoryClipboard:
+    """
+    Stand-in clipboard in memory (Linux, benchmarks), with the same rules:
+    one holder at a time and a sequence number bumped by every write.
+    write_later() plays another application copying something.
+    """
+
+    def __init__(self, text: str = "") -> None:
+        self.text = text
+        self.seq = 1
+        self.held = threading.Lock()
+        self.opens = 0
+
+    def sequence(self) -> int:
+        return self.seq
+
+    def open(self) -> bool:
+        if not self.held.acquire(blocking=False):
+            return False
+        self.opens += 1
+        return True
+
+    def close(self) -> None:
+        self.held.release()
+
+    def get_text(self) -> str:
+        return self.text
+
+    def set_text(self, text: str) -> None:
+        self.text = text
+        self.seq += 1
+
+    def write_later(self, text: str, delay: float) -> threading.Thread:
+        """
+        Write text from another thread after delay seconds, waiting for the clipboard to be free.
+        """
+        def write():
+            time.sleep(delay)
+            while not self.open():
+                time.sleep(0.0005)
+            try:
+                self.set_text(text)
+            finally:
+                self.close()
+
+        thread = threading.Thread(target=write, name="clipboard-writer", daemon=True)
+        thread.start()
+        return thread
+
+
+class ClipboardSession:
+    """
+    Clipboard operations that wait for the clipboard instead of sleeping.
+
+    copy() triggers a copy (e.g. Ctrl+C) and returns as soon as the sequence
+    number moves. holding() puts text on the clipboard for a paste and puts
+    the old text back afterwards: saving and setting share one open, the
+    restore is the second (the clipboard has to be closed while the target
+    application reads it). Every wait is kept in `waits` as
+    (what, seconds, finished before the timeout).
+    """
+
+    def __init__(self, backend=None, timeout: float = 1.0, poll: float = 0.0005) -> None:
+        self.backend = backend if backend is not None else Win32Clipboard()
+        self.timeout = timeout
+        self.poll = poll
+        self.waits: List[Tuple[str, float, bool]] = []
+
+    def _wait(self, what: str, ready: Callable[[], bool], timeout: Optional[float] = None) -> bool:
+        start = time.perf_counter()
+        deadline = start + (self.timeout if timeout is None else timeout)
+        ok = ready()
+        while not ok and time.perf_counter() < deadline:
+            time.sleep(self.poll)
+            ok = ready()
+        self.waits.append((what, time.perf_counter() - start, ok))
+        return ok
+
+    @contextmanager
+    def opened(self):
+        """
+        The clipboard, opened once for everything done inside the block.
+        """
+        if not self._wait("open", self.backend.open):
+            raise TimeoutError("Clipboard is held by another application")
+        try:
+            yield self.backend
+        finally:
+            self.backend.close()
+
+    def read_text(self) -> str:
+        with self.opened() as clipboard:
+            return clipboard.get_text()
+
+    def copy(self, trigger: Callable[[], None], timeout: Optional[float] = None) -> Optional[str]:
+        """
+        Run trigger (which should make something write to the clipboard) and
+        return the new clipboard text, or None if nothing was written in time.
+        """
+        before = self.backend.sequence()
+        trigger()
+        if not self._wait("copy", lambda: self.backend.sequence() != before, timeout):
+            return None
+        return self.read_text()
+
+    @contextmanager
+    def holding(self, text: str):
+        """
+        Text is on the clipboard inside the block, the previous text is back
+        after it (unless something else wrote to the clipboard meanwhile).
+        """
+        with self.opened() as clipboard:
+            original = clipboard.get_text()
+            clipboard.set_text(text)
+        ours = self.backend.sequence()
+        try:
+            yield
+        finally:
+            if self.backend.sequence() == ours:
+                with self.opened() as clipboard:
+                    clipboard.set_text(original)
+
+    def summary(self) -> dict:
+        """
+        Per kind of wait: count, timeouts and mean / max milliseconds.
+        """
+        stats = {}
+        for what in dict.fromkeys(what for what, _, _ in self.waits):
+            times = [seconds * 1000 for kind, seconds, _ in self.waits if kind == what]
+            stats[what] = {"count": len(times), "timeouts": sum(1 for kind, _, ok in self.waits if kind == what and not ok),
+                           "mean_ms": sum(times) / len(times), "max_ms": max(times)}
+        return stats
+
+    def report(self) -> None:
+        for what, s in self.summary().items():
+            print(f"Clipboard {what} waits: {s['count']}, mean {s['mean_ms']:.2f}ms, max {s['max_ms']:.2f}ms"
+                  + (f", {s['timeouts']} timed out" if s['timeouts'] else ""))
@@ -0,0 +1,185 @@
+from typing import Tuple
+
+import numpy as np
+
+# Per-frame detection kernels shared by the solvers. Every kernel has a
+# vectorized NumPy version; when numba is installed a compiled version with
+# the same results is used instead. Frames are BGRA arrays (mss layout),
+# colours are given as RGB tuples like everywhere else in the solvers.
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+USING_NUMBA = numba is not None
+
+
+def _bgr(color: Tuple[int, int, int]) -> np.ndarray:
+    r, g, b = color
+    return np.array((b, g, r), dtype=np.int16)
+
+
+# ---------------------------------------------------------------- NumPy versions
+
+def grid_color_hits_numpy(img: np.ndarray, step: int, target_rgb: Tuple[int, int, int], tolerance: int,
+                          compact: bool = False) -> np.ndarray:
+    """
+    Sample every step-th pixel on every step-th row and return the (row, col)
+    positions whose colour is within tolerance of target_rgb on all channels,
+    in row-major order. With compact=True img holds only the sampled rows
+    (row i is row i * step of the area), positions are still area positions.
+    """
+    samples = img[::1 if compact else step, ::step, :3].astype(np.int16)
+    match = (np.abs(samples - _bgr(target_rgb)) <= tolerance).all(axis=-1)
+    rows, cols = np.nonzero(match)
+    return np.stack((rows * step, cols * step), axis=1).astype(np.int64)
+
+
+def count_color_runs_numpy(line: np.ndarray, target_rgb: Tuple[int, int, int], tolerance: int) -> int:
+    """
+    Number of separate runs of target-coloured pixels along a line of pixels (N x 4).
+    """
+    if line.shape[0] == 0:
+        return 0
+    match = (np.abs(line[:, :3].astype(np.int16) - _bgr(target_rgb)) <= tolerance).all(axis=-1)
+    return int(match[0]) + int(np.count_nonzero(match[1:] & ~match[:-1]))
+
+
+def white_mask_numpy(pixels: np.ndarray, threshold: int = 240) -> np.ndarray:
+    """
+    True where every colour channel is >= threshold (pixels is ... x 3 or ... x 4).
+    """
+    return (pixels[..., :3] >= threshold).all(axis=-1)
+
+
+def off_color_mask_numpy(pixels: np.ndarray, color: Tuple[int, int, int], threshold: int) -> np.ndarray:
+    """
+    True where any colour channel differs from color (RGB) by more than threshold.
+    """
+    return (np.abs(pixels[..., :3].astype(np.int16) - _bgr(color)) > threshold).any(axis=-1)
+
+
+def majority_color_numpy(pixels: np.ndarray, palette: np.ndarray, tolerance: int, quorum: int) -> int:
+    """
+    Index of the palette colour (palette is K x 3 RGB) that at least quorum of
+    the pixels (N x 4) are within tolerance of on all channels, or -1 if none is.
+    """
+    diff = np.abs(pixels[:, None, :3].astype(np.int16) - palette[None, :, ::-1].astype(np.int16))
+    votes = (diff <= tolerance).all(axis=-1).sum(axis=0)
+    best = int(votes.argmax())
+    return best if votes[best] >= quorum else -1
+
+
+# ---------------------------------------------------------------- numba versions
+
+if USING_NUMBA:
+    @numba.njit(cache=True, nogil=True)
+    def _grid_color_hits_nb(img, step, row_step, tr, tg, tb, tolerance):
+        height, width = img.shape[0], img.shape[1]
+        rows = (height + row_step - 1) // row_step
+        out = np.empty((rows * ((width + step - 1) // step), 2), dtype=np.int64)
+        n = 0
+        for i in range(rows):
+            y = i * row_step
+            for x in range(0, width, step):
+                if (abs(np.int32(img[y, x, 2]) - tr) <= tolerance and
+                        abs(np.int32(img[y, x, 1]) - tg) <= tolerance and
+                        abs(np.int32(img[y, x, 0]) - tb) <= tolerance):
+                    out[n, 0] = i * step
+                    out[n, 1] = x
+                    n += 1
+        return out[:n]
+
+    @numba.njit(cache=True, nogil=True)
+    def _count_color_runs_nb(line, tr, tg, tb, tolerance):
+        runs = 0
+        inside = False
+        for i in range(line.shape[0]):
+            match = (abs(np.int32(line[i, 2]) - tr) <= tolerance and
+                     abs(np.int32(line[i, 1]) - tg) <= tolerance and
+                     abs(np.int32(line[i, 0]) - tb) <= tolerance)
+            if match and not inside:
+                runs += 1
+            inside = match
+        return runs
+
+    @numba.njit(cache=True, nogil=True)
+    def _white_mask_nb(flat, threshold):
+        out = np.empty(flat.shape[0], dtype=np.bool_)
+        for i in range(flat.shape[0]):
+            out[i] = flat[i, 0] >= threshold and flat[i, 1] >= threshold and flat[i, 2] >= threshold
+        return out
+
+    @numba.njit(cache=True, nogil=True)
+    def _off_color_mask_nb(img, tr, tg, tb, threshold):
+        out = np.empty((img.shape[0], img.shape[1]), dtype=np.bool_)
+        for y in range(img.shape[0]):
+            for x in range(img.shape[1]):
+                out[y, x] = (abs(np.int32(img[y, x, 2]) - tr) > threshold or
+                             abs(np.int32(img[y, x, 1]) - tg) > threshold or
+                             abs(np.int32(img[y, x, 0]) - tb) > threshold)
+        return out
+
+    @numba.njit(cache=True, nogil=True)
+    def _majority_color_nb(pixels, palette, tolerance, quorum):
+        votes = np.zeros(palette.shape[0], dtype=np.int64)
+        for i in range(pixels.shape[0]):
+            for k in range(palette.shape[0]):
+                if (abs(np.int32(pixels[i, 2]) - palette[k, 0]) <= tolerance and
+                        abs(np.int32(pixels[i, 1]) - palette[k, 1]) <= tolerance and
+                        abs(np.int32(pixels[i, 0]) - palette[k, 2]) <= tolerance):
+                    votes[k] += 1
+        best = 0
+        for k in range(1, palette.shape[0]):
+            if votes[k] > votes[best]:
+                best = k
+        return best if votes[best] >= quorum else -1
+
+    def grid_color_hits_numba(img: np.ndarray, step: int, target_rgb: Tuple[int, int, int], tolerance: int,
+                              compact: bool = False) -> np.ndarray:
+        r, g, b = target_rgb
+        return _grid_color_hits_nb(img, step, 1 if compact else step, r, g, b, tolerance)
+
+    def count_color_runs_numba(line: np.ndarray, target_rgb: Tuple[int, int, int], tolerance: int) -> int:
+        r, g, b = target_rgb
+        return int(_count_color_runs_nb(line, r, g, b, tolerance))
+
+    def white_mask_numba(pixels: np.ndarray, threshold: int = 240) -> np.ndarray:
+        flat = pixels.reshape(-1, pixels.shape[-1])
+        return _white_mask_nb(flat, threshold).reshape(pixels.shape[:-1])
+
+    def off_color_mask_numba(pixels: np.ndarray, color: Tuple[int, int, int], threshold: int) -> np.ndarray:
+        r, g, b = color
+        return _off_color_mask_nb(pixels, r, g, b, threshold)
+
+    def majority_color_numba(pixels: np.ndarray, palette: np.ndarray, tolerance: int, quorum: int) -> int:
+        return int(_majority_color_nb(pixels, palette, tolerance, quorum))
+
+    grid_color_hits = grid_color_hits_numba
+    count_color_runs = count_color_runs_numba
+    white_mask = white_mask_numba
+    off_color_mask = off_color_mask_numba
+    majority_color = majority_color_numba
+else:
+    grid_color_hits_numba = count_color_runs_numba = white_mask_numba = off_color_mask_numba = None
+    majority_color_numba = None
+
+    grid_color_hits = grid_color_hits_numpy
+    count_color_runs = count_color_runs_numpy
+    white_mask = white_mask_numpy
+    off_color_mask = off_color_mask_numpy
+    majority_color = majority_color_numpy
+
+
+def warm_up() -> None:
+    """
+    Compile the numba kernels (or load them from cache) before the first hot frame.
+    """
+    frame = np.zeros((4, 4, 4), dtype=np.uint8)
+    grid_color_hits(frame, 2, (0, 0, 0), 1)
+    grid_color_hits(frame[::2], 2, (0, 0, 0), 1, compact=True)  # Rows sliced out of a full frame
+    count_color_runs(frame[:, 0], (0, 0, 0), 1)
+    white_mask(frame)
+    off_color_mask(frame, (0, 0, 0), 1)
+    majority_color(frame[0], np.zeros((2, 3), dtype=np.int32), 1, 1)
@@ -0,0 +1,308 @@
+import time
+from typing import List, Optional, Tuple
+
+import mss
+import numpy as np
+
+try:
+    import win32api
+except ImportError:
+    win32api = None  # Corners can only be registered by hand on Windows
+
+# Known Human Benchmark play-area backgrounds (RGB)
+BACKGROUND_BLUES = [
+    (0x2b, 0x87, 0xd1),  # #2b87d1 - test area background
+]
+BUTTON_YELLOW = (0xff, 0xd1, 0x54)  # #ffd154 - Start / Continue / Next / Submit buttons
+
+
+def _runs(mask: np.ndarray) -> List[Tuple[int, int]]:
+    """
+    Return (start, end) index pairs (inclusive) of the True runs in a 1D mask.
+    """
+    padded = np.concatenate(([False], mask, [False])).astype(np.int8)
+    edges = np.flatnonzero(np.diff(padded))
+    return [(int(s), int(e) - 1) for s, e in zip(edges[::2], edges[1::2])]
+
+
+def _widest_run(mask: np.ndarray, max_gap: int = 0) -> Optional[Tuple[int, int]]:
+    """
+    Widest True run in a 1D mask, bridging gaps of up to max_gap samples.
+    """
+    runs = _runs(mask)
+    if not runs:
+        return None
+    merged = [list(runs[0])]
+    for start, end in runs[1:]:
+        if start - merged[-1][1] - 1 <= max_gap:
+            merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    start, end = max(merged, key=lambda r: r[1] - r[0])
+    return start, end
+
+
+def background_mask(img: np.ndarray, tolerance: int = 8) -> np.ndarray:
+    """
+    Boolean mask of pixels matching one of the background blues (img is BGRA).
+    """
+    b = img[..., 0].astype(np.int16)
+    g = img[..., 1].astype(np.int16)
+    r = img[..., 2].astype(np.int16)
+    mask = np.zeros(img.shape[:2], dtype=bool)
+    for target_r, target_g, target_b in BACKGROUND_BLUES:
+        mask |= ((np.abs(r - target_r) <= tolerance) &
+                 (np.abs(g - target_g) <= tolerance) &
+                 (np.abs(b - target_b) <= tolerance))
+    return mask
+
+
+class GameLocator:
+    """
+    Finds the Human Benchmark play area in one full-screen capture and derives
+    the per-game layouts (tile centres, scan rectangle, grid box) from it.
+    """
+
+    def __init__(self, sct=None, downsample: int = 4, tolerance: int = 8) -> None:
+        self.sct = sct if sct is not None else mss.mss()
+        self.downsample = downsample
+        self.tolerance = tolerance
+        self.frame: Optional[np.ndarray] = None  # Full resolution BGRA capture
+        self.offset = (0, 0)  # Screen position of frame[0, 0]
+        self.area: Optional[Tuple[int, int, int, int]] = None  # Play area (x1, y1, x2, y2), screen coords
+        self.board: Optional[Tuple[int, int, int, int]] = None  # Game board inside the play area
+
+    def capture(self) -> np.ndarray:
+        """
+        Grab the whole virtual screen once (zero-copy view over the mss buffer).
+        """
+        monitor = self.sct.monitors[0]
+        shot = self.sct.grab(monitor)
+        self.frame = np.frombuffer(shot.raw, dtype=np.uint8).reshape(shot.height, shot.width, 4)
+        self.offset = (monitor['left'], monitor['top'])
+        return self.frame
+
+    def locate(self, frame: Optional[np.ndarray] = None, offset: Tuple[int, int] = (0, 0)) -> Optional[Tuple[int, int, int, int]]:
+        """
+        Locate the play area and the board inside it.
+        Uses the given frame, or takes a new capture when frame is None.
+        """
+        if frame is None:
+            self.capture()
+        else:
+            self.frame, self.offset = frame, offset
+        self.area = self._find_play_area()
+        self.board = self._find_board() if self.area else None
+        return self.area
+
+    def wait_for_play_area(self, timeout: float = 10.0, poll: float = 0.1) -> Optional[Tuple[int, int, int, int]]:
+        """
+        Keep locating until the play area shows up on screen or the timeout expires.
+        """
+        deadline = time.perf_counter() + timeout
+        while True:
+            start = time.perf_counter()
+            area = self.locate()
+            if area is not None:
+                print(f"Play area located at {area} in {(time.perf_counter() - start) * 1000:.1f}ms")
+                return area
+            if time.perf_counter() >= deadline:
+                return None
+            time.sleep(poll)
+
+    def _find_play_area(self) -> Optional[Tuple[int, int, int, int]]:
+        """
+        Projection profiles of the background mask on the downsampled frame.
+        """
+        ds = self.downsample
+        small = self.frame[::ds, ::ds]
+        mask = background_mask(small, self.tolerance)
+
+        row_counts = mask.sum(axis=1)
+        if row_counts.max() < 16:
+            return None
+        # Rows through the board still have background on both sides of it
+        rows = _widest_run(row_counts >= row_counts.max() * 0.3)
+        if rows is None or rows[1] - rows[0] < 16:
+            return None
+
+        col_fill = mask[rows[0]:rows[1] + 1].mean(axis=0)
+        cols = _widest_run(col_fill >= 0.15)
+        if cols is None or cols[1] - cols[0] < 16:
+            return None
+
+        ox, oy = self.offset
+        return (ox + cols[0] * ds, oy + rows[0] * ds,
+                ox + min((cols[1] + 1) * ds, self.frame.shape[1]) - 1,
+                oy + min((rows[1] + 1) * ds, self.frame.shape[0]) - 1)
+
+    def _find_board(self) -> Optional[Tuple[int, int, int, int]]:
+        """
+        Find the block of non-background pixels around the centre of the play area
+        (tiles, cubes), then refine its edges at full resolution.
+        """
+        ox, oy = self.offset
+        x1, y1, x2, y2 = self.area
+        ds = self.downsample
+        crop = self.frame[y1 - oy:y2 - oy + 1:ds, x1 - ox:x2 - ox + 1:ds]
+        content = ~background_mask(crop, self.tolerance // 2)
+
+        # Tiles are separated by background gaps, bridge those when looking for the board
+        max_gap = max(2, min(crop.shape[:2]) // 12)
+        cols = _widest_run(content.mean(axis=0) > 0.05, max_gap)
+        if cols is None:
+            return None
+        # Tile rows are mostly filled, text above the board (level counters) is sparse ink
+        rows = _widest_run(content[:, cols[0]:cols[1] + 1].mean(axis=1) > 0.5, max_gap)
+        if rows is None:
+            return None
+        cols = _widest_run(content[rows[0]:rows[1] + 1].mean(axis=0) > 0.5, max_gap)
+        if cols is None or cols[1] - cols[0] < 4 or rows[1] - rows[0] < 4:
+            return None
+
+        # Refine at full resolution inside a one-sample margin
+        bx1 = x1 + max(cols[0] - 1, 0) * ds
+        by1 = y1 + max(rows[0] - 1, 0) * ds
+        bx2 = min(x1 + (cols[1] + 2) * ds, x2)
+        by2 = min(y1 + (rows[1] + 2) * ds, y2)
+        fine = ~background_mask(self.frame[by1 - oy:by2 - oy + 1, bx1 - ox:bx2 - ox + 1], self.tolerance // 2)
+        fine_cols = np.flatnonzero(fine.any(axis=0))
+        fine_rows = np.flatnonzero(fine.any(axis=1))
+        if fine_cols.size == 0 or fine_rows.size == 0:
+            return None
+        return (bx1 + int(fine_cols[0]), by1 + int(fine_rows[0]),
+                bx1 + int(fine_cols[-1]), by1 + int(fine_rows[-1]))
+
+    def sequence_tile_centers(self, grid: int = 3) -> List[Tuple[int, int]]:
+        """
+        Centres of the Sequence Memory tiles, row by row.
+        """
+        if self.board is None:
+            return []
+        return grid_cell_centers(self.board, grid)
+
+    def aim_scan_area(self) -> Optional[Tuple[int, int, int, int]]:
+        """
+        Scan rectangle for AimTrainer: the whole play area.
+        """
+        return self.area
+
+    def grid_box(self) -> Optional[List[Tuple[int, int]]]:
+        """
+        Two opposite corners of the Visual Memory grid (CubeGridCounter format).
+        """
+        if self.board is None:
+            return None
+        x1, y1, x2, y2 = self.board
+        return [(x1, y1), (x2, y2)]
+
+
+def find_button(img: np.ndarray, color: Tuple[int, int, int] = BUTTON_YELLOW, tolerance: int = 12,
+                min_pixels: int = 200) -> Optional[Tuple[int, int]]:
+    """
+    Centre (x, y relative to img) of the button in a BGRA frame, or None if none is shown.
+    """
+    r, g, b = color
+    match = ((np.abs(img[..., 2].astype(np.int16) - r) <= tolerance) &
+             (np.abs(img[..., 1].astype(np.int16) - g) <= tolerance) &
+             (np.abs(img[..., 0].astype(np.int16) - b) <= tolerance))
+    ys, xs = np.nonzero(match)
+    if ys.size < min_pixels:
+        return None
+    return int(xs.mean()), int(ys.mean())
+
+
+def find_buttons(img: np.ndarray, color: Tuple[int, int, int] = BUTTON_YELLOW, tolerance: int = 12,
+                 min_pixels: int = 200) -> List[Tuple[int, int]]:
+    """
+    Centres (relative to img) of the buttons side by side in a BGRA frame, left to right.
+    """
+    r, g, b = color
+    match = ((np.abs(img[..., 2].astype(np.int16) - r) <= tolerance) &
+             (np.abs(img[..., 1].astype(np.int16) - g) <= tolerance) &
+             (np.abs(img[..., 0].astype(np.int16) - b) <= tolerance))
+    centres = []
+    for start, end in _runs(match.any(axis=0)):
+        ys, xs = np.nonzero(match[:, start:end + 1])
+        if ys.size >= min_pixels:
+            centres.append((start + int(xs.mean()), int(ys.mean())))
+    return centres
+
+
+def grid_cell_centers(box: Tuple[int, int, int, int], grid: int) -> List[Tuple[int, int]]:
+    """
+    Centres of a grid x grid layout inside box, row by row.
+    """
+    x1, y1, x2, y2 = box
+    cell_w = (x2 - x1 + 1) / grid
+    cell_h = (y2 - y1 + 1) / grid
+    return [(int(x1 + (col + 0.5) * cell_w), int(y1 + (row + 0.5) * cell_h))
+            for row in range(grid) for col in range(grid)]
+
+
+def print_scan_area(scan_area: Tuple[int, int, int, int], note: Optional[str] = None) -> None:
+    x1, y1, x2, y2 = scan_area
+    print(f"Scan area defined: ({x1}, {y1}) to ({x2}, {y2})")
+    if note:
+        print(note)
+
+
+def register_corners(prompt: str, note: Optional[str] = None) \
+        -> Tuple[List[Tuple[int, int]], Tuple[int, int, int, int]]:
+    """
+    Two corners registered by hand, the mouse position each time 'C' is pressed.
+    Returns them with the scan area (x1, y1, x2, y2) they span; note is printed
+    after the scan area.
+    """
+    print(prompt)
+    coords = []
+    prev_key_state = 0
+    while len(coords) < 2:
+        curr_key_state = win32api.GetKeyState(0x43)  # 'C' key
+
+        # Detect press (transition from not pressed to pressed)
+        if curr_key_state < 0 and prev_key_state >= 0:
+            x, y = win32api.GetCursorPos()
+            coords.append((x, y))
+            print(f"Corner {len(coords)} registered: ({x}, {y})")
+            time.sleep(0.2)  # debounce delay
+        prev_key_state = curr_key_state
+        time.sleep(0.01)
+
+    (x1, y1), (x2, y2) = coords
+    scan_area = (min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
+    print_scan_area(scan_area, note)
+    return coords, scan_area
+
+
+def locate_scan_area(sct=None, timeout: float = 10.0,
+                     prompt: str = "Please position your mouse over 2 opposite corners of the blue test area "
+                                   "and press 'C' to register each coordinate.",
+                     note: Optional[str] = None) -> Tuple[List[Tuple[int, int]], Tuple[int, int, int, int]]:
+    """
+    Corners and scan area of the play area, located from a full-screen capture,
+    or registered by hand (prompt) if that fails. note is printed after the scan area.
+    """
+    area = GameLocator(sct).wait_for_play_area(timeout=timeout)
+    if area is None:
+        print("Could not locate the play area automatically.")
+        return register_corners(prompt, note)
+    print_scan_area(area, note)
+    return [(area[0], area[1]), (area[2], area[3])], area
+
+
+def reference_points(scan_area: Tuple[int, int, int, int], inset: int = 4) -> List[Tuple[int, int]]:
+    """
+    Points just inside the scan area corners, used to check a cached layout.
+    """
+    x1, y1, x2, y2 = scan_area
+    return [(x1 + inset, y1 + inset), (x2 - inset, y1 + inset),
+            (x1 + inset, y2 - inset), (x2 - inset, y2 - inset)]
+
+
+def scan_region(scan_area: Tuple[int, int, int, int]) -> dict:
+    """
+    Capture region (mss format) of a scan area.
+    """
+    x1, y1, x2, y2 = scan_area
+    return {'top': y1, 'left': x1, 'width': x2 - x1, 'height': y2 - y1}
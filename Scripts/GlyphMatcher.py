@@ -0,0 +1,309 @@
+import base64
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Text on the Human Benchmark pages is read without an OCR engine: the ink is
+# split into connected components, every component is scaled into a fixed
+# box and the whole batch is matched against a bank of glyph templates with
+# one matrix product.
+
+GLYPH_SIZE = (16, 12)  # Normalised glyph box (height, width)
+
+# Seed templates, a plain sans-serif digit set. The bank learns the real
+# on-screen glyphs on top of these (GlyphBank.learn).
+SEED_DIGITS = {
+    "0": ["..####..", ".##..##.", "##....##", "##....##", "##....##", "##....##",
+          "##....##", "##....##", "##....##", "##....##", ".##..##.", "..####.."],
+    "1": ["...##...", "..###...", ".####...", "##.##...", "...##...", "...##...",
+          "...##...", "...##...", "...##...", "...##...", "...##...", "...##..."],
+    "2": ["..####..", ".##..##.", "##....##", "......##", "......##", ".....##.",
+          "....##..", "...##...", "..##....", ".##.....", "##......", "########"],
+    "3": [".######.", "......##", ".....##.", "....##..", "...##...", "..####..",
+          "......##", "......##", "......##", "##....##", ".##..##.", "..####.."],
+    "4": [".....##.", "....###.", "...####.", "..##.##.", ".##..##.", "##...##.",
+          "##...##.", "########", ".....##.", ".....##.", ".....##.", ".....##."],
+    "5": ["########", "##......", "##......", "##......", "######..", ".....##.",
+          "......##", "......##", "......##", "##....##", ".##..##.", "..####.."],
+    "6": ["...###..", "..##....", ".##.....", "##......", "##.###..", "###..##.",
+          "##....##", "##....##", "##....##", "##....##", ".##..##.", "..####.."],
+    "7": ["########", "......##", ".....##.", ".....##.", "....##..", "....##..",
+          "...##...", "...##...", "..##....", "..##....", "..##....", "..##...."],
+    "8": ["..####..", ".##..##.", "##....##", "##....##", ".##..##.", "..####..",
+          ".##..##.", "##....##", "##....##", "##....##", ".##..##.", "..####.."],
+    "9": ["..####..", ".##..##.", "##....##", "##....##", "##....##", "##....##",
+          ".##..###", "..###.##", "......##", ".....##.", "....##..", "..###..."],
+}
+
+
+def seed_bitmap(label: str) -> np.ndarray:
+    """
+    Boolean bitmap of a seed glyph.
+    """
+    return np.array([[c == "#" for c in row] for row in SEED_DIGITS[label]], dtype=bool)
+
+
+def find_components(mask: np.ndarray) -> np.ndarray:
+    """
+    8-connected components of a boolean mask.
+
+    Works on horizontal runs instead of pixels: runs are found with one diff,
+    runs touching in consecutive rows are paired with searchsorted, and labels
+    are merged by hooking and pointer jumping over those pairs, all vectorized.
+    Returns an (n, 5) int64 array of x1, y1, x2, y2 (inclusive) and pixel count,
+    ordered by the first pixel of each component in row-major order.
+    """
+    height, width = mask.shape
+    padded = np.zeros((height, width + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    edges = padded[:, 1:] - padded[:, :-1]  # +1 where a run starts, -1 one past its end
+    changes = np.flatnonzero(edges)
+    # Starts and ends alternate along every row
+    run_rows, run_starts = np.divmod(changes[0::2], width + 1)
+    run_ends = changes[1::2] % (width + 1)  # Exclusive
+    n = run_rows.size
+    if n == 0:
+        return np.zeros((0, 5), dtype=np.int64)
+
+    # Run j touches run i in the row above when their column ranges overlap or
+    # meet diagonally. Keys put all rows on one axis so searchsorted sees only row r - 1.
+    stride = width + 2
+    start_keys = run_rows * stride + run_starts
+    end_keys = run_rows * stride + run_ends
+    above = (run_rows - 1) * stride
+    lo = np.searchsorted(end_keys, above + run_starts, side='left')
+    hi = np.searchsorted(start_keys, above + run_ends, side='right')
+    counts = np.maximum(hi - lo, 0)
+    total = int(counts.sum())
+    labels = np.arange(n)
+    if total:
+        src = np.repeat(np.arange(n), counts)
+        dst = np.repeat(lo, counts) + np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        while True:
+            # Hook the larger root of every edge under the smaller one, then
+            # flatten the trees completely (pointer jumping)
+            a, b = labels[src], labels[dst]
+            differ = a != b
+            if not differ.any():
+                break
+            np.minimum.at(labels, np.maximum(a[differ], b[differ]), np.minimum(a[differ], b[differ]))
+            while True:
+                jumped = labels[labels]
+                if np.array_equal(jumped, labels):
+                    break
+                labels = jumped
+
+    roots, component = np.unique(labels, return_inverse=True)
+    k = roots.size
+    boxes = np.empty((k, 5), dtype=np.int64)
+    boxes[:, 0] = width
+    boxes[:, 1] = height
+    boxes[:, 2:4] = -1
+    np.minimum.at(boxes[:, 0], component, run_starts)
+    np.minimum.at(boxes[:, 1], component, run_rows)
+    np.maximum.at(boxes[:, 2], component, run_ends - 1)
+    np.maximum.at(boxes[:, 3], component, run_rows)
+    boxes[:, 4] = np.bincount(component, weights=run_ends - run_starts, minlength=k)
+    return boxes
+
+
+def tallest_text_line(mask: np.ndarray, min_height: int = 1) -> Optional[Tuple[int, int]]:
+    """
+    First and last row of the tallest run of rows holding ink (the biggest
+    line of text), or None when it is lower than min_height.
+    """
+    ink_rows = mask.any(axis=1)
+    changes = np.flatnonzero(np.diff(np.concatenate(([False], ink_rows, [False])).view(np.int8)))
+    if changes.size == 0:
+        return None
+    starts, ends = changes[0::2], changes[1::2] - 1
+    tallest = int(np.argmax(ends - starts))
+    if ends[tallest] - starts[tallest] + 1 < min_height:
+        return None
+    return int(starts[tallest]), int(ends[tallest])
+
+
+def split_columns(mask: np.ndarray) -> np.ndarray:
+    """
+    Split one line of text into glyphs with its column projection profile:
+    every run of columns holding ink is one glyph. Returns an (n, 4) int64
+    array of x1, y1, x2, y2 (inclusive), rows tightened to each glyph's ink.
+    """
+    height = mask.shape[0]
+    ink_columns = mask.any(axis=0)
+    changes = np.flatnonzero(np.diff(np.concatenate(([False], ink_columns, [False])).view(np.int8)))
+    starts, ends = changes[0::2], changes[1::2] - 1
+    if starts.size == 0:
+        return np.zeros((0, 4), dtype=np.int64)
+    # First and last ink row per column, neutral values on empty columns so the
+    # reduceat segments (which run on to the next glyph) can include them
+    first = np.where(ink_columns, mask.argmax(axis=0), height)
+    last = np.where(ink_columns, height - 1 - mask[::-1].argmax(axis=0), -1)
+    return np.stack((starts, np.minimum.reduceat(first, starts),
+                     ends, np.maximum.reduceat(last, starts)), axis=1).astype(np.int64)
+
+
+def normalise_glyphs(mask: np.ndarray, boxes: np.ndarray, size: Tuple[int, int] = GLYPH_SIZE) -> np.ndarray:
+    """
+    Scale the glyphs at boxes (rows of x1, y1, x2, y2, ... inclusive) of a
+    boolean mask into the normalised box, keeping each aspect ratio and centring
+    horizontally. All glyphs are sampled with one gather at 4x supersampling,
+    so the result is an (n, height, width) float coverage map in 0..1.
+    """
+    box_h, box_w = size
+    sub = 4
+    boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, boxes.shape[-1] if len(boxes) else 4)
+    gh = (boxes[:, 3] - boxes[:, 1] + 1).astype(np.float64)
+    gw = (boxes[:, 2] - boxes[:, 0] + 1).astype(np.float64)
+    scale = np.minimum(box_h / gh, box_w / gw)
+    out_h = np.clip(np.round(gh * scale), 1, box_h)
+    out_w = np.clip(np.round(gw * scale), 1, box_w)
+    top = (box_h - out_h) // 2
+    left = (box_w - out_w) // 2
+
+    # Source pixel of every sub-sample, or the zero padding pixel (-1) outside the glyph
+    u = (np.arange(box_h * sub) + 0.5) / sub - top[:, None]
+    v = (np.arange(box_w * sub) + 0.5) / sub - left[:, None]
+    ys = np.where((u >= 0) & (u < out_h[:, None]),
+                  boxes[:, 1, None] + (np.maximum(u, 0) * gh[:, None] / out_h[:, None]).astype(np.int64), -1)
+    xs = np.where((v >= 0) & (v < out_w[:, None]),
+                  boxes[:, 0, None] + (np.maximum(v, 0) * gw[:, None] / out_w[:, None]).astype(np.int64), -1)
+    padded = np.pad(mask, ((0, 1), (0, 1)))
+    sampled = padded[ys[:, :, None], xs[:, None, :]]
+    return sampled.reshape(len(boxes), box_h, sub, box_w, sub).mean(axis=(2, 4), dtype=np.float32)
+
+
+def normalise_glyph(bitmap: np.ndarray, size: Tuple[int, int] = GLYPH_SIZE) -> np.ndarray:
+    """
+    normalise_glyphs() for a single bitmap, cropped to its ink first.
+    """
+    rows = np.flatnonzero(bitmap.any(axis=1))
+    cols = np.flatnonzero(bitmap.any(axis=0))
+    if rows.size == 0:
+        return np.zeros(size, dtype=np.float32)
+    box = np.array([[cols[0], rows[0], cols[-1], rows[-1]]])
+    return normalise_glyphs(bitmap, box, size)[0]
+
+
+def _unit_rows(vectors: np.ndarray) -> np.ndarray:
+    """
+    Zero-mean, unit-length rows, so a dot product is the normalised correlation.
+    """
+    centred = vectors - vectors.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(centred, axis=1, keepdims=True)
+    return centred / np.where(norms == 0, 1, norms)
+
+
+class GlyphBank:
+    """
+    Labelled glyph templates, several per label. classify() scores a batch of
+    glyphs against all templates at once and keeps the best label per glyph.
+    """
+
+    def __init__(self, size: Tuple[int, int] = GLYPH_SIZE, max_per_label: int = 4) -> None:
+        self.size = size
+        self.max_per_label = max_per_label
+        self.templates: Dict[str, List[np.ndarray]] = {}
+        self._matrix: Optional[np.ndarray] = None  # Stacked unit templates, rebuilt after changes
+        self._labels: List[str] = []
+
+    @classmethod
+    def seed_digits(cls, size: Tuple[int, int] = GLYPH_SIZE) -> "GlyphBank":
+        bank = cls(size)
+        for label in SEED_DIGITS:
+            bank.add(label, normalise_glyph(seed_bitmap(label), size))
+        return bank
+
+    def add(self, label: str, template: np.ndarray) -> None:
+        """
+        Add a normalised template. The oldest learned template of the label
+        (never the first one) makes room when the label is full.
+        """
+        templates = self.templates.setdefault(label, [])
+        if len(templates) >= self.max_per_label:
+            del templates[1]
+        templates.append(template.astype(np.float32))
+        self._matrix = None
+
+    def learn(self, label: str, bitmap: np.ndarray, replace: bool = False) -> None:
+        """
+        Add a glyph seen on screen whose label is known. replace drops the
+        label's existing templates (the seed) first.
+        """
+        if replace:
+            self.templates.pop(label, None)
+        self.add(label, normalise_glyph(bitmap, self.size))
+
+    def _build(self) -> None:
+        self._labels = [label for label, templates in self.templates.items() for _ in templates]
+        stacked = np.stack([t.ravel() for templates in self.templates.values() for t in templates])
+        self._matrix = _unit_rows(stacked)
+
+    def classify(self, glyphs: np.ndarray) -> Tuple[List[str], np.ndarray]:
+        """
+        Best label and its correlation (-1..1) for every normalised glyph in
+        glyphs (n x height x width).
+        """
+        if len(glyphs) == 0:
+            return [], np.zeros(0, dtype=np.float32)
+        if self._matrix is None:
+            self._build()
+        scores = _unit_rows(glyphs.reshape(len(glyphs), -1)) @ self._matrix.T
+        best = scores.argmax(axis=1)
+        return [self._labels[i] for i in best], scores[np.arange(len(glyphs)), best]
+
+    def to_json(self) -> dict:
+        """
+        Templates quantised to bytes and base64 encoded, for the calibration cache.
+        """
+        return {
+            "size": list(self.size),
+            "templates": {label: [base64.b64encode((t * 255).round().astype(np.uint8).tobytes()).decode("ascii")
+                                  for t in templates]
+                          for label, templates in self.templates.items()},
+        }
+
+    @classmethod
+    def from_json(cls, data: dict) -> "GlyphBank":
+        bank = cls(tuple(data["size"]))
+        for label, encoded in data["templates"].items():
+            for item in encoded:
+                pixels = np.frombuffer(base64.b64decode(item), dtype=np.uint8)
+                bank.add(label, pixels.reshape(bank.size).astype(np.float32) / 255)
+        return bank
+
+
+def group_into_words(boxes: np.ndarray, max_gap: float = 0.8) -> List[List[int]]:
+    """
+    Group glyph boxes (rows of x1, y1, x2, y2, ...) that sit side by side on one
+    line, like the digits of one number. max_gap is relative to glyph height.
+    Returns lists of box indices, each ordered left to right.
+    """
+    n = len(boxes)
+    if n == 0:
+        return []
+    x1, y1, x2, y2 = (boxes[:, i].astype(np.float64) for i in range(4))
+    height = y2 - y1 + 1
+    centre_y = (y1 + y2) / 2
+    pair_height = np.maximum(height[:, None], height[None, :])
+    gap = x1[None, :] - x2[:, None] - 1  # From the right edge of i to the left edge of j
+    follows = ((np.abs(centre_y[:, None] - centre_y[None, :]) <= 0.5 * pair_height) &
+               (gap >= 0) & (gap <= max_gap * pair_height))
+
+    # Every glyph continues with its nearest follower, if that one has no closer predecessor
+    nearest = np.where(follows, gap, np.inf)
+    successor = np.where(follows.any(axis=1), nearest.argmin(axis=1), -1)
+    has_successor = successor >= 0
+    predecessor_gap = np.where(follows, gap, np.inf).min(axis=0)
+    keep = has_successor & (nearest[np.arange(n), np.maximum(successor, 0)] <= predecessor_gap[np.maximum(successor, 0)])
+    successor = np.where(keep, successor, -1).tolist()
+    is_head = np.ones(n, dtype=bool)
+    is_head[[s for s in successor if s >= 0]] = False
+
+    words = []
+    for head in np.flatnonzero(is_head).tolist():
+        word = [head]
+        while successor[word[-1]] >= 0:
+            word.append(successor[word[-1]])
+        words.append(word)
+    return words
@@ -0,0 +1,444 @@
+import ctypes
+import os
+import struct
+import sys
+import time
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
+
+try:
+    import win32api, win32con
+except ImportError:
+    win32api = win32con = None  # Only RecordingInput works without it
+
+# Solvers send mouse and keyboard input through an input object, the same way
+# they read the screen through a capture object. default_input() is Win32Input
+# on Windows and XTestInput on Linux/X11, UinputInput is the Linux option that
+# goes through the kernel instead of the X server.
+# Solvers built without one get a DeferredInput, which opens default_input() on
+# first use. RecordingInput keeps the events instead of sending them, so
+# solvers run headless in benchmarks and dry runs. Keys are Windows virtual-key
+# codes (US layout) on every backend.
+#
+# Events made inside `with input.batch():` may be held back and sent together
+# when the block ends; backends that can't hold events send them as they come.
+
+VK_TAB = 0x09
+VK_SHIFT = 0x10
+VK_CONTROL = 0x11
+VK_MENU = 0x12  # Alt
+VK_RETURN = 0x0D
+
+# Virtual-key code -> (X keysym, Linux evdev key code)
+LINUX_KEYS = {
+    0x08: (0xff08, 14),  # Backspace
+    VK_TAB: (0xff09, 15),
+    VK_RETURN: (0xff0d, 28),
+    VK_SHIFT: (0xffe1, 42),  # Left shift
+    VK_CONTROL: (0xffe3, 29),  # Left control
+    VK_MENU: (0xffe9, 56),  # Left alt
+    0x1B: (0xff1b, 1),  # Escape
+    0x20: (0x20, 57),  # Space
+    0x25: (0xff51, 105), 0x26: (0xff52, 103), 0x27: (0xff53, 106), 0x28: (0xff54, 108),  # Arrows
+    0xBA: (ord(';'), 39), 0xBB: (ord('='), 13), 0xBC: (ord(','), 51), 0xBD: (ord('-'), 12),
+    0xBE: (ord('.'), 52), 0xBF: (ord('/'), 53), 0xC0: (ord('`'), 41), 0xDB: (ord('['), 26),
+    0xDC: (ord('\\'), 43), 0xDD: (ord(']'), 27), 0xDE: (ord("'"), 40),
+}
+LINUX_KEYS.update({0x30 + d: (0x30 + d, 11 if d == 0 else d + 1) for d in range(10)})
+LINUX_KEYS.update({ord(c): (ord(c.lower()), code) for c, code in
+                   zip("QWERTYUIOPASDFGHJKLZXCVBNM", [*range(16, 26), *range(30, 39), *range(44, 51)])})
+LINUX_KEYS.update({0x70 + i: (0xffbe + i, 59 + i if i < 10 else 77 + i) for i in range(12)})  # F1-F12
+
+
+def linux_key(vk: int, index: int) -> int:
+    if vk not in LINUX_KEYS:
+        raise ValueError(f"No Linux key for virtual-key code {vk:#x}")
+    return LINUX_KEYS[vk][index]
+
+
+class Win32Input:
+    """
+    Windows input: every call is one win32api event, nothing is buffered.
+    """
+    name = "win32"
+
+    @contextmanager
+    def batch(self):
+        yield self  # Every event is sent when it's made
+
+    def cursor_pos(self) -> Tuple[int, int]:
+        return win32api.GetCursorPos()
+
+    def move(self, x: int, y: int) -> None:
+        win32api.SetCursorPos((x, y))
+
+    def mouse_down(self, x: int, y: int) -> None:
+        win32api.mouse_event(win32con.MOUSEEVENTF_LEFTDOWN, x, y, 0, 0)
+
+    def mouse_up(self, x: int, y: int) -> None:
+        win32api.mouse_event(win32con.MOUSEEVENTF_LEFTUP, x, y, 0, 0)
+
+    def click(self, x: int, y: int, hold: float = 0.0) -> None:
+        """
+        Move to (x, y) and left click, holding the button for `hold` seconds.
+        """
+        win32api.SetCursorPos((x, y))
+        win32api.mouse_event(win32con.MOUSEEVENTF_LEFTDOWN, x, y, 0, 0)
+        if hold > 0:
+            time.sleep(hold)
+        win32api.mouse_event(win32con.MOUSEEVENTF_LEFTUP, x, y, 0, 0)
+
+    def key_down(self, vk: int) -> None:
+        win32api.keybd_event(vk, 0, 0, 0)
+
+    def key_up(self, vk: int) -> None:
+        win32api.keybd_event(vk, 0, win32con.KEYEVENTF_KEYUP, 0)
+
+    def key_press(self, vk: int, hold: float = 0.0) -> None:
+        win32api.keybd_event(vk, 0, 0, 0)
+        if hold > 0:
+            time.sleep(hold)
+        win32api.keybd_event(vk, 0, win32con.KEYEVENTF_KEYUP, 0)
+
+
+class XTestInput:
+    """
+    Linux/X11: events through the XTest extension on one Xlib connection.
+    Xlib buffers requests until they are flushed, so batch() really batches:
+    everything inside it goes to the server in one write when the block ends.
+    Outside a batch every call is flushed on its own. Opening it moves the
+    pointer one pixel and back to check the server takes XTest events.
+    """
+    name = "xtest"
+
+    def __init__(self, display=None) -> None:
+        from X11Backend import X11Display, xtst
+        self.tst = xtst()
+        self.display = display if display is not None else X11Display()
+        self.owns_display = display is None
+        self.dpy = self.display.dpy
+        self.batching = 0
+        self.keycodes = {}
+        event_base, error_base, major, minor = (ctypes.c_int() for _ in range(4))
+        if not self.tst.XTestQueryExtension(self.dpy, ctypes.byref(event_base), ctypes.byref(error_base),
+                                            ctypes.byref(major), ctypes.byref(minor)):
+            self.close()
+            raise OSError("X server has no XTEST extension")
+        self._check()
+
+    def _check(self) -> None:
+        """
+        Fake a one pixel move and read the pointer back (the query is a round
+        trip, so the server has handled the move by then), then move it back.
+        """
+        x, y, _ = self.display.pointer()
+        nudged = x + 1 if x + 1 < self.display.width else x - 1
+        self.tst.XTestFakeMotionEvent(self.dpy, self.display.screen, nudged, y, 0)
+        seen = self.display.pointer()[:2]
+        self.tst.XTestFakeMotionEvent(self.dpy, self.display.screen, x, y, 0)
+        self.display.lib.XFlush(self.dpy)
+        if seen != (nudged, y):
+            self.close()
+            raise OSError(f"XTest motion to {(nudged, y)} left the pointer at {seen}")
+
+    def _flush(self, now: bool = False) -> None:
+        if now or not self.batching:
+            self.display.lib.XFlush(self.dpy)
+
+    @contextmanager
+    def batch(self):
+        self.batching += 1
+        try:
+            yield self
+        finally:
+            self.batching -= 1
+            self._flush()
+
+    def _keycode(self, vk: int) -> int:
+        if vk not in self.keycodes:
+            keycode = self.display.lib.XKeysymToKeycode(self.dpy, linux_key(vk, 0))
+            if not keycode:
+                raise ValueError(f"Virtual-key code {vk:#x} isn't on the X keyboard map")
+            self.keycodes[vk] = keycode
+        return self.keycodes[vk]
+
+    def cursor_pos(self) -> Tuple[int, int]:
+        x, y, _ = self.display.pointer()
+        return (x, y)
+
+    def move(self, x: int, y: int) -> None:
+        self.tst.XTestFakeMotionEvent(self.dpy, self.display.screen, x, y, 0)
+        self._flush()
+
+    def mouse_down(self, x: int, y: int) -> None:
+        self.tst.XTestFakeButtonEvent(self.dpy, 1, 1, 0)
+        self._flush()
+
+    def mouse_up(self, x: int, y: int) -> None:
+        self.tst.XTestFakeButtonEvent(self.dpy, 1, 0, 0)
+        self._flush()
+
+    def click(self, x: int, y: int, hold: float = 0.0) -> None:
+        """
+        Move to (x, y) and left click, holding the button for `hold` seconds.
+        """
+        self.tst.XTestFakeMotionEvent(self.dpy, self.display.screen, x, y, 0)
+        self.tst.XTestFakeButtonEvent(self.dpy, 1, 1, 0)
+        if hold > 0:
+            self._flush(now=True)  # The press has to arrive before the hold, batch or not
+            time.sleep(hold)
+        self.tst.XTestFakeButtonEvent(self.dpy, 1, 0, 0)
+        self._flush()
+
+    def key_down(self, vk: int) -> None:
+        self.tst.XTestFakeKeyEvent(self.dpy, self._keycode(vk), 1, 0)
+        self._flush()
+
+    def key_up(self, vk: int) -> None:
+        self.tst.XTestFakeKeyEvent(self.dpy, self._keycode(vk), 0, 0)
+        self._flush()
+
+    def key_press(self, vk: int, hold: float = 0.0) -> None:
+        keycode = self._keycode(vk)
+        self.tst.XTestFakeKeyEvent(self.dpy, keycode, 1, 0)
+        if hold > 0:
+            self._flush(now=True)
+            time.sleep(hold)
+        self.tst.XTestFakeKeyEvent(self.dpy, keycode, 0, 0)
+        self._flush()
+
+    def close(self) -> None:
+        if self.owns_display:
+            self.display.close()
+
+
+# linux/uinput.h and linux/input-event-codes.h
+UI_SET_EVBIT = 0x40045564
+UI_SET_KEYBIT = 0x40045565
+UI_SET_ABSBIT = 0x40045567
+UI_DEV_CREATE = 0x5501
+UI_DEV_DESTROY = 0x5502
+EV_SYN, EV_KEY, EV_ABS = 0x00, 0x01, 0x03
+SYN_REPORT = 0
+ABS_X, ABS_Y = 0x00, 0x01
+BTN_LEFT = 0x110
+BUS_VIRTUAL = 0x06
+INPUT_EVENT = struct.Struct("llHHi")  # struct input_event, the kernel fills in the time
+
+
+class UinputInput:
+    """
+    Linux: a virtual absolute pointer + keyboard created on /dev/uinput, so the
+    events come from the kernel like a real device's and reach whatever reads
+    input devices (X with libinput, Wayland compositors; not Xvfb, which has
+    none). Needs write access to /dev/uinput. Every call is one write of its
+    events and a SYN_REPORT; inside batch() everything is written at once.
+
+    The pointer axes span the screen (width x height, from X when not given).
+    The device can't read the pointer back, cursor_pos() is the last position sent.
+    """
+    name = "uinput"
+
+    def __init__(self, width: Optional[int] = None, height: Optional[int] = None, path: str = "/dev/uinput",
+                 settle: float = 0.2) -> None:
+        import fcntl
+        if width is None or height is None:
+            from X11Backend import X11Display
+            display = X11Display()
+            width, height = display.width, display.height
+            display.close()
+        self.fd = os.open(path, os.O_WRONLY | os.O_NONBLOCK)
+        try:
+            for event_type in (EV_SYN, EV_KEY, EV_ABS):
+                fcntl.ioctl(self.fd, UI_SET_EVBIT, event_type)
+            for code in [BTN_LEFT] + [code for _, code in LINUX_KEYS.values()]:
+                fcntl.ioctl(self.fd, UI_SET_KEYBIT, code)
+            for axis in (ABS_X, ABS_Y):
+                fcntl.ioctl(self.fd, UI_SET_ABSBIT, axis)
+            absmax = [0] * 64
+            absmax[ABS_X], absmax[ABS_Y] = width - 1, height - 1
+            # struct uinput_user_dev: name, input_id, ff_effects_max, absmax / absmin / absfuzz / absflat
+            device = struct.pack("80sHHHHI64i64i64i64i", b"human-benchmark-ai input", BUS_VIRTUAL, 0x1, 0x1, 1, 0,
+                                 *absmax, *[0] * 64, *[0] * 64, *[0] * 64)
+            os.write(self.fd, device)
+            fcntl.ioctl(self.fd, UI_DEV_CREATE)
+        except OSError:
+            os.close(self.fd)
+            raise
+        self.fcntl = fcntl
+        time.sleep(settle)  # Input stacks take a moment to pick up a new device
+        self.position = (0, 0)
+        self.batching = 0
+        self.pending = bytearray()
+
+    def _event(self, event_type: int, code: int, value: int) -> None:
+        self.pending += INPUT_EVENT.pack(0, 0, event_type, code, value)
+
+    def _report(self, now: bool = False) -> None:
+        self._event(EV_SYN, SYN_REPORT, 0)
+        if now or not self.batching:
+            os.write(self.fd, self.pending)
+            self.pending.clear()
+
+    @contextmanager
+    def batch(self):
+        self.batching += 1
+        try:
+            yield self
+        finally:
+            self.batching -= 1
+            if not self.batching and self.pending:
+                os.write(self.fd, self.pending)
+                self.pending.clear()
+
+    def cursor_pos(self) -> Tuple[int, int]:
+        return self.position
+
+    def _move(self, x: int, y: int) -> None:
+        self._event(EV_ABS, ABS_X, x)
+        self._event(EV_ABS, ABS_Y, y)
+        self.position = (x, y)
+
+    def move(self, x: int, y: int) -> None:
+        self._move(x, y)
+        self._report()
+
+    def mouse_down(self, x: int, y: int) -> None:
+        self._event(EV_KEY, BTN_LEFT, 1)
+        self._report()
+
+    def mouse_up(self, x: int, y: int) -> None:
+        self._event(EV_KEY, BTN_LEFT, 0)
+        self._report()
+
+    def click(self, x: int, y: int, hold: float = 0.0) -> None:
+        """
+        Move to (x, y) and left click, holding the button for `hold` seconds.
+        """
+        self._move(x, y)
+        self._report()  # The position lands before the press, like a real mouse's
+        self._event(EV_KEY, BTN_LEFT, 1)
+        self._report(now=hold > 0)
+        if hold > 0:
+            time.sleep(hold)
+        self._event(EV_KEY, BTN_LEFT, 0)
+        self._report()
+
+    def key_down(self, vk: int) -> None:
+        self._event(EV_KEY, linux_key(vk, 1), 1)
+        self._report()
+
+    def key_up(self, vk: int) -> None:
+        self._event(EV_KEY, linux_key(vk, 1), 0)
+        self._report()
+
+    def key_press(self, vk: int, hold: float = 0.0) -> None:
+        code = linux_key(vk, 1)
+        self._event(EV_KEY, code, 1)
+        self._report(now=hold > 0)
+        if hold > 0:
+            time.sleep(hold)
+        self._event(EV_KEY, code, 0)
+        self._report()
+
+    def close(self) -> None:
+        if self.fd is not None:
+            self.fcntl.ioctl(self.fd, UI_DEV_DESTROY)
+            os.close(self.fd)
+            self.fd = None
+
+
+def default_input(display=None):
+    """
+    Input for solvers that weren't given one: Win32Input on Windows, XTestInput
+    on Linux/X11 (on `display` when the caller already has a connection open).
+    """
+    if win32api is not None:
+        return Win32Input()
+    if sys.platform.startswith("linux"):
+        return XTestInput(display)
+    raise OSError(f"No input backend for {sys.platform}")
+
+
+class DeferredInput:
+    """
+    default_input(), opened when the first event is sent: a solver can be
+    built (and read the screen) where no backend can be opened, only sending
+    input needs one. Methods of the opened backend are cached on the proxy.
+    """
+
+    def __init__(self, display=None) -> None:
+        self._display = display
+        self._backend = None
+
+    def __getattr__(self, name: str):
+        if self._backend is None:
+            self._backend = default_input(self._display)
+        value = getattr(self._backend, name)
+        if callable(value):
+            setattr(self, name, value)
+        return value
+
+
+class RecordingInput:
+    """
+    Input that only records: events is a list of (perf_counter_ns, name, args)
+    in the order they were sent. Holds are recorded, not slept, unless
+    sleep=True.
+    """
+
+    def __init__(self, cursor: Tuple[int, int] = (0, 0), sleep: bool = False) -> None:
+        self.cursor = cursor
+        self.sleep = sleep
+        self.events: List[Tuple[int, str, tuple]] = []
+
+    def _record(self, name: str, *args) -> None:
+        self.events.append((time.perf_counter_ns(), name, args))
+
+    def _hold(self, hold: float) -> None:
+        if self.sleep and hold > 0:
+            time.sleep(hold)
+
+    def clear(self) -> None:
+        self.events.clear()
+
+    @contextmanager
+    def batch(self):
+        yield self
+
+    def cursor_pos(self) -> Tuple[int, int]:
+        return self.cursor
+
+    def move(self, x: int, y: int) -> None:
+        self.cursor = (x, y)
+        self._record("move", x, y)
+
+    def mouse_down(self, x: int, y: int) -> None:
+        self._record("mouse_down", x, y)
+
+    def mouse_up(self, x: int, y: int) -> None:
+        self._record("mouse_up", x, y)
+
+    def click(self, x: int, y: int, hold: float = 0.0) -> None:
+        self.cursor = (x, y)
+        self._record("click", x, y)
+        self._hold(hold)
+
+    def key_down(self, vk: int) -> None:
+        self._record("key_down", vk)
+
+    def key_up(self, vk: int) -> None:
+        self._record("key_up", vk)
+
+    def key_press(self, vk: int, hold: float = 0.0) -> None:
+        self._record("key_down", vk)
+        self._hold(hold)
+        self._record("key_up", vk)
+
+    def clicks(self) -> List[Tuple[int, int]]:
+        """Positions of the clicks sent so far, in order."""
+        return [args for _, name, args in self.events if name == "click"]
+
+    def keys(self) -> List[Tuple[str, int]]:
+        """Key events sent so far, as ("key_down" / "key_up", vk)."""
+        return [(name, args[0]) for _, name, args in self.events if name in ("key_down", "key_up")]
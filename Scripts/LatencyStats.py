@@ -0,0 +1,217 @@
+import time
+from typing import Iterable, Optional
+
+import numpy as np
+
+# Streaming latency statistics in fixed memory. A LatencyHistogram counts
+# durations (nanoseconds) in log-linear buckets, the layout of an HDR
+# histogram: values below 2**precision get a bucket each, above that every
+# power of two is split into 2**(precision - 1) equal buckets. Any recorded
+# value is known to within 2**-(precision - 1) of itself (under 1% with the
+# default precision) whether the loop ran for a second or a day, and
+# recording is a bit_length, a shift and one list increment.
+#
+# Histograms with the same layout merge by adding their counts: a thread keeps
+# its own and merges it into the loop's at the end, and LoopStats.save puts
+# them in the metrics database so runs can be pooled later
+# (`MetricsStore.py latency <kind>`).
+
+NO_MIN = 1 << 62  # min of an empty histogram, above anything recorded
+
+
+def format_ns(ns: float) -> str:
+    """A duration in the unit that keeps it readable: 850ns, 12.3us, 4.56ms, 1.20s."""
+    if ns < 1e3:
+        return f"{ns:.0f}ns"
+    if ns < 1e6:
+        return f"{ns / 1e3:.1f}us"
+    if ns < 1e9:
+        return f"{ns / 1e6:.2f}ms"
+    return f"{ns / 1e9:.2f}s"
+
+
+class LatencyHistogram:
+    """
+    Durations in nanoseconds, counted in (highest_ns.bit_length() - precision + 2) * 2**(precision - 1)
+    buckets (2304 by default, up to about 18 minutes). Longer values land in the last bucket,
+    min, max and mean stay exact. Not locked: give each thread its own and merge() them.
+    """
+
+    def __init__(self, precision: int = 7, highest_ns: int = 1 << 40) -> None:
+        self.precision = precision
+        self.half = 1 << (precision - 1)
+        self.counts = [0] * ((max(highest_ns.bit_length() - precision, 0) + 2) * self.half)
+        self.last_index = len(self.counts) - 1
+        self.count = 0
+        self.total = 0
+        self.min = NO_MIN
+        self.max = 0
+
+    def record(self, ns: int) -> None:
+        """Count one duration in nanoseconds (a perf_counter_ns difference, or a numpy integer)."""
+        if type(ns) is not int:
+            ns = int(ns)  # np.int64 has no bit_length
+        if ns < 0:
+            ns = 0
+        shift = ns.bit_length() - self.precision
+        if shift > 0:
+            index = shift * self.half + (ns >> shift)
+            if index > self.last_index:
+                index = self.last_index
+            self.counts[index] += 1
+        else:
+            self.counts[ns] += 1
+        self.count += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+        if ns < self.min:
+            self.min = ns
+
+    def record_seconds(self, seconds: float) -> None:
+        """Count one duration measured with perf_counter()."""
+        self.record(int(seconds * 1e9))
+
+    def bucket_bounds(self, index: int) -> tuple:
+        """[low, high) nanoseconds of one bucket."""
+        shift = max(index // self.half - 1, 0)
+        sub = index - shift * self.half
+        return sub << shift, (sub + 1) << shift
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentiles(self, qs: Iterable[float]) -> list:
+        """
+        Nanoseconds at each percentile in qs (0-100): the middle of the bucket
+        holding that rank, kept within the exact min and max.
+        """
+        qs = list(qs)
+        if not self.count:
+            return [0.0] * len(qs)
+        cumulative = np.cumsum(self.counts)
+        ranks = np.maximum(np.ceil(np.array(qs, dtype=np.float64) / 100 * self.count), 1)
+        values = []
+        for index in np.searchsorted(cumulative, ranks):
+            low, high = self.bucket_bounds(int(index))
+            values.append(float(min(max((low + high - 1) / 2, self.min), self.max)))
+        return values
+
+    def percentile(self, q: float) -> float:
+        return self.percentiles([q])[0]
+
+    def merge(self, other: "LatencyHistogram") -> "LatencyHistogram":
+        """Add other's counts to this histogram (same precision and range). Returns self."""
+        if other.precision != self.precision or len(other.counts) != len(self.counts):
+            raise ValueError("Histograms with different precision or range can't be merged")
+        if not other.count:
+            return self
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.count += other.count
+        self.total += other.total
+        return self
+
+    def reset(self) -> None:
+        self.counts = [0] * len(self.counts)
+        self.count = self.total = self.max = 0
+        self.min = NO_MIN
+
+    def to_dict(self) -> dict:
+        """JSON-able form, only the buckets that counted something."""
+        return {"precision": self.precision, "size": len(self.counts), "count": self.count, "total": self.total,
+                "min": self.min, "max": self.max,
+                "counts": {str(i): c for i, c in enumerate(self.counts) if c}}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LatencyHistogram":
+        hist = cls(data["precision"])
+        if data["size"] != len(hist.counts):
+            hist.counts = [0] * data["size"]
+            hist.last_index = data["size"] - 1
+        for index, count in data["counts"].items():
+            hist.counts[int(index)] = count
+        hist.count, hist.total, hist.min, hist.max = data["count"], data["total"], data["min"], data["max"]
+        return hist
+
+    def summary(self) -> dict:
+        if not self.count:
+            return {}
+        p50, p90, p99, p999 = self.percentiles([50, 90, 99, 99.9])
+        return {"count": self.count, "mean_us": self.mean / 1e3, "p50_us": p50 / 1e3, "p90_us": p90 / 1e3,
+                "p99_us": p99 / 1e3, "p99.9_us": p999 / 1e3, "max_us": self.max / 1e3}
+
+    def readout(self) -> str:
+        """Short form for a live line: p50 1.23ms p99 4.56ms max 7.89ms."""
+        if not self.count:
+            return "-"
+        p50, p99 = self.percentiles([50, 99])
+        return f"p50 {format_ns(p50)} p99 {format_ns(p99)} max {format_ns(self.max)}"
+
+
+class LoopStats:
+    """
+    The LatencyHistograms of one solver loop, by name. Solvers record
+    "frame" (one capture and detection pass, or the time between passes of a
+    spinning loop), "detect" (from the capture that showed something to the
+    decision to act on it) and "dispatch" (sending the input). tick() from the
+    loop prints a live readout line at most every `interval` seconds.
+    """
+
+    def __init__(self, label: str, names: Iterable[str] = ("frame", "detect", "dispatch"),
+                 interval: float = 5.0, live: bool = True) -> None:
+        self.label = label
+        self.histograms = {name: LatencyHistogram() for name in names}
+        self.interval_ns = int(interval * 1e9)
+        self.live = live
+        self.next_readout = time.perf_counter_ns() + self.interval_ns
+
+    def __getitem__(self, name: str) -> LatencyHistogram:
+        return self.histograms[name]
+
+    def record(self, name: str, ns: int) -> None:
+        self.histograms[name].record(ns)
+
+    def readout(self) -> str:
+        parts = [f"{name} {hist.readout()}" for name, hist in self.histograms.items() if hist.count]
+        return f"{self.label}: " + (" | ".join(parts) if parts else "nothing recorded yet")
+
+    def tick(self, now_ns: Optional[int] = None) -> bool:
+        """Print the readout if it's due. Returns True when it printed."""
+        if not self.live:
+            return False
+        now_ns = time.perf_counter_ns() if now_ns is None else now_ns
+        if now_ns < self.next_readout:
+            return False
+        self.next_readout = now_ns + self.interval_ns
+        print(self.readout())
+        return True
+
+    def merge(self, other: "LoopStats") -> "LoopStats":
+        for name, hist in other.histograms.items():
+            if name in self.histograms:
+                self.histograms[name].merge(hist)
+            else:
+                self.histograms[name] = LatencyHistogram(hist.precision).merge(hist)
+        return self
+
+    def summary(self) -> dict:
+        return {name: hist.summary() for name, hist in self.histograms.items() if hist.count}
+
+    def report(self) -> None:
+        for name, stats in self.summary().items():
+            print(f"{self.label} {name} over {stats['count']}: mean {stats['mean_us']:.1f}us, "
+                  f"p50 {stats['p50_us']:.1f}us, p90 {stats['p90_us']:.1f}us, p99 {stats['p99_us']:.1f}us, "
+                  f"p99.9 {stats['p99.9_us']:.1f}us, max {stats['max_us']:.1f}us")
+
+    def save(self, metrics) -> None:
+        """
+        One "<name>_p99_us" row per histogram that counted something, holding the
+        whole histogram so sessions can be merged later.
+        """
+        for name, hist in self.histograms.items():
+            if hist.count:
+                metrics.record(f"{name}_p99_us", hist.percentile(99) / 1e3, loop=self.label,
+                               histogram=hist.to_dict())
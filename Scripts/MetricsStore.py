@@ -0,0 +1,327 @@
+import argparse
+import json
+import os
+import queue
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from typing import Optional
+
+import numpy as np
+
+from CalibrationCache import CACHE_DIR
+from LatencyStats import LatencyHistogram, format_ns
+
+# Per-trial and per-level metrics of every solver run, kept in one SQLite file
+# so sessions can be compared across code versions. Solvers call
+# session.record(...) from their hot loops; that only puts a tuple on a queue,
+# a background thread writes the rows in batches.
+
+METRICS_FILE = os.path.join(CACHE_DIR, "metrics.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    game TEXT NOT NULL,
+    version TEXT,
+    host TEXT,
+    params TEXT,
+    started_at REAL NOT NULL,
+    ended_at REAL
+);
+CREATE TABLE IF NOT EXISTS records (
+    session_id TEXT NOT NULL,
+    t REAL NOT NULL,
+    kind TEXT NOT NULL,
+    value REAL,
+    level INTEGER,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS records_session_kind ON records (session_id, kind);
+"""
+
+
+def code_version() -> str:
+    """
+    Version the session ran with: HBAI_VERSION if set, else the git commit of this checkout.
+    """
+    if os.environ.get("HBAI_VERSION"):
+        return os.environ["HBAI_VERSION"]
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=2)
+        return result.stdout.strip() or "unknown"
+    except (OSError, subprocess.SubprocessError):
+        return "unknown"
+
+
+def connect(path: str = METRICS_FILE) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    db = sqlite3.connect(path, timeout=5)
+    db.execute("PRAGMA journal_mode=WAL")  # Queries from the CLI don't block a running writer
+    db.executescript(SCHEMA)
+    return db
+
+
+class MetricsSession:
+    """
+    One solver run. record() never touches the disk, rows are written by a
+    background thread every batch_size rows or flush_interval seconds.
+    Use it as a context manager (or call start() / close()).
+    """
+
+    def __init__(self, game: str, params: Optional[dict] = None, path: str = METRICS_FILE,
+                 batch_size: int = 500, flush_interval: float = 0.5) -> None:
+        self.game = game
+        self.params = params or {}
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.id = uuid.uuid4().hex
+        self.queue = queue.SimpleQueue()
+        self.thread: Optional[threading.Thread] = None
+        self.written = 0
+        self.error: Optional[Exception] = None  # A failing disk stops recording, never the solver
+
+    def start(self) -> "MetricsSession":
+        self.thread = threading.Thread(target=self._run, name="metrics-writer", daemon=True)
+        self.thread.start()
+        return self
+
+    def __enter__(self) -> "MetricsSession":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def record(self, kind: str, value: Optional[float] = None, level: Optional[int] = None, **extra) -> None:
+        """
+        Queue one row: kind names the metric (e.g. "green_read_ms"), level the
+        level or trial number it belongs to, extra any other JSON-able fields.
+        """
+        self.queue.put((time.time(), kind, value, level, extra or None))
+
+    def close(self, timeout: float = 5.0) -> None:
+        """
+        Write everything still queued and mark the session as ended.
+        """
+        if self.thread is None:
+            return
+        self.queue.put(None)
+        self.thread.join(timeout)
+        self.thread = None
+        if self.error is not None:
+            print(f"Metrics were not saved: {self.error}")
+
+    def _run(self) -> None:
+        try:
+            db = connect(self.path)
+        except sqlite3.Error as e:
+            self.error = e
+            return
+        with db:
+            db.execute("INSERT INTO sessions (id, game, version, host, params, started_at) VALUES (?, ?, ?, ?, ?, ?)",
+                       (self.id, self.game, code_version(), socket.gethostname(), json.dumps(self.params), time.time()))
+        running = True
+        while running:
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    running = False
+                    break
+                batch.append(item)
+            if batch and self.error is None:
+                try:
+                    with db:
+                        db.executemany("INSERT INTO records (session_id, t, kind, value, level, extra) VALUES (?, ?, ?, ?, ?, ?)",
+                                       [(self.id, t, kind, value, level, json.dumps(extra) if extra else None)
+                                        for t, kind, value, level, extra in batch])
+                    self.written += len(batch)
+                except sqlite3.Error as e:
+                    self.error = e
+        try:
+            with db:
+                db.execute("UPDATE sessions SET ended_at = ? WHERE id = ?", (time.time(), self.id))
+        except sqlite3.Error as e:
+            self.error = self.error or e
+        db.close()
+
+
+class NullMetrics:
+    """
+    Stand-in when nothing should be recorded, so solvers can call record() unconditionally.
+    """
+
+    def __enter__(self) -> "NullMetrics":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+    def record(self, kind: str, value: Optional[float] = None, level: Optional[int] = None, **extra) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+# ---------------------------------------------------------------- query CLI
+
+def _sessions(db: sqlite3.Connection, game: Optional[str], last: int) -> list:
+    query = "SELECT id, game, version, started_at, ended_at FROM sessions"
+    args = []
+    if game:
+        query += " WHERE game = ?"
+        args.append(game)
+    query += " ORDER BY started_at DESC LIMIT ?"
+    args.append(last)
+    return list(reversed(db.execute(query, args).fetchall()))
+
+
+def _values(db: sqlite3.Connection, session_id: str, kind: str) -> np.ndarray:
+    rows = db.execute("SELECT value FROM records WHERE session_id = ? AND kind = ? AND value IS NOT NULL",
+                      (session_id, kind)).fetchall()
+    return np.array([r[0] for r in rows], dtype=np.float64)
+
+
+def _stamp(t: Optional[float]) -> str:
+    return time.strftime("%Y-%m-%d %H:%M", time.localtime(t)) if t else "-"
+
+
+def cmd_sessions(db: sqlite3.Connection, args) -> None:
+    print(f"{'started':<17} {'game':<14} {'version':<10} {'records':>8}  kinds")
+    for session_id, game, version, started, _ in _sessions(db, args.game, args.last):
+        kinds = db.execute("SELECT kind, COUNT(*) FROM records WHERE session_id = ? GROUP BY kind ORDER BY kind",
+                           (session_id,)).fetchall()
+        total = sum(count for _, count in kinds)
+        print(f"{_stamp(started):<17} {game:<14} {version or '-':<10} {total:>8}  "
+              + ", ".join(f"{kind} ({count})" for kind, count in kinds))
+
+
+def cmd_summary(db: sqlite3.Connection, args) -> None:
+    """
+    Percentiles of one metric per session, with the change of the median against the previous session.
+    """
+    print(f"{args.kind} for {args.game or 'all games'}")
+    print(f"{'started':<17} {'version':<10} {'n':>6} {'mean':>9} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9} {'p50 change':>11}")
+    previous = None
+    medians = []
+    for session_id, _, version, started, _ in _sessions(db, args.game, args.last):
+        values = _values(db, session_id, args.kind)
+        if values.size == 0:
+            continue
+        p50, p90, p99 = np.percentile(values, [50, 90, 99])
+        change = f"{(p50 - previous) / previous * 100:+10.1f}%" if previous else f"{'':>11}"
+        print(f"{_stamp(started):<17} {version or '-':<10} {values.size:>6} {values.mean():>9.3f} {p50:>9.3f} "
+              f"{p90:>9.3f} {p99:>9.3f} {values.max():>9.3f} {change}")
+        previous = p50 or None
+        medians.append(p50)
+
+    if len(medians) >= 2:
+        # Least squares slope of the medians, per session
+        slope = np.polyfit(np.arange(len(medians)), medians, 1)[0]
+        print(f"\nTrend over {len(medians)} sessions: median {'+' if slope >= 0 else ''}{slope:.3f} per session")
+
+
+def cmd_versions(db: sqlite3.Connection, args) -> None:
+    """
+    One metric pooled over all sessions of each code version.
+    """
+    query = """SELECT s.version, r.value, s.started_at
+               FROM records r JOIN sessions s ON s.id = r.session_id
+               WHERE r.kind = ? AND r.value IS NOT NULL"""
+    params = [args.kind]
+    if args.game:
+        query += " AND s.game = ?"
+        params.append(args.game)
+    pooled = {}
+    first_seen = {}
+    for version, value, started in db.execute(query, params):
+        pooled.setdefault(version, []).append(value)
+        first_seen[version] = min(started, first_seen.get(version, started))
+    print(f"{args.kind} for {args.game or 'all games'}, by version")
+    print(f"{'version':<10} {'first run':<17} {'n':>7} {'p50':>9} {'p90':>9} {'p99':>9}")
+    for version in sorted(pooled, key=first_seen.get):
+        values = np.array(pooled[version])
+        p50, p90, p99 = np.percentile(values, [50, 90, 99])
+        print(f"{version or '-':<10} {_stamp(first_seen[version]):<17} {values.size:>7} {p50:>9.3f} {p90:>9.3f} {p99:>9.3f}")
+
+
+def cmd_latency(db: sqlite3.Connection, args) -> None:
+    """
+    Latency histograms saved by LoopStats.save, merged over all sessions of
+    each code version: percentiles over every sample, not of per-session figures.
+    """
+    query = """SELECT s.version, r.extra, s.started_at
+               FROM records r JOIN sessions s ON s.id = r.session_id
+               WHERE r.kind = ? AND r.extra IS NOT NULL"""
+    params = [args.kind]
+    if args.game:
+        query += " AND s.game = ?"
+        params.append(args.game)
+    merged = {}
+    sessions = {}
+    first_seen = {}
+    for version, extra, started in db.execute(query, params):
+        data = json.loads(extra).get("histogram")
+        if data is None:
+            continue
+        hist = LatencyHistogram.from_dict(data)
+        if version in merged:
+            merged[version].merge(hist)
+        else:
+            merged[version] = hist
+        sessions[version] = sessions.get(version, 0) + 1
+        first_seen[version] = min(started, first_seen.get(version, started))
+    print(f"{args.kind} histograms for {args.game or 'all games'}, merged by version")
+    print(f"{'version':<10} {'first run':<17} {'sessions':>8} {'n':>9} "
+          + " ".join(f"{label:>9}" for label in ("p50", "p90", "p99", "p99.9", "max")))
+    for version in sorted(merged, key=first_seen.get):
+        hist = merged[version]
+        figures = " ".join(f"{format_ns(v):>9}" for v in hist.percentiles([50, 90, 99, 99.9]) + [hist.max])
+        print(f"{version or '-':<10} {_stamp(first_seen[version]):<17} {sessions[version]:>8} {hist.count:>9} {figures}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Query the solver metrics recorded in " + METRICS_FILE)
+    parser.add_argument("--db", default=METRICS_FILE, help="metrics file")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    sessions = commands.add_parser("sessions", help="list recent sessions and what they recorded")
+    sessions.add_argument("--game")
+    sessions.add_argument("--last", type=int, default=20)
+
+    summary = commands.add_parser("summary", help="percentiles of a metric per session, with the trend")
+    summary.add_argument("kind", help="metric name, e.g. green_read_ms")
+    summary.add_argument("--game")
+    summary.add_argument("--last", type=int, default=20)
+
+    versions = commands.add_parser("versions", help="a metric pooled per code version")
+    versions.add_argument("kind")
+    versions.add_argument("--game")
+
+    latency = commands.add_parser("latency", help="saved latency histograms merged per code version")
+    latency.add_argument("kind", help="histogram metric, e.g. detect_p99_us")
+    latency.add_argument("--game")
+
+    args = parser.parse_args()
+    if not os.path.exists(args.db):
+        print(f"No metrics recorded yet ({args.db} does not exist)")
+        sys.exit(1)
+    db = connect(args.db)
+    {"sessions": cmd_sessions, "summary": cmd_summary, "versions": cmd_versions,
+     "latency": cmd_latency}[args.command](db, args)
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+import mss
+import numpy as np
+import time
+from typing import List, Optional, Tuple
+from CalibrationCache import CalibrationCache
+from GameLocator import find_button, locate_scan_area, print_scan_area, reference_points, scan_region
+from CaptureMultiplexer import MssCapture
+from InputBackend import VK_RETURN, DeferredInput
+from DetectionKernels import white_mask, warm_up
+from MetricsStore import MetricsSession, NullMetrics
+from LatencyStats import LoopStats
+from GlyphMatcher import GlyphBank, normalise_glyphs, split_columns, tallest_text_line
+
+
+DIGITS = "0123456789"
+
+class NumberMemory:
+    def __init__(self, capture=None, input_backend=None, min_score: float = 0.6, min_text_height: int = 20) -> None:
+        self.coords = []  # List of (x, y) coordinates for corners
+        self.sct = mss.mss() if capture is None else None  # Locator and cache open their own when None
+        self.capture = capture if capture is not None else MssCapture(self.sct)  # Anything with grab(region)
+        self.input = input_backend if input_backend is not None else DeferredInput()  # Mouse and keyboard events
+        self.scan_area = None  # Will store (x1, y1, x2, y2)
+        self.bank = GlyphBank.seed_digits()  # Replaced digit by digit with the page font during calibration
+        self.learned = set()  # Digits whose templates come from the screen
+        self.min_score = min_score  # Lowest template correlation accepted for a digit
+        self.min_text_height = min_text_height  # The number is the big text, smaller lines are labels
+        self.levels_solved = 0
+        self.wrong_answers = 0  # Answers that ended a game
+        self.read_time = 0.0  # Seconds to read the last number
+        self.stats = LoopStats("Number loop")  # Page polls, number reads and typed answers
+
+    def collect_coordinates(self, timeout: float = 10.0) -> list:
+        """Locate the play area from a full-screen capture, registering corners by hand if that fails."""
+        self.coords, self.scan_area = locate_scan_area(self.sct, timeout)
+        return self.coords
+
+    def scan_area_reference_points(self) -> list:
+        """Points just inside the scan area corners, used to check a cached layout."""
+        return reference_points(self.scan_area)
+
+    def load_or_collect_coordinates(self) -> list:
+        """
+        Reuse the cached scan area and digit templates if the layout still
+        matches the screen, otherwise locate the play area again.
+        """
+        cache = CalibrationCache("NumberMemory", self.sct)
+        entry = cache.load_verified()
+        if entry is not None:
+            self.coords = [tuple(c) for c in entry["coords"]]
+            self.scan_area = tuple(entry["scan_area"])
+            if "glyphs" in entry:
+                self.bank = GlyphBank.from_json(entry["glyphs"])
+                self.learned = set(entry.get("learned", ""))
+            print_scan_area(self.scan_area)
+            return self.coords
+
+        input("Press Enter, then switch to the Number Memory page...")
+        self.collect_coordinates()
+        self.save_calibration()
+        return self.coords
+
+    def save_calibration(self) -> None:
+        """Save the scan area and the digit templates for the next run."""
+        cache = CalibrationCache("NumberMemory", self.sct)
+        cache.save({"coords": [list(c) for c in self.coords], "scan_area": list(self.scan_area),
+                    "glyphs": self.bank.to_json(), "learned": "".join(sorted(self.learned))},
+                   self.scan_area_reference_points())
+
+    @property
+    def calibrated(self) -> bool:
+        return self.learned >= set(DIGITS)
+
+    def capture_region(self) -> dict:
+        """Screen region this solver reads, for registering with a shared capture."""
+        return scan_region(self.scan_area)
+
+    def capture_scan_area(self) -> Optional[np.ndarray]:
+        """Capture the entire scan area as a single screenshot."""
+        if not self.scan_area:
+            return None
+
+        return self.capture.grab(self.capture_region())
+
+    def read_number(self, img: np.ndarray) -> Tuple[str, List[np.ndarray], np.ndarray]:
+        """
+        Read the number shown in a frame of the play area.
+        The tallest text line is split into digits by its column projection and
+        all digits are classified against the template bank in one batch.
+        Returns (digits, digit bitmaps, scores); digits is "" when the frame holds
+        no confidently read number.
+        """
+        mask = white_mask(img, 240)
+        line = tallest_text_line(mask, self.min_text_height)
+        if line is None:
+            return "", [], np.zeros(0, dtype=np.float32)
+        band = mask[line[0]:line[1] + 1]
+        boxes = split_columns(band)
+        heights = boxes[:, 3] - boxes[:, 1] + 1
+        widths = boxes[:, 2] - boxes[:, 0] + 1
+        if len(boxes) == 0 or (widths > heights * 2).any():  # Bars and joined words are not digits
+            return "", [], np.zeros(0, dtype=np.float32)
+
+        digits, scores = self.bank.classify(normalise_glyphs(band, boxes, self.bank.size))
+        bitmaps = [band[y1:y2 + 1, x1:x2 + 1] for x1, y1, x2, y2 in boxes]
+        if scores.min() < self.min_score:
+            return "", bitmaps, scores
+        return "".join(digits), bitmaps, scores
+
+    def wait_for_number(self, settle: float = 0.1) -> Tuple[str, List[np.ndarray]]:
+        """
+        Wait until a number is shown (text and no button on the page), let it
+        finish fading in, then read it from a single capture.
+        """
+        while True:
+            start = time.perf_counter()
+            img = self.capture_scan_area()
+            shown = (find_button(img) is None
+                     and tallest_text_line(white_mask(img, 240), self.min_text_height) is not None)
+            self.stats["frame"].record_seconds(time.perf_counter() - start)
+            if shown:
+                time.sleep(settle)
+                start = time.perf_counter()
+                text, bitmaps, _ = self.read_number(self.capture_scan_area())
+                if text:
+                    self.read_time = time.perf_counter() - start
+                    self.stats["detect"].record_seconds(self.read_time)
+                    return text, bitmaps
+            time.sleep(0.02)
+
+    def wait_for_button(self, timeout: float = 30.0) -> Optional[Tuple[int, int]]:
+        """Screen position of the yellow button (Submit / Next) once the page shows it."""
+        x1, y1, _, _ = self.scan_area
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            button = find_button(self.capture_scan_area())
+            if button is not None:
+                return x1 + button[0], y1 + button[1]
+            time.sleep(0.02)
+        return None
+
+    def confirm_digits(self, text: str, bitmaps: List[np.ndarray]) -> str:
+        """
+        Calibration: show what was read and learn the page's digit glyphs from
+        the number the user confirms or corrects.
+        """
+        answer = input(f"Read {text} - press Enter if that is right, or type the number shown: ").strip()
+        if answer and (not answer.isdigit() or len(answer) != len(bitmaps)):
+            print(f"Expected {len(bitmaps)} digits, keeping {text}")
+            answer = ""
+        answer = answer or text
+        for digit, bitmap in zip(answer, bitmaps):
+            self.bank.learn(digit, bitmap, replace=digit not in self.learned)
+            self.learned.add(digit)
+        missing = "".join(d for d in DIGITS if d not in self.learned)
+        print(f"Digits learned: {''.join(sorted(self.learned))}" + (f", still missing {missing}" if missing else ""))
+        self.save_calibration()
+
+        print("Switch back to the browser, typing in 3 seconds...")
+        time.sleep(3)
+        return answer
+
+    def type_number(self, text: str) -> None:
+        """Type the digits and Enter as one burst of key events, no waits between them."""
+        start = time.perf_counter_ns()
+        with self.input.batch():
+            for char in text:
+                self.input.key_press(0x30 + int(char))
+            self.input.key_press(VK_RETURN)
+        self.stats["dispatch"].record(time.perf_counter_ns() - start)
+
+    def click_at(self, x: int, y: int) -> None:
+        """Simulate a mouse click at the specified (x, y) position."""
+        self.input.click(x, y)
+
+    def settle_level(self, digits: int, next_digits: int, metrics) -> None:
+        """
+        Score the previous answer once the next number is up: after a right one
+        the number is a digit longer, a wrong one ends the game and Try again
+        starts over at one digit.
+        """
+        wrong = next_digits != digits + 1
+        metrics.record("wrong_answers", int(wrong), level=self.levels_solved + 1, digits=digits)
+        if wrong:
+            self.wrong_answers += 1
+            print(f"The {digits} digit number was answered wrong")
+        else:
+            self.levels_solved += 1
+
+    def run(self, max_levels: int = 100, metrics=None) -> None:
+        """
+        Answer levels until max_levels or Ctrl+C. Start the test by hand first.
+        The read time of every number and whether the answer was right are recorded to metrics
+        (MetricsStore.MetricsSession), poll, read and typing percentiles are printed every few seconds.
+        """
+        metrics = metrics or NullMetrics()
+        print("Press Ctrl+C to exit.")
+        warm_up()  # Compile the detection kernels before the first number
+        answered = None  # Digits of the last answer, right or wrong shows with the next number
+        try:
+            while self.levels_solved < max_levels:
+                text, bitmaps = self.wait_for_number()
+                if answered is not None:
+                    self.settle_level(answered, len(text), metrics)
+                    answered = None
+                print(f"Number ({len(text)} digits) read in {self.read_time * 1000:.2f}ms: {text}")
+                metrics.record("read_ms", self.read_time * 1000, level=self.levels_solved + 1,
+                               digits=len(text), calibrated=self.calibrated)
+                if self.wait_for_button() is None:  # Submit button, the input box is up
+                    print("No answer box after the number - stopping")
+                    break
+                if not self.calibrated:
+                    text = self.confirm_digits(text, bitmaps)
+                self.type_number(text)
+                answered = len(text)
+
+                time.sleep(0.1)  # The Submit button is still on screen for a moment
+                next_button = self.wait_for_button(timeout=3.0)
+                if next_button is None:
+                    print("No Next button after the answer - stopping")
+                    break
+                time.sleep(0.1)  # The button fades in, an early click can be swallowed
+                self.click_at(*next_button)  # Next, or Try again after a wrong answer
+                self.stats.tick()
+        except KeyboardInterrupt:
+            print("\nStopped.")
+
+        read = self.stats["detect"]
+        if read.count:
+            print(f"Answered {self.levels_solved} levels right and {self.wrong_answers} wrong (the last one unscored), "
+                  f"number read mean {read.mean / 1e6:.2f}ms, max {read.max / 1e6:.2f}ms")
+            self.stats.report()
+            self.stats.save(metrics)
+
+def main() -> None:
+    print("===== Number Memory Solver =====")
+    print("Reads the number from one screenshot (no OCR, cached digit templates) and types it back.")
+    print("The first run asks you to confirm the numbers it reads until it has seen all ten digits.")
+    print("Start the test on the page yourself, the solver takes over from the first number.")
+    print("================================")
+
+    solver = NumberMemory()
+    solver.load_or_collect_coordinates()
+    if not solver.calibrated:
+        print(f"\nCalibrating digit templates ({len(solver.learned)}/10 digits learned so far)")
+    try:
+        max_levels = int(input("How many levels to answer? (default 100): ").strip() or "100")
+    except ValueError:
+        max_levels = 100
+
+    print("\nWaiting for the first number...")
+    with MetricsSession("NumberMemory", params={"max_levels": max_levels, "min_score": solver.min_score}) as metrics:
+        solver.run(max_levels=max_levels, metrics=metrics)
+
+if __name__ == "__main__":
+    main()
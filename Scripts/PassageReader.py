@@ -0,0 +1,281 @@
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from DetectionKernels import off_color_mask
+from GlyphMatcher import GlyphBank, normalise_glyphs, split_columns
+
+# Reads the Typing Test passage straight from a screenshot. Lines are found
+# with the row projection, glyphs with the column projection of each line, and
+# every glyph is matched against an atlas of the page font with one matrix
+# product (GlyphMatcher.GlyphBank). Glyphs are normalised in a box spanning the
+# font's full ascent and descent, so position and size on the line count too
+# ("," vs "'", "o" vs "O").
+#
+# The atlas is learned from one passage whose text is known (the console and
+# clipboard path), so it's the exact font, size and anti-aliasing of the screen
+# at this zoom. Touching letters ("rt") are learned as one glyph, letters in
+# two pieces ('"') as their union.
+
+ATLAS_SIZE = (20, 20)  # Normalised glyph box (height, width)
+GLYPH_COST = 1.05  # Cost of a glyph in the reading alignment, less its match score
+
+
+def ink_mask(img: np.ndarray, threshold: int = 60) -> np.ndarray:
+    """
+    Pixels that differ from the background (the median colour) by more than threshold on any channel.
+    """
+    b, g, r = np.median(img[::4, ::4, :3].reshape(-1, 3), axis=0).astype(int)
+    return off_color_mask(img, (r, g, b), threshold)
+
+
+def text_lines(mask: np.ndarray, min_height: int = 4) -> np.ndarray:
+    """
+    First and last row (inclusive) of every run of rows holding ink, as an (n, 2) array.
+    """
+    ink_rows = mask.any(axis=1)
+    changes = np.flatnonzero(np.diff(np.concatenate(([False], ink_rows, [False])).view(np.int8)))
+    lines = np.stack((changes[0::2], changes[1::2] - 1), axis=1)
+    return lines[lines[:, 1] - lines[:, 0] + 1 >= min_height]
+
+
+def passage_lines(lines: np.ndarray, anchor: int) -> np.ndarray:
+    """
+    The block of evenly spaced lines holding row `anchor` (or starting closest
+    to it): the block ends where the gap between lines grows well past the
+    line spacing next to the anchor (a heading, the end of the passage).
+    """
+    if len(lines) == 0:
+        return lines
+    inside = np.flatnonzero((lines[:, 0] <= anchor) & (lines[:, 1] >= anchor))
+    first = int(inside[0]) if inside.size else int(np.abs(lines[:, 0] - anchor).argmin())
+    gaps = lines[1:, 0] - lines[:-1, 1] - 1
+    neighbours = gaps[max(first - 1, 0):first + 1]
+    if neighbours.size == 0:
+        return lines[first:first + 1]
+    spacing = neighbours.min() * 1.5 + 2
+    start = first
+    while start > 0 and gaps[start - 1] <= spacing:
+        start -= 1
+    end = first
+    while end < len(lines) - 1 and gaps[end] <= spacing:
+        end += 1
+    return lines[start:end + 1]
+
+
+def baseline(mask: np.ndarray, top: int, bottom: int) -> int:
+    """
+    Row the letters of a line stand on: where the ink thins out the most from
+    one row to the next (most letters end there, only descenders go on).
+    """
+    counts = mask[top:bottom + 1].sum(axis=1)
+    drops = counts - np.append(counts[1:], 0)
+    return top + int(drops.argmax())
+
+
+class GlyphAtlas:
+    """
+    The page font at one zoom level: glyph templates, the font's ascent and
+    descent in pixels and the gap (relative to the text height) above which two
+    glyphs belong to different words.
+    """
+
+    def __init__(self, size: Tuple[int, int] = ATLAS_SIZE, min_score: float = 0.8) -> None:
+        self.bank = GlyphBank(size, max_per_label=3)
+        self.min_score = min_score  # Lowest correlation accepted for any glyph of a passage
+        self.ascent = 0
+        self.descent = 0
+        self.space_gap = 0.0
+        self.split_gap = -1  # Widest gap in pixels inside a letter in two pieces, -1 if the font has none
+
+    @property
+    def height(self) -> int:
+        return self.ascent + self.descent + 1
+
+    def _layout(self, mask: np.ndarray, lines: np.ndarray) -> List[Tuple[int, np.ndarray]]:
+        """
+        Per line: the top row of its text box and the glyph columns (x1, x2 inclusive).
+        """
+        layout = []
+        for top, bottom in lines:
+            columns = split_columns(mask[top:bottom + 1])[:, [0, 2]]
+            layout.append((baseline(mask, top, bottom) - self.ascent, columns))
+        return layout
+
+    def _boxes(self, layout_line: Tuple[int, np.ndarray], groups: List[Tuple[int, int]], pad: int) -> np.ndarray:
+        """
+        Boxes (x1, y1, x2, y2) of glyph groups, each spanning segments first..last of a line.
+        """
+        top, columns = layout_line
+        return np.array([[columns[a, 0], top + pad, columns[b, 1], top + pad + self.height - 1] for a, b in groups],
+                        dtype=np.int64).reshape(-1, 4)
+
+    def _words(self, columns: np.ndarray) -> List[range]:
+        gaps = (columns[1:, 0] - columns[:-1, 1] - 1) / self.height
+        breaks = np.flatnonzero(gaps > self.space_gap) + 1
+        edges = [0, *breaks.tolist(), len(columns)]
+        return [range(a, b) for a, b in zip(edges[:-1], edges[1:])]
+
+    def read(self, img: np.ndarray, anchor: int) -> Optional[str]:
+        """
+        Text of the passage around row `anchor` of img, or None when a glyph is
+        not confidently known (the caller falls back to the clipboard path).
+        """
+        if not self.bank.templates:
+            return None
+        mask = ink_mask(img)
+        lines = passage_lines(text_lines(mask, max(2, self.height // 4)), anchor)
+        if len(lines) == 0:
+            return None
+        pad = self.height  # Text boxes can reach past the frame edges
+        padded = np.pad(mask, ((pad, pad), (0, 0)))
+
+        # Every segment on its own, plus neighbours close enough to be the two
+        # pieces of one letter, all classified in one batch
+        words, boxes = [], []
+        offset = 0
+        for layout_line in self._layout(mask, lines):
+            columns = layout_line[1]
+            for word in self._words(columns):
+                pairs = [i for i in word[:-1] if columns[i + 1, 0] - columns[i, 1] - 1 <= self.split_gap]
+                groups = [(i, i) for i in word] + [(i, i + 1) for i in pairs]
+                words.append((offset, len(word),
+                              {i - word.start: offset + len(word) + k for k, i in enumerate(pairs)}))
+                boxes.append(self._boxes(layout_line, groups, pad))
+                offset += len(groups)
+        labels, scores = self.bank.classify(normalise_glyphs(padded, np.concatenate(boxes), self.bank.size))
+
+        # Per word the cheapest cover of its segments by singles and pairs, a
+        # glyph costing 1 - score plus a little, so a pair that matches ('"')
+        # wins over two pieces that match too (' ')
+        text = []
+        for offset, n, pairs in words:
+            cost = [0.0] + [np.inf] * n
+            choice = [(0, 1)] * (n + 1)  # (glyph, segments it covers) ending at each segment
+            for i in range(1, n + 1):
+                single = offset + i - 1
+                if cost[i - 1] + GLYPH_COST - scores[single] < cost[i]:
+                    cost[i], choice[i] = cost[i - 1] + GLYPH_COST - scores[single], (single, 1)
+                pair = pairs.get(i - 2)
+                if pair is not None and cost[i - 2] + GLYPH_COST - scores[pair] < cost[i]:
+                    cost[i], choice[i] = cost[i - 2] + GLYPH_COST - scores[pair], (pair, 2)
+            glyphs = []
+            i = n
+            while i > 0:
+                glyphs.append(choice[i][0])
+                i -= choice[i][1]
+            if scores[glyphs].min() < self.min_score:
+                return None
+            text.append("".join(labels[g] for g in reversed(glyphs)))
+        return " ".join(text)
+
+    def learn(self, img: np.ndarray, anchor: int, text: str) -> bool:
+        """
+        Learn the font from a frame showing the passage around row `anchor`
+        whose text is known. False when the layout can't be matched to the
+        text (the atlas is unusable then, start over with a new one).
+        """
+        words = text.split()
+        mask = ink_mask(img)
+        lines = passage_lines(text_lines(mask), anchor)
+        if len(lines) == 0 or not words:
+            return False
+        baselines = [baseline(mask, top, bottom) for top, bottom in lines]
+        self.ascent = int(max(b - top for b, (top, _) in zip(baselines, lines)))
+        self.descent = int(max(bottom - b for b, (_, bottom) in zip(baselines, lines)))
+        layout = self._layout(mask, lines)
+
+        # Lines wrap at spaces, so the widest (words - lines) gaps are the spaces
+        gaps = np.concatenate([(c[1:, 0] - c[:-1, 1] - 1) / self.height for _, c in layout])
+        spaces = len(words) - len(lines)
+        if spaces < 0 or spaces > gaps.size:
+            return False
+        ordered = np.sort(gaps)[::-1]
+        widest_other = ordered[spaces] if spaces < gaps.size else 0.0
+        narrowest_space = ordered[spaces - 1] if spaces else widest_other * 2 + 0.1
+        if narrowest_space <= widest_other:
+            return False
+        self.space_gap = float((narrowest_space + widest_other) / 2)
+
+        segments = [(layout_line, word) for layout_line in layout for word in self._words(layout_line[1])]
+        if len(segments) != len(words):
+            return False
+
+        # Words with one segment per letter give the letter widths, the others
+        # are aligned with them (touching letters, letters in two pieces)
+        widths = {}
+        for ((_, columns), span), word in zip(segments, words):
+            if len(span) == len(word):
+                for i, char in zip(span, word):
+                    widths.setdefault(char, []).append(columns[i, 1] - columns[i, 0] + 1)
+        default = float(np.median([w for ws in widths.values() for w in ws])) if widths else self.height / 2
+        expected = {char: float(np.median(ws)) for char, ws in widths.items()}
+
+        pad = self.height
+        padded = np.pad(mask, ((pad, pad), (0, 0)))
+        labels, boxes = [], []
+        self.split_gap = -1
+        for ((top, columns), span), word in zip(segments, words):
+            groups = align_word(columns[span.start:span.stop], word, expected, default, self.height)
+            if groups is None:
+                return False
+            labels.extend(label for label, _ in groups)
+            for _, (a, b) in groups:
+                if b > a:
+                    gap = columns[span.start + b, 0] - columns[span.start + a, 1] - 1
+                    self.split_gap = max(self.split_gap, int(gap))
+            boxes.append(self._boxes((top, columns), [(span.start + a, span.start + b) for _, (a, b) in groups], pad))
+        glyphs = normalise_glyphs(padded, np.concatenate(boxes), self.bank.size)
+        for label, glyph in zip(labels, glyphs):
+            self.bank.add(label, glyph)
+        return True
+
+    def to_json(self) -> dict:
+        return {"bank": self.bank.to_json(), "min_score": self.min_score, "ascent": self.ascent,
+                "descent": self.descent, "space_gap": self.space_gap, "split_gap": self.split_gap}
+
+    @classmethod
+    def from_json(cls, data: dict) -> "GlyphAtlas":
+        atlas = cls(tuple(data["bank"]["size"]), data["min_score"])
+        atlas.bank = GlyphBank.from_json(data["bank"])
+        atlas.bank.max_per_label = 3
+        atlas.ascent, atlas.descent = data["ascent"], data["descent"]
+        atlas.space_gap, atlas.split_gap = data["space_gap"], data["split_gap"]
+        return atlas
+
+
+def align_word(columns: np.ndarray, word: str, expected: dict, default: float,
+               height: int) -> Optional[List[Tuple[str, Tuple[int, int]]]]:
+    """
+    Match the glyph columns of one word to its letters: one segment per letter,
+    one segment for two or three touching letters, or two segments for one
+    letter in two pieces. Picks the alignment whose widths best fit the
+    expected letter widths. Returns (label, (first, last segment)) per glyph,
+    or None if the word can't be aligned.
+    """
+    m, n = len(columns), len(word)
+    cost = np.full((m + 1, n + 1), np.inf)
+    cost[0, 0] = 0.0
+    step = {}
+    for i in range(m + 1):
+        for j in range(n + 1):
+            if not np.isfinite(cost[i, j]):
+                continue
+            for segs, chars, penalty in ((1, 1, 0.0), (1, 2, 0.15), (1, 3, 0.3), (2, 1, 0.15)):
+                if i + segs > m or j + chars > n:
+                    continue
+                width = columns[i + segs - 1, 1] - columns[i, 0] + 1
+                want = sum(expected.get(c, default) for c in word[j:j + chars])
+                total = cost[i, j] + abs(width - want) / height + penalty
+                if total < cost[i + segs, j + chars]:
+                    cost[i + segs, j + chars] = total
+                    step[i + segs, j + chars] = (segs, chars)
+    if not np.isfinite(cost[m, n]):
+        return None
+    groups = []
+    i, j = m, n
+    while i or j:
+        segs, chars = step[i, j]
+        groups.append((word[j - chars:j], (i - segs, i - 1)))
+        i, j = i - segs, j - chars
+    return groups[::-1]
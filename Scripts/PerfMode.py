@@ -0,0 +1,175 @@
+import gc
+import os
+import sys
+import time
+from typing import Optional, Sequence
+
+from LatencyStats import LatencyHistogram
+
+try:
+    import win32api, win32process, win32con
+except ImportError:
+    win32api = win32process = win32con = None
+
+
+class PerformanceMode:
+    """
+    Opt-in tuning for the busy loops, applied to the calling thread:
+    - pin it to the given cores
+    - raise its scheduling priority where the OS allows it
+    - switch the garbage collector off, with explicit checkpoint() collections
+
+    Use it as a context manager around the hot section, everything is undone on exit.
+    """
+
+    def __init__(self, cores: Optional[Sequence[int]] = None, priority: bool = True, disable_gc: bool = True) -> None:
+        self.cores = list(cores) if cores else None
+        self.priority = priority
+        self.disable_gc = disable_gc
+        self.applied = []  # What actually took effect, for the report
+        self._saved_affinity = None
+        self._saved_nice = None
+        self._saved_thread_priority = None
+        self._gc_was_enabled = gc.isenabled()
+
+    def _pin(self) -> None:
+        if hasattr(os, "sched_setaffinity"):
+            self._saved_affinity = os.sched_getaffinity(0)
+            os.sched_setaffinity(0, self.cores)  # 0 = calling thread on Linux
+            self.applied.append(f"affinity {self.cores}")
+        elif win32process is not None:
+            mask = sum(1 << core for core in self.cores)
+            self._saved_affinity = win32process.SetThreadAffinityMask(win32api.GetCurrentThread(), mask)
+            self.applied.append(f"affinity {self.cores}")
+
+    def _raise_priority(self) -> None:
+        if sys.platform.startswith("linux"):
+            # No SCHED_FIFO: a real-time spin loop pinned to a core starves everything else on it
+            try:
+                self._saved_nice = os.getpriority(os.PRIO_PROCESS, 0)
+                os.setpriority(os.PRIO_PROCESS, 0, self._saved_nice - 10)
+                self.applied.append("nice -10")
+            except (PermissionError, OSError):
+                self._saved_nice = None
+                self.applied.append("priority unchanged (no permission)")
+        elif win32process is not None:
+            thread = win32api.GetCurrentThread()
+            self._saved_thread_priority = win32process.GetThreadPriority(thread)
+            win32process.SetPriorityClass(win32api.GetCurrentProcess(), win32process.HIGH_PRIORITY_CLASS)
+            win32process.SetThreadPriority(thread, win32con.THREAD_PRIORITY_HIGHEST)
+            self.applied.append("HIGH_PRIORITY_CLASS / THREAD_PRIORITY_HIGHEST")
+
+    def __enter__(self) -> "PerformanceMode":
+        self.applied = []
+        if self.cores:
+            try:
+                self._pin()
+            except OSError as e:
+                self.applied.append(f"affinity failed ({e})")
+        if self.priority:
+            self._raise_priority()
+        if self.disable_gc:
+            self._gc_was_enabled = gc.isenabled()
+            gc.collect()
+            gc.freeze()  # Long lived objects stay out of every later collection
+            gc.disable()
+            self.applied.append("gc off")
+        print(f"Performance mode: {', '.join(self.applied) or 'nothing applied'}")
+        return self
+
+    def checkpoint(self) -> None:
+        """
+        Explicit collection point for a quiet moment (between trials, after a click burst).
+        """
+        if self.disable_gc:
+            gc.collect(0)
+
+    def __exit__(self, *exc) -> None:
+        if self.disable_gc:
+            gc.unfreeze()
+            if self._gc_was_enabled:
+                gc.enable()
+        if self._saved_nice is not None:
+            try:
+                os.setpriority(os.PRIO_PROCESS, 0, self._saved_nice)
+            except (PermissionError, OSError):
+                pass  # Lowering priority back needs no permission, raising it would
+        if self._saved_thread_priority is not None:
+            win32process.SetThreadPriority(win32api.GetCurrentThread(), self._saved_thread_priority)
+            win32process.SetPriorityClass(win32api.GetCurrentProcess(), win32process.NORMAL_PRIORITY_CLASS)
+        if self._saved_affinity is not None:
+            if hasattr(os, "sched_setaffinity"):
+                os.sched_setaffinity(0, self._saved_affinity)
+            else:
+                win32process.SetThreadAffinityMask(win32api.GetCurrentThread(), self._saved_affinity)
+
+
+class NullPerformanceMode:
+    """
+    Stand-in when performance mode is off, so loops can call checkpoint() unconditionally.
+    """
+
+    def __enter__(self) -> "NullPerformanceMode":
+        return self
+
+    def checkpoint(self) -> None:
+        pass
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+
+class JitterRecorder:
+    """
+    Records the time between consecutive tick() calls in a LatencyHistogram
+    (fixed memory however long the loop runs, pass a LoopStats histogram to
+    share it) and reports the distribution of loop iteration times.
+    """
+
+    def __init__(self, histogram: Optional[LatencyHistogram] = None) -> None:
+        self.histogram = histogram if histogram is not None else LatencyHistogram()
+        self.last = 0
+
+    def tick(self) -> None:
+        now = time.perf_counter_ns()
+        if self.last:
+            self.histogram.record(now - self.last)
+        self.last = now
+
+    def pause(self) -> None:
+        """
+        Skip the gap to the next tick (sleeps between tests are not loop jitter).
+        """
+        self.last = 0
+
+    def summary(self) -> dict:
+        stats = self.histogram.summary()
+        if stats:
+            stats["iterations"] = stats.pop("count")
+        return stats
+
+    def report(self, label: str = "Loop") -> None:
+        stats = self.summary()
+        if not stats:
+            print(f"{label} jitter: no iterations recorded")
+            return
+        print(f"{label} jitter over {stats['iterations']} iterations: mean {stats['mean_us']:.1f}us, "
+              f"p50 {stats['p50_us']:.1f}us, p90 {stats['p90_us']:.1f}us, p99 {stats['p99_us']:.1f}us, "
+              f"p99.9 {stats['p99.9_us']:.1f}us, max {stats['max_us']:.1f}us")
+
+
+def ask_performance_mode():
+    """
+    Prompt for performance mode, returns a PerformanceMode or NullPerformanceMode.
+    """
+    answer = input("Enable performance mode (pin cores, raise priority, GC off)? (y/N): ").strip().lower()
+    if answer != "y":
+        return NullPerformanceMode()
+    cores_input = input("Cores to pin to, comma separated (default: don't pin): ").strip()
+    cores = None
+    if cores_input:
+        try:
+            cores = [int(c) for c in cores_input.split(",")]
+        except ValueError:
+            print("Invalid core list, not pinning")
+    return PerformanceMode(cores=cores)
@@ -0,0 +1,179 @@
+import sys
+import time
+from typing import List, Optional, Tuple
+
+import mss
+
+# Probes read one or a few screen pixels as raw BGRA bytes with as little per-call
+# overhead as each platform allows. select_probe() benchmarks the available ones
+# on the current machine and keeps the fastest of those that read the same pixels
+# as mss, so a probe that is broken on some display is never picked.
+
+
+class MssProbe:
+    """
+    Baseline: a full mss grab (and ScreenShot object) per read.
+    """
+    name = "mss"
+
+    def __init__(self, x: int, y: int, width: int = 1, height: int = 1) -> None:
+        self.sct = mss.mss()
+        self.region = {'top': y, 'left': x, 'width': width, 'height': height}
+
+    def read(self) -> bytes:
+        return bytes(self.sct.grab(self.region).raw)
+
+    def close(self) -> None:
+        self.sct.close()
+
+
+class GdiPixelProbe:
+    """
+    Windows: GetPixel on a screen DC that is opened once and kept.
+    """
+    name = "gdi-getpixel"
+
+    def __init__(self, x: int, y: int, width: int = 1, height: int = 1) -> None:
+        import win32gui
+        self.win32gui = win32gui
+        self.hdc = win32gui.GetDC(0)
+        self.points = [(x + dx, y + dy) for dy in range(height) for dx in range(width)]
+
+    def read(self) -> bytes:
+        get_pixel = self.win32gui.GetPixel
+        hdc = self.hdc
+        out = bytearray()
+        for x, y in self.points:
+            color = get_pixel(hdc, x, y)  # 0x00BBGGRR
+            out += bytes((color >> 16 & 0xff, color >> 8 & 0xff, color & 0xff, 0xff))
+        return bytes(out)
+
+    def close(self) -> None:
+        self.win32gui.ReleaseDC(0, self.hdc)
+
+
+class XGetImageProbe:
+    """
+    Linux/X11: plain XGetImage on the root window per read.
+    """
+    name = "x11-getimage"
+
+    def __init__(self, x: int, y: int, width: int = 1, height: int = 1) -> None:
+        from X11Backend import X11Display
+        self.display = X11Display()
+        self.rect = (x, y, width, height)
+
+    def read(self) -> bytes:
+        return self.display.get_image(*self.rect)
+
+    def close(self) -> None:
+        self.display.close()
+
+
+def available_probes() -> list:
+    """
+    Probe classes worth trying on this platform, baseline last.
+    """
+    if sys.platform == "win32":
+        return [GdiPixelProbe, MssProbe]
+    if sys.platform.startswith("linux"):
+        # XTest can only inject input, it has no way to read pixels, so there is no XTest probe
+        return [XGetImageProbe, MssProbe]
+    return [MssProbe]
+
+
+def bgra_to_rgb(raw: bytes, index: int = 0) -> Tuple[int, int, int]:
+    b, g, r = raw[index * 4:index * 4 + 3]
+    return (r, g, b)
+
+
+def same_pixels(a: bytes, b: bytes) -> bool:
+    """
+    Whether two reads hold the same colours. Only B, G and R are compared, the
+    fourth byte is alpha for some probes and padding for others.
+    """
+    return len(a) == len(b) and all(a[i::4] == b[i::4] for i in range(3))
+
+
+def agrees(probe, reference, attempts: int = 3) -> bool:
+    """
+    Whether probe reads what reference reads. The screen can change between
+    reads, so it's enough to match the reference read just before or just
+    after, in one of a few attempts.
+    """
+    for _ in range(attempts):
+        before = reference.read()
+        raw = probe.read()
+        if same_pixels(raw, before) or same_pixels(raw, reference.read()):
+            return True
+    return False
+
+
+def time_probe(probe, duration: float = 0.2, warmup: int = 20) -> float:
+    """
+    Mean seconds per read over roughly `duration` seconds.
+    """
+    read = probe.read
+    for _ in range(warmup):
+        read()
+    reads = 0
+    start = time.perf_counter()
+    end = start + duration
+    now = start
+    while now < end:
+        for _ in range(16):
+            read()
+        reads += 16
+        now = time.perf_counter()
+    return (now - start) / reads
+
+
+def select_probe(x: int, y: int, width: int = 1, height: int = 1, duration: float = 0.2,
+                 candidates: Optional[list] = None, verbose: bool = True):
+    """
+    Microbenchmark every available probe on the watched region and return
+    (fastest probe, [(name, seconds per read or error)]). The baseline (last
+    candidate) is opened first and every other probe has to read the same
+    pixels as it to count. The others are closed.
+    """
+    results: List[Tuple[str, object]] = []
+    *others, baseline = candidates or available_probes()
+    reference = None
+    best, best_time = None, float('inf')
+    for probe_class in [baseline, *others]:
+        probe = None
+        try:
+            probe = probe_class(x, y, width, height)
+            if reference is not None and not agrees(probe, reference):
+                raise ValueError(f"reads different pixels than {reference.name}")
+            per_read = time_probe(probe, duration)
+        except Exception as e:
+            if probe is not None:
+                probe.close()
+            results.append((probe_class.name, f"unavailable ({e})"))
+            continue
+        if probe_class is baseline:
+            reference = probe
+        results.append((probe_class.name, per_read))
+        if per_read < best_time:
+            if best is not None and best is not reference:
+                best.close()
+            best, best_time = probe, per_read
+        elif probe is not reference:
+            probe.close()
+    if reference is not None and reference is not best:
+        reference.close()
+
+    if verbose:
+        baseline_time = dict(results).get(baseline.name)
+        for name, result in results:
+            if isinstance(result, float):
+                versus = f", {result / baseline_time:.2f}x {baseline.name}" if isinstance(baseline_time, float) else ""
+                print(f"  {name:<14} {result * 1e6:9.1f} us/read ({1 / result:,.0f} reads/s{versus})")
+            else:
+                print(f"  {name:<14} {result}")
+        if best is not None:
+            print(f"Using {best.name} probe")
+    if best is None:
+        raise RuntimeError("No pixel probe works on this machine")
+    return best, results
@@ -1,71 +1,228 @@
 from time import sleep, perf_counter_ns
-import mss
-import win32api, win32con  # Much faster than pyautogui for clicking
+from contextlib import closing
+import numpy as np
+try:
+    import win32api, win32con  # Left button state for the start click
+except ImportError:  # Linux: input goes through X11 instead
+    win32api = win32con = None
+from CalibrationCache import CalibrationCache
+from DetectionKernels import majority_color, warm_up
+from InputBackend import VK_MENU, VK_TAB, default_input
+from PixelProbe import select_probe
+from PerfMode import JitterRecorder, NullPerformanceMode, ask_performance_mode
+from LatencyStats import LoopStats
+from MetricsStore import MetricsSession, NullMetrics
+
+_x11 = None
+_input = None
+
+# Screen colours of the test, indices are the patch states PatchDetector reports
+WAIT, READY, RESULT, UNKNOWN = 0, 1, 2, -1
+PATCH_PALETTE = np.array([(0xce, 0x26, 0x36),  # Red, wait for green
+                          (0x4b, 0xdb, 0x6a),  # Green, click!
+                          (0x2b, 0x87, 0xd1)],  # Blue, result / start / too soon
+                         dtype=np.int32)
+STATE_NAMES = {WAIT: "wait", READY: "ready", RESULT: "result", UNKNOWN: "unknown"}
+
+class PatchDetector:
+    """
+    Classifies a size x size patch centred on (x, y), read with one probe
+    grab: every pixel votes for the test colour it's within tolerance of and
+    a colour needs a majority of the patch to win. A cursor over a corner of
+    the patch or a few off pixels can't change the state the way they change
+    a single watched pixel.
+    """
+
+    def __init__(self, x: int, y: int, size: int = 8, tolerance: int = 30, probe=None, verbose: bool = True) -> None:
+        self.region = (x - size // 2, y - size // 2, size, size)
+        self.tolerance = tolerance
+        self.quorum = size * size // 2 + 1
+        if probe is None:
+            # Pick the cheapest way to read this patch on this machine (raw BGRA bytes, no ScreenShot objects)
+            probe, _ = select_probe(*self.region, verbose=verbose)
+        self.probe = probe
+
+    def classify(self, raw: bytes) -> int:
+        pixels = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 4)
+        return majority_color(pixels, PATCH_PALETTE, self.tolerance, self.quorum)
+
+    def read(self) -> int:
+        return self.classify(self.probe.read())
+
+    def close(self) -> None:
+        self.probe.close()
+
+def x11_display():
+    """Lazily open the X11 connection used on Linux (pointer and clicks)."""
+    global _x11
+    if _x11 is None:
+        from X11Backend import X11Display
+        _x11 = X11Display()
+    return _x11
+
+def input_backend():
+    """Lazily open the input backend, sharing the X11 connection on Linux."""
+    global _input
+    if _input is None:
+        _input = default_input(x11_display() if win32api is None else None)
+    return _input
 
 def click(x, y):
     """Simulates a left mouse click at the given (x, y) position."""
-    win32api.SetCursorPos((x, y))
-    win32api.mouse_event(win32con.MOUSEEVENTF_LEFTDOWN, 0, 0)
-    win32api.mouse_event(win32con.MOUSEEVENTF_LEFTUP, 0, 0)
+    input_backend().click(x, y)
+
+def get_cursor_pos():
+    """Returns the current mouse position."""
+    return input_backend().cursor_pos()
+
+def left_button_down() -> bool:
+    """Returns True while the left mouse button is held."""
+    if win32api is None:
+        from X11Backend import BUTTON1_MASK
+        return bool(x11_display().pointer()[2] & BUTTON1_MASK)
+    return bool(win32api.GetAsyncKeyState(win32con.VK_LBUTTON) & 0x8000)
 
 def wait_for_left_click(prompt: str):
     """Waits for the user to left-click, displaying the given prompt."""
     print(prompt)
     # Ensure the left mouse button is released
-    while win32api.GetAsyncKeyState(win32con.VK_LBUTTON) & 0x8000:
+    while left_button_down():
         sleep(0.01)
     # Wait for a left click to occur
-    while not (win32api.GetAsyncKeyState(win32con.VK_LBUTTON) & 0x8000):
+    while not left_button_down():
         sleep(0.01)
 
-def react_to_color_changes(x, y):
-    """Monitors a single screen pixel for a color change then clicks at (x, y)."""
-    with mss.mss() as sct:
-        # Define a minimal capture region for performance
-        region = {'top': y, 'left': x, 'width': 1, 'height': 1}
-        print(f"Monitoring position set to ({x}, {y}).")
-        times = []
-        
-        # Pre-allocate variables outside loops
-        start_time = 0
-        first_test = True
+def wait_for_state(read_state, states, timeout=None):
+    """
+    Reads the patch until it shows one of states. Returns that state, or the
+    last one read if timeout seconds passed first.
+    """
+    deadline = None if timeout is None else perf_counter_ns() + int(timeout * 1e9)
+    while True:
+        state = read_state()
+        if state in states:
+            return state
+        if deadline is not None and perf_counter_ns() >= deadline:
+            return state
+
+def trial_stats(live=True):
+    """LoopStats of run_trials: poll frames, green to click, the click itself and result screen click to red."""
+    return LoopStats("Reaction loop", ("frame", "detect", "dispatch", "advance"), live=live)
 
+def run_trials(read_state, click_at, trials=5, perf_mode=None, metrics=None, jitter=None,
+               advance_timeout=1.0, stats=None):
+    """
+    Plays trials tests (None: until Ctrl+C) on a page that was just clicked to start, driven by what the patch shows:
+    red arms the detector, green is clicked at once (also when it shows up without red being seen first), a blue
+    result screen is clicked through the moment it's up (again only if the page still hasn't moved on
+    advance_timeout seconds after a click). Frames that match no test colour (mid-transition, split patch) are read
+    past, only the result screen ends an armed test.
+    Every trial goes into stats (trial_stats()), returns the number of trials finished.
+    """
+    perf_mode = perf_mode or NullPerformanceMode()
+    metrics = metrics or NullMetrics()
+    stats = stats or trial_stats()
+    jitter = jitter or JitterRecorder(stats["frame"])
+    detect = stats["detect"]
+    last_click = perf_counter_ns()  # The click that started the test
+    advanced_at = None  # When the last result screen was clicked through
+    while trials is None or detect.count < trials:
+        state = wait_for_state(read_state, (WAIT, READY, RESULT), advance_timeout)
+        if state == RESULT:
+            waited = (perf_counter_ns() - last_click) / 1e9
+            if waited > advance_timeout:
+                click_at()
+                last_click = advanced_at = perf_counter_ns()
+            else:  # Clicked already, give the page the rest of the timeout to move on
+                wait_for_state(read_state, (WAIT, READY), advance_timeout - waited)
+            continue
+        if state not in (WAIT, READY):
+            continue
+        
+        # Red: armed. Busy-loop for minimal latency green checking.
+        # Already green: the armed loop's first read sees it and clicks
+        if advanced_at is not None:  # The first test was started by hand
+            stats["advance"].record(perf_counter_ns() - advanced_at)
+            advanced_at = None
+        if state == WAIT:
+            print(f"Trial {detect.count + 1}: waiting for green...")
         while True:
-            if first_test:
-                # Wait for the initial left click from the user to start monitoring
-                wait_for_left_click("Left click to start monitoring...")
-                first_test = False
-                sleep(0.2)  # Delay to avoid immediate re-triggering
-
-            # Capture the initial screenshot and color without timing overhead
-            sct_img = sct.grab(region)
-            initial_color = sct_img.pixel(0, 0)
-            print(f"Initial color: {initial_color}. Monitoring for change...")
-
-            # Busy-loop for minimal latency color checking
-            while True:
-                start_time = perf_counter_ns()
-                sct_img = sct.grab(region)
-                current_color = sct_img.pixel(0, 0)
-                
-                if current_color != initial_color:
-                    rt = (perf_counter_ns() - start_time) / 1000000  # Reaction time in ms
-                    click(x, y)
-                    times.append(rt)
-                    print(f"Color changed! RT: {rt:.3f}ms")
-                    
-                    sleep(0.5)
-                    click(x, y)
-                    print("Second click done, restarting test...")
-                    sleep(0.2)  # Small delay before restarting
-                    break
+            jitter.tick()
+            start_time = perf_counter_ns()
+            state = read_state()
+            if state == READY:
+                detected = perf_counter_ns()
+                click_at()
+                clicked = perf_counter_ns()
+                last_click = 0  # Click the result screen as soon as it shows up
+                detect.record(detected - start_time)
+                stats["dispatch"].record(clicked - detected)
+                read_ms = (detected - start_time) / 1000000  # The read that saw green, not the page's reaction time
+                metrics.record("green_read_ms", read_ms, level=detect.count)
+                print(f"Green! Seen in a {read_ms:.3f}ms read")
+                if stats.live:
+                    print(stats.readout())
+                jitter.pause()
+                perf_mode.checkpoint()  # Collect garbage while the result screen comes up
+                # Until the page repaints it still shows the green that was just clicked
+                wait_for_state(read_state, (WAIT, RESULT, UNKNOWN), advance_timeout)
+                break
+            if state == RESULT:
+                print(f"Test left the wait screen ({STATE_NAMES[state]}) before green")
+                break
+    return detect.count
+
+def report_trials(stats, wall_s, metrics=None):
+    """Prints the session summary of run_trials' stats and records it to metrics."""
+    metrics = metrics or NullMetrics()
+    detect, advances = stats["detect"], stats["advance"]
+    if not detect.count:
+        print("No trials finished.")
+        return
+    print(f"\n===== {detect.count} trials in {wall_s:.2f}s =====")
+    print(f"Read that saw green: mean {detect.mean / 1e6:.3f}ms, best {detect.min / 1e6:.3f}ms, "
+          f"worst {detect.max / 1e6:.3f}ms")
+    if advances.count:
+        print(f"Result screen click to the next red: mean {advances.mean / 1e6:.1f}ms, worst {advances.max / 1e6:.1f}ms")
+        metrics.record("advance_ms", advances.mean / 1e6, trials=detect.count)
+    stats.report()
+    stats.save(metrics)
+    metrics.record("session_s", wall_s, trials=detect.count)
+
+def react_to_color_changes(x, y, trials=5, perf_mode=None, metrics=None, patch_size=8):
+    """
+    Runs trials Reaction Time tests (None: until Ctrl+C) watching a patch_size x patch_size patch around (x, y)
+    and clicking at (x, y) the moment it turns green, then prints a summary.
+    perf_mode (PerfMode.PerformanceMode) is applied around the monitoring loop,
+    the duration of every read that saw green is recorded to metrics (MetricsStore.MetricsSession).
+    """
+    perf_mode = perf_mode or NullPerformanceMode()
+    metrics = metrics or NullMetrics()
+    stats = trial_stats()
+    warm_up()  # Compile the vote kernel before the first read
+    print("Benchmarking pixel probes...")
+    detector = PatchDetector(x, y, patch_size)
+    with closing(detector), perf_mode:
+        print(f"Monitoring position set to ({x}, {y}).")
+        state = detector.read()
+        print(f"The test shows: {STATE_NAMES[state]}")
+        if state == UNKNOWN:
+            print("The patch doesn't show a known test colour, is the position on the test area?")
+        
+        # The user's click starts the first test, everything after that follows the page
+        wait_for_left_click("Left click to start...")
+        started = perf_counter_ns()
+        try:
+            run_trials(detector.read, lambda: click(x, y), trials, perf_mode, metrics, stats=stats)
+        finally:
+            report_trials(stats, (perf_counter_ns() - started) / 1e9, metrics)
 
 if __name__ == '__main__':
     print("===== Reaction Time Test =====")
-    print("This tool monitors a specific screen pixel and clicks when a color change is detected.")
+    print("This tool watches a small patch of the test area and clicks the moment it turns green.")
     print("1. Position your mouse over the reaction test area.")
     print("2. After the countdown, your position will be captured.")
-    print("3. Then, left click to begin monitoring.")
+    print("3. Then, left click to start the test, the trials and result screens go on their own.")
     print("4. Press Ctrl+C at any time to exit. (probably)")
     print("================================")
     input("Press Enter to start...")
@@ -73,19 +230,37 @@ if __name__ == '__main__':
     # alt+tab switching option (default: false)
     alttab: bool = False
     if alttab:
-        win32api.keybd_event(0x12, 0, 0, 0)  # Alt key down
-        win32api.keybd_event(0x09, 0, 0, 0)  # Tab key down
-        win32api.keybd_event(0x09, 0, win32con.KEYEVENTF_KEYUP, 0)  # Tab key up
-        win32api.keybd_event(0x12, 0, win32con.KEYEVENTF_KEYUP, 0)  # Alt key up
-
-    print("Capturing your position in 3 seconds...")
-    sleep(3)
-    pos = win32api.GetCursorPos()
-    print(f"Position captured: {pos}")
+        with input_backend().batch() as keys:
+            keys.key_down(VK_MENU)
+            keys.key_press(VK_TAB)
+            keys.key_up(VK_MENU)
+
+    # Reuse the cached position as soon as the test page is on screen, skipping the countdown
+    cache = CalibrationCache("ReactionTime")
+    entry = cache.load()
+    if entry is not None:
+        print("Cached position found, switch to the reaction test page...")
+    if entry is not None and cache.wait_until_verified(entry, timeout=10.0):
+        pos = tuple(entry["coords"][0])
+        print(f"Using cached position: {pos}")
+    else:
+        print("Capturing your position in 3 seconds...")
+        sleep(3)
+        pos = get_cursor_pos()
+        print(f"Position captured: {pos}")
+        cache.save({"coords": [list(pos)]}, [pos])
+    
+    trials_input = input("Trials to play (default 5, 0 = until Ctrl+C): ").strip()
+    trials = int(trials_input) if trials_input.isdigit() else 5
+    perf_mode = ask_performance_mode()
+    params = {"performance_mode": not isinstance(perf_mode, NullPerformanceMode),
+              "trials": trials}
     
     try:
         # Start monitoring using the captured mouse position
-        react_to_color_changes(pos[0], pos[1])
+        with MetricsSession("ReactionTime", params=params) as metrics:
+            react_to_color_changes(pos[0], pos[1], trials=trials or None, perf_mode=perf_mode,
+                                   metrics=metrics)
     except KeyboardInterrupt:
         print("\nMonitoring stopped by user")
         
\ No newline at end of file
@@ -0,0 +1,263 @@
+import math
+import time
+from collections import deque
+from typing import Optional
+
+import numpy as np
+
+from LatencyStats import LatencyHistogram
+from StripCapture import sampled_rows
+
+try:
+    import win32api, win32con
+except ImportError:
+    win32api = win32con = None
+
+# The screen only changes when the display refreshes, so a loop that captures
+# and scans as fast as it can mostly re-scans the same frame. RefreshPacer
+# watches when captured content changes, estimates the refresh period and
+# phase from those changes, and sleeps between refreshes: the loop wakes just
+# before the next predicted change and scans back to back until the frame
+# changes, so the change is seen as soon as a spinning loop would see it.
+# Solvers use it by capturing through pacer.watch(capture) and calling
+# pacer.wait() / pacer.done() around each scan.
+
+DEFAULT_PERIOD = 1 / 60
+
+
+def display_refresh_rate() -> Optional[float]:
+    """
+    Refresh rate the OS reports for the primary display (Hz), or None where it can't be asked.
+    """
+    if win32api is None:
+        return None
+    try:
+        settings = win32api.EnumDisplaySettings(None, win32con.ENUM_CURRENT_SETTINGS)
+    except win32api.error:
+        return None
+    return float(settings.DisplayFrequency) if settings.DisplayFrequency > 1 else None
+
+
+def estimate_period(flips: np.ndarray, guess: Optional[float] = None, min_intervals: int = 5) -> Optional[float]:
+    """
+    Refresh period from content change times. Consecutive changes are a whole
+    number of refreshes apart: the short intervals, as multiples of the
+    period, give a first estimate (starting from the shortest common interval
+    or guess). Then every change is numbered by its refresh and the period is
+    the slope of a line through all of them, which gets more precise the
+    longer the history is.
+    """
+    flips = np.unique(flips)
+    intervals = np.diff(flips)
+    if intervals.size < min_intervals:
+        return None
+    period = guess if guess else float(np.percentile(intervals, 10))
+    for _ in range(4):
+        multiples = np.maximum(np.round(intervals / period), 1)
+        fits = (np.abs(intervals - multiples * period) < period * 0.25) & (multiples <= 8)
+        if fits.sum() < min_intervals:
+            return None
+        period = float(intervals[fits].sum() / multiples[fits].sum())
+    keep = np.ones(flips.size, dtype=bool)
+    for _ in range(3):
+        refresh = np.concatenate(([0.0], np.cumsum(np.maximum(np.round(intervals / period), 1))))
+        period, start = np.polyfit(refresh[keep], flips[keep], 1)
+        keep = np.abs(flips - (start + refresh * period)) < period * 0.125  # Changes timed from a loose bracket
+        if keep.sum() < min_intervals + 1:
+            return None
+    return float(period)
+
+
+def sleep_until(deadline: float, spin: float = 0.0005) -> None:
+    """
+    Sleep until perf_counter() reaches deadline: a normal sleep for most of it,
+    then a short spin so oversleeping doesn't add to the latency.
+    """
+    remaining = deadline - time.perf_counter()
+    if remaining > spin:
+        time.sleep(remaining - spin)
+    while time.perf_counter() < deadline:
+        pass
+
+
+class ChangeWatcher:
+    """
+    Capture wrapper that reports to the pacer when each grab happened and
+    whether its content differed from the previous grab (compared on a
+    subsampled copy, a small fraction of the frame).
+    """
+
+    def __init__(self, capture, pacer: "RefreshPacer", stride: int = 8) -> None:
+        self.capture = capture
+        self.pacer = pacer
+        self.stride = stride
+        self.previous: Optional[np.ndarray] = None
+
+    def grab(self, region: dict) -> np.ndarray:
+        start = time.perf_counter()
+        img = self.capture.grab(region)
+        self._observe(start, img[::self.stride, ::self.stride, :3])
+        return img
+
+    def grab_rows(self, region: dict, step: int) -> np.ndarray:
+        start = time.perf_counter()
+        rows = sampled_rows(self.capture, region, step)
+        self._observe(start, rows[:, ::self.stride, :3])  # Already sparse vertically
+        return rows
+
+    def _observe(self, start: float, sample: np.ndarray) -> None:
+        end = time.perf_counter()
+        changed = self.previous is not None and not np.array_equal(sample, self.previous)
+        self.previous = sample.copy()
+        self.pacer.observe((start + end) / 2, changed)
+
+
+class RefreshPacer:
+    """
+    Sleeps through each display refresh period: wakes `lead` seconds before
+    the next predicted content change and lets the loop scan back to back
+    until the content changes, or for `window` seconds past the prediction
+    when the screen doesn't change on that refresh.
+
+    Starts with `calibrate_time` seconds of back-to-back captures to see the
+    content change (the period comes from the OS or 60Hz if nothing moves).
+    After that the loop is paced. Every `resync_interval` seconds captures run
+    back to back again for a few refreshes, until the content changes, to
+    re-lock the phase (the display and perf_counter clocks drift apart).
+
+    With paced=False nothing is ever slept, the pacer only measures, so both
+    modes report the same figures after calibration: CPU use of the loop and
+    the age of each content change when its scan finished.
+    """
+
+    def __init__(self, paced: bool = True, lead: float = 0.001, window: float = 0.001, calibrate_time: float = 1.0,
+                 resync_interval: float = 2.0, burst_refreshes: int = 4, period: Optional[float] = None) -> None:
+        self.paced = paced
+        self.lead = lead  # Wake this long before the predicted change, the phase is only known to a fraction of a ms
+        self.window = window  # Stop spinning this long after it if nothing changed
+        self.calibrate_time = calibrate_time
+        self.resync_interval = resync_interval
+        self.burst_refreshes = burst_refreshes  # Longest re-sync burst, in refresh periods
+        if period is None:
+            rate = display_refresh_rate()
+            period = 1 / rate if rate else None
+        self.os_period = period
+        self.period = period or DEFAULT_PERIOD
+        self.phase: Optional[float] = None  # Time of a known refresh
+        self.calibrated = False
+        self.flips = deque(maxlen=256)  # Content change times pinned down by back-to-back grabs
+        self.last_sample: Optional[float] = None
+        self.pending_change: Optional[float] = None  # Change seen but not scanned yet
+        self.burst_until = 0.0
+        self.last_sync = 0.0
+        self.next_refresh = 0.0  # Predicted change the loop is spinning for
+        self.spin_until = 0.0
+        self.started = None
+        self.cpu_started = None
+        self.scans = 0
+        self.late = 0  # Scans that ran past the following refresh
+        self.change_ages = LatencyHistogram()  # From content change to the end of its scan
+
+    def watch(self, capture, stride: int = 8) -> ChangeWatcher:
+        return ChangeWatcher(capture, self, stride)
+
+    def start(self) -> None:
+        self.started = time.perf_counter()
+        self.cpu_started = time.process_time()
+
+    def observe(self, t: float, changed: bool) -> None:
+        """
+        A grab at time t. A change happened between the previous grab and this
+        one: with back-to-back grabs the midpoint is when the display refreshed
+        (and re-locks the phase), with paced grabs it's the last refresh before t.
+        """
+        if changed and self.last_sample is not None:
+            if t - self.last_sample < self.period / 8:
+                flip = (self.last_sample + t) / 2
+                self.flips.append(flip)
+                self.phase = flip
+                self.last_sync = t
+                self.burst_until = 0.0  # The change a re-sync burst waits for is here
+                self.spin_until = 0.0  # And the one the loop woke up for, back to sleep after this scan
+            elif self.phase is not None:
+                flip = self.phase + math.floor((t - self.phase) / self.period) * self.period
+            else:
+                flip = (self.last_sample + t) / 2
+            self.pending_change = flip
+        self.last_sample = t
+
+    def wait(self) -> None:
+        """
+        Block until just before the next predicted change (returns at once while
+        unpaced, calibrating, re-syncing or spinning for the change).
+        """
+        if self.started is None:
+            self.start()
+        now = time.perf_counter()
+        if not self.calibrated:
+            if now < self.started + self.calibrate_time:
+                return
+            self._finish_calibration()
+        if not self.paced or now < self.burst_until or now < self.spin_until:
+            return
+        if now - self.last_sync > self.resync_interval:
+            self.last_sync = now  # Also when nothing changes during the burst, a static screen gives no phase
+            self.burst_until = now + self.period * self.burst_refreshes
+            self._refit_period()
+            return
+        if self.phase is None:
+            self.phase = now  # Nothing moved yet, any phase will do until something does
+        refresh = self.phase + math.ceil((now + self.lead - self.phase) / self.period) * self.period
+        if refresh < self.next_refresh + self.period / 2:  # Don't spin for the same refresh twice
+            refresh = self.next_refresh + self.period
+        self.next_refresh = refresh
+        self.spin_until = refresh + self.window
+        sleep_until(refresh - self.lead)
+
+    def _refit_period(self) -> None:
+        period = estimate_period(np.array(self.flips), self.period if self.calibrated else self.os_period)
+        if period is not None:
+            self.period = period
+
+    def _finish_calibration(self) -> None:
+        self._refit_period()
+        self.calibrated = True
+        # Figures cover the steady state only, calibration spins in both modes
+        self.start()
+        self.last_sync = self.started
+        self.scans = self.late = 0
+        self.change_ages.reset()
+
+    def done(self) -> None:
+        """The scan of the last capture is finished."""
+        now = time.perf_counter()
+        self.scans += 1
+        if self.pending_change is not None:
+            self.change_ages.record_seconds(now - self.pending_change)
+            self.pending_change = None
+        if self.paced and self.next_refresh and now > self.next_refresh + self.period:
+            self.late += 1
+
+    def summary(self) -> dict:
+        if self.started is None:
+            return {}
+        wall = time.perf_counter() - self.started
+        stats = {"mode": "paced" if self.paced else "spin", "scans": self.scans,
+                 "scans_per_s": self.scans / wall if wall > 0 else 0.0,
+                 "cpu_percent": (time.process_time() - self.cpu_started) / wall * 100 if wall > 0 else 0.0,
+                 "refresh_hz": 1 / self.period, "late": self.late, "changes": self.change_ages.count}
+        if self.change_ages.count:
+            p50, p99 = self.change_ages.percentiles([50, 99])
+            stats.update(latency_p50_ms=p50 / 1e6, latency_p99_ms=p99 / 1e6)
+        return stats
+
+    def report(self, label: str = "Scan loop") -> None:
+        stats = self.summary()
+        if not stats:
+            return
+        line = (f"{label} ({stats['mode']}, {stats['refresh_hz']:.1f}Hz display): {stats['scans_per_s']:.0f} scans/s, "
+                f"CPU {stats['cpu_percent']:.0f}%")
+        if "latency_p50_ms" in stats:
+            line += (f", change to scan done p50 {stats['latency_p50_ms']:.2f}ms "
+                     f"p99 {stats['latency_p99_ms']:.2f}ms over {stats['changes']} changes")
+        print(line)
@@ -0,0 +1,141 @@
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from CaptureMultiplexer import MssCapture
+
+# A grid scan only reads every step-th row of its area, so capturing the whole
+# rectangle moves step times more pixels than the scan looks at. Row captures
+# add grab_rows(region, step) -> BGRA array of just those rows (row i is row
+# i * step of the region) next to the usual grab(region). Which way of getting
+# the rows is cheapest depends on the platform and the area, so
+# select_row_capture() times them on the current machine and keeps the fastest,
+# like PixelProbe.select_probe() does for single pixels.
+
+
+def sampled_rows(capture, region: dict, step: int) -> np.ndarray:
+    """
+    Every step-th row of region: from capture.grab_rows() when the capture
+    has it, else sliced out of a full grab (a view, nothing is copied).
+    """
+    grab_rows = getattr(capture, "grab_rows", None)
+    if grab_rows is not None:
+        return grab_rows(region, step)
+    return capture.grab(region)[::step]
+
+
+class FullFrameRows:
+    """
+    Baseline: grab the whole area and hand out a strided view of its rows.
+    """
+    name = "full-frame"
+
+    def __init__(self, capture=None) -> None:
+        self.capture = capture if capture is not None else MssCapture()
+
+    def grab(self, region: dict) -> np.ndarray:
+        return self.capture.grab(region)
+
+    def grab_rows(self, region: dict, step: int) -> np.ndarray:
+        return self.capture.grab(region)[::step]
+
+    def close(self) -> None:
+        pass
+
+
+class RegionStrips:
+    """
+    One grab of a one pixel high strip per sampled row, copied into an array
+    that is allocated once and reused (so the result is only valid until the
+    next grab_rows). Works over any capture, mss by default.
+    """
+    name = "mss-strips"
+
+    def __init__(self, capture=None) -> None:
+        self.capture = capture if capture is not None else MssCapture()
+        self.rows: Optional[np.ndarray] = None
+
+    def grab(self, region: dict) -> np.ndarray:
+        return self.capture.grab(region)
+
+    def grab_rows(self, region: dict, step: int) -> np.ndarray:
+        count = (region['height'] + step - 1) // step
+        if self.rows is None or self.rows.shape[:2] != (count, region['width']):
+            self.rows = np.empty((count, region['width'], 4), dtype=np.uint8)
+        strip = {'left': region['left'], 'top': region['top'], 'width': region['width'], 'height': 1}
+        grab, rows = self.capture.grab, self.rows
+        for i in range(count):
+            strip['top'] = region['top'] + i * step
+            rows[i] = grab(strip)[0]
+        return rows
+
+    def close(self) -> None:
+        pass
+
+
+def available_row_captures() -> list:
+    """
+    Row capture classes worth trying on this platform, baseline last.
+    """
+    return [RegionStrips, FullFrameRows]
+
+
+def time_row_capture(capture, region: dict, step: int, duration: float = 0.2, warmup: int = 5) -> float:
+    """
+    Mean seconds per grab_rows over roughly `duration` seconds.
+    """
+    for _ in range(warmup):
+        capture.grab_rows(region, step)
+    grabs = 0
+    start = time.perf_counter()
+    end = start + duration
+    now = start
+    while now < end:
+        capture.grab_rows(region, step)
+        grabs += 1
+        now = time.perf_counter()
+    return (now - start) / grabs
+
+
+def select_row_capture(region: dict, step: int, capture=None, duration: float = 0.2,
+                       candidates: Optional[list] = None, verbose: bool = True):
+    """
+    Time every available row capture on region at this step and return
+    (fastest, [(name, seconds per grab or error)]). The others are closed.
+    capture is what grab() (full frames) keeps going through.
+    """
+    results: List[Tuple[str, object]] = []
+    best, best_time = None, float('inf')
+    for capture_class in candidates or available_row_captures():
+        candidate = None
+        try:
+            candidate = capture_class(capture)
+            rows = candidate.grab_rows(region, step)
+            if rows.shape[:2] != ((region['height'] + step - 1) // step, region['width']):
+                raise ValueError(f"returned {rows.shape[0]}x{rows.shape[1]} rows")
+            per_grab = time_row_capture(candidate, region, step, duration)
+        except Exception as e:
+            if candidate is not None:
+                candidate.close()
+            results.append((capture_class.name, f"unavailable ({e})"))
+            continue
+        results.append((capture_class.name, per_grab))
+        if per_grab < best_time:
+            if best is not None:
+                best.close()
+            best, best_time = candidate, per_grab
+        else:
+            candidate.close()
+
+    if verbose:
+        for name, result in results:
+            if isinstance(result, float):
+                print(f"  {name:<16} {result * 1e6:9.1f} us/grab ({1 / result:,.0f} grabs/s)")
+            else:
+                print(f"  {name:<16} {result}")
+        if best is not None:
+            print(f"Using {best.name} capture")
+    if best is None:
+        raise RuntimeError("No row capture works on this machine")
+    return best, results
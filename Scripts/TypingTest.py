@@ -1,14 +1,48 @@
-import win32api, win32con
 import time
-import pyperclip  # For clipboard operations
-from typing import List, Tuple
-import win32clipboard
+from typing import List, Optional, Tuple
+from CalibrationCache import CalibrationCache
+from CaptureMultiplexer import MssCapture
+from ClipboardSession import ClipboardSession, Win32Clipboard
+from DetectionKernels import warm_up
+from PassageReader import GlyphAtlas
+from InputBackend import VK_CONTROL, VK_RETURN, VK_SHIFT, DeferredInput
+from MetricsStore import MetricsSession, NullMetrics
+
+try:
+    import win32api
+except ImportError:
+    win32api = None  # Keystroke generation through input_backend still works (benchmarks)
 
 class MouseController:
-    def __init__(self, num_coords: int = 1, typing_delay: float = 0.01) -> None:
+    def __init__(self, num_coords: int = 1, typing_delay: float = 0.01, input_backend=None,
+                 clipboard_backend=None, capture=None) -> None:
         self.num_coords = num_coords
         self.coords: List[Tuple[int, int]] = []  # List of (x, y) coordinates
         self.typing_delay = typing_delay  # Delay between keystrokes
+        self.input = input_backend if input_backend is not None else DeferredInput()  # Mouse and keyboard events
+        # Clipboard reads and writes wait on its sequence number instead of fixed sleeps
+        self.clipboard = ClipboardSession(clipboard_backend if clipboard_backend is not None else Win32Clipboard())
+        # Nothing tells us when the target has read a paste, so the old clipboard is restored this long after Ctrl+V
+        self.paste_settle = 0.03
+        self._calibration: Optional[CalibrationCache] = None
+        self._capture = capture  # Anything with grab(region), mss when None (opened on first use)
+        self.atlas: Optional[GlyphAtlas] = None  # Page font for reading the passage off the screen
+        self.passage_area: Optional[Tuple[int, int, int, int]] = None  # (x1, y1, x2, y2) searched for the passage
+
+    @property
+    def calibration(self) -> CalibrationCache:
+        """
+        Calibration cache, opened on first use (it needs a screen to capture).
+        """
+        if self._calibration is None:
+            self._calibration = CalibrationCache("TypingTest")
+        return self._calibration
+
+    @property
+    def capture(self):
+        if self._capture is None:
+            self._capture = MssCapture(self.calibration.sct)
+        return self._capture
 
     def wait_for_page_switch(self, seconds: int = 5) -> None:
         """
@@ -22,26 +56,100 @@ class MouseController:
             time.sleep(1)
         print("Starting!")
 
+    def calibration_reference_points(self) -> List[Tuple[int, int]]:
+        """
+        Points around the registered coordinate used to recognise the page layout.
+        The passage text changes every test, so only a majority of them has to match.
+        """
+        x, y = self.coords[0]
+        return [(x, y), (x - 40, y), (x + 40, y), (x, y - 40), (x, y + 40)]
+
+    def wait_for_cached_page(self, timeout: float = 10.0) -> bool:
+        """
+        Load the cached coordinate and wait until its page is on screen.
+        Returns False if there is no usable cache entry.
+        """
+        entry = self.calibration.load()
+        if entry is None:
+            return False
+        
+        print(f"\nCached coordinate found, switch to the page (waiting up to {timeout:.0f} seconds)...")
+        if not self.calibration.wait_until_verified(entry, timeout=timeout, min_fraction=0.6):
+            print("Cached layout not found on screen - recalibrating")
+            return False
+        
+        self.coords = [tuple(c) for c in entry["coords"]]
+        if "atlas" in entry:
+            self.atlas = GlyphAtlas.from_json(entry["atlas"])
+            self.passage_area = tuple(entry["passage_area"])
+        print(f"Using cached coordinate: {self.coords[0]}")
+        return True
+
+    def save_calibration(self) -> None:
+        """
+        Save the registered coordinate for the next run.
+        """
+        self.calibration.save({"coords": [list(c) for c in self.coords]},
+                              self.calibration_reference_points())
+
+    def passage_search_area(self) -> Tuple[int, int, int, int]:
+        """
+        Screen area around the registered coordinate that holds the whole passage.
+        """
+        x, y = self.coords[0]
+        screen = self.calibration.sct.monitors[0]
+        return (max(x - 900, screen['left']), max(y - 250, screen['top']),
+                min(x + 900, screen['left'] + screen['width']), min(y + 450, screen['top'] + screen['height']))
+
+    def capture_passage_area(self, area: Tuple[int, int, int, int]):
+        x1, y1, x2, y2 = area
+        return self.capture.grab({'top': y1, 'left': x1, 'width': x2 - x1, 'height': y2 - y1})
+
+    def read_passage(self) -> Optional[str]:
+        """
+        Read the passage straight from the screen with the cached page font,
+        None when there is no font for this zoom yet or a glyph isn't recognised.
+        """
+        if self.atlas is None:
+            return None
+        warm_up()
+        start = time.perf_counter()
+        text = self.atlas.read(self.capture_passage_area(self.passage_area), self.coords[0][1] - self.passage_area[1])
+        if text is None:
+            print("Passage not readable from the screen, using the console and clipboard")
+            return None
+        print(f"Passage read from the screen in {(time.perf_counter() - start) * 1000:.1f}ms")
+        return text
+
+    def learn_passage_font(self, frame, area: Tuple[int, int, int, int], text: str) -> None:
+        """
+        Learn the page font from a capture of the passage whose text came from
+        the clipboard, and cache it when it reads the same capture back correctly.
+        """
+        atlas = GlyphAtlas()
+        anchor = self.coords[0][1] - area[1]
+        if not atlas.learn(frame, anchor, text) or atlas.read(frame, anchor) != " ".join(text.split()):
+            print("Could not learn the page font from this passage, the clipboard path stays in use")
+            return
+        self.atlas, self.passage_area = atlas, area
+        self.calibration.update({"atlas": atlas.to_json(), "passage_area": list(area)})
+        print("Page font learned, the next runs read the passage straight from the screen")
+
     def open_browser_console(self) -> None:
         """
         Open the browser console using Ctrl+Shift+K.
         """
         print("Opening browser console with Ctrl+Shift+K...")
         
-        # Virtual key codes
-        CTRL_KEY = 0x11
-        SHIFT_KEY = 0x10
         K_KEY = 0x4B
         
         # Press Ctrl+Shift+K
-        win32api.keybd_event(CTRL_KEY, 0, 0, 0)  # Ctrl down
-        win32api.keybd_event(SHIFT_KEY, 0, 0, 0)  # Shift down
+        self.input.key_down(VK_CONTROL)  # Ctrl down
+        self.input.key_down(VK_SHIFT)  # Shift down
         time.sleep(0.05)
-        win32api.keybd_event(K_KEY, 0, 0, 0)  # K down
-        time.sleep(0.05)
-        win32api.keybd_event(K_KEY, 0, win32con.KEYEVENTF_KEYUP, 0)  # K up
-        win32api.keybd_event(SHIFT_KEY, 0, win32con.KEYEVENTF_KEYUP, 0)  # Shift up
-        win32api.keybd_event(CTRL_KEY, 0, win32con.KEYEVENTF_KEYUP, 0)  # Ctrl up
+        self.input.key_press(K_KEY, hold=0.05)  # K
+        self.input.key_up(VK_SHIFT)  # Shift up
+        self.input.key_up(VK_CONTROL)  # Ctrl up
         
         time.sleep(0.3)  # Wait for console to open
 
@@ -49,73 +157,38 @@ class MouseController:
         """
         Ultra-fast paste using direct clipboard manipulation.
         """
-        # Save original clipboard content
-        try:
-            win32clipboard.OpenClipboard()
-            original_clipboard = win32clipboard.GetClipboardData(win32clipboard.CF_UNICODETEXT)
-            win32clipboard.CloseClipboard()
-        except:
-            original_clipboard = ""
-        
-        # Set new text to clipboard
+        # Save the original clipboard and set the text in one open, restored after the paste
         try:
-            win32clipboard.OpenClipboard()
-            win32clipboard.EmptyClipboard()
-            win32clipboard.SetClipboardText(text, win32clipboard.CF_UNICODETEXT)
-            win32clipboard.CloseClipboard()
-        except Exception as e:
+            with self.clipboard.holding(text):
+                # Ultra-fast Ctrl+V
+                V_KEY = 0x56
+                
+                self.input.key_down(VK_CONTROL)  # Ctrl down
+                self.input.key_press(V_KEY)  # V
+                self.input.key_up(VK_CONTROL)  # Ctrl up
+                
+                time.sleep(self.paste_settle)
+        except TimeoutError as e:
             print(f"Clipboard error: {e}")
-            return
-        
-        time.sleep(0.01)  # Minimal delay
-        
-        # Ultra-fast Ctrl+V
-        CTRL_KEY = 0x11
-        V_KEY = 0x56
-        
-        win32api.keybd_event(CTRL_KEY, 0, 0, 0)  # Ctrl down
-        win32api.keybd_event(V_KEY, 0, 0, 0)  # V down
-        win32api.keybd_event(V_KEY, 0, win32con.KEYEVENTF_KEYUP, 0)  # V up
-        win32api.keybd_event(CTRL_KEY, 0, win32con.KEYEVENTF_KEYUP, 0)  # Ctrl up
-        
-        time.sleep(0.01)
-        
-        # Restore original clipboard content
-        try:
-            win32clipboard.OpenClipboard()
-            win32clipboard.EmptyClipboard()
-            if original_clipboard:
-                win32clipboard.SetClipboardText(original_clipboard, win32clipboard.CF_UNICODETEXT)
-            win32clipboard.CloseClipboard()
-        except:
-            pass
 
     def paste_text(self, text: str) -> None:
         """
         Paste the provided text at the current cursor position.
         """
-        # Save original clipboard content
-        original_clipboard = pyperclip.paste()
-        
-        # Copy new text to clipboard
-        pyperclip.copy(text)
-        time.sleep(0.05)
-        
-        # Paste using Ctrl+V
-        self.press_ctrl_v()
-        time.sleep(0.05)
-        
-        # Restore original clipboard content
-        pyperclip.copy(original_clipboard)
+        # The text is on the clipboard as soon as the write returns, no need to wait before pasting
+        try:
+            with self.clipboard.holding(text):
+                # Paste using Ctrl+V
+                self.press_ctrl_v()
+                time.sleep(self.paste_settle)
+        except TimeoutError as e:
+            print(f"Clipboard error: {e}")
 
     def press_enter(self) -> None:
         """
         Simulate pressing the Enter key.
         """
-        ENTER_KEY = 0x0D
-        win32api.keybd_event(ENTER_KEY, 0, 0, 0)  # Enter down
-        time.sleep(0.02)
-        win32api.keybd_event(ENTER_KEY, 0, win32con.KEYEVENTF_KEYUP, 0)  # Enter up
+        self.input.key_press(VK_RETURN, hold=0.02)
         print("Pressed Enter")
         time.sleep(0.05)
 
@@ -123,20 +196,16 @@ class MouseController:
         """
         Simulate pressing Ctrl+V key combination.
         """
-        # Virtual key codes: VK_CONTROL (0x11), 'V' (0x56)
-        CTRL_KEY = 0x11
         V_KEY = 0x56
         
         # Press Ctrl key
-        win32api.keybd_event(CTRL_KEY, 0, 0, 0)  # Ctrl down
+        self.input.key_down(VK_CONTROL)  # Ctrl down
         
         # Press V key while holding Ctrl
-        win32api.keybd_event(V_KEY, 0, 0, 0)  # V down
-        time.sleep(0.02)
-        win32api.keybd_event(V_KEY, 0, win32con.KEYEVENTF_KEYUP, 0)  # V up
+        self.input.key_press(V_KEY, hold=0.02)
         
         # Release Ctrl key
-        win32api.keybd_event(CTRL_KEY, 0, win32con.KEYEVENTF_KEYUP, 0)  # Ctrl up
+        self.input.key_up(VK_CONTROL)  # Ctrl up
         
         print("Pressed Ctrl+V")
 
@@ -167,9 +236,7 @@ class MouseController:
         
         # Close console with f12 key
         F12_KEY = 0x7B
-        win32api.keybd_event(F12_KEY, 0, 0, 0)  # f12 down
-        time.sleep(0.02)
-        win32api.keybd_event(F12_KEY, 0, win32con.KEYEVENTF_KEYUP, 0)  # f12 up
+        self.input.key_press(F12_KEY, hold=0.02)  # f12
         print("Closed console with f12 key")
         time.sleep(0.3)
 
@@ -220,9 +287,7 @@ class MouseController:
         
         # Close console with f12 key
         F12_KEY = 0x7B
-        win32api.keybd_event(F12_KEY, 0, 0, 0)  # f12 down
-        time.sleep(0.02)
-        win32api.keybd_event(F12_KEY, 0, win32con.KEYEVENTF_KEYUP, 0)  # f12 up
+        self.input.key_press(F12_KEY, hold=0.02)  # f12
         print("Closed console with f12 key")
         time.sleep(0.3)
 
@@ -256,30 +321,23 @@ class MouseController:
         """
         Simulate a mouse click at the specified (x, y) position.
         """
-        win32api.SetCursorPos((x, y))
-        win32api.mouse_event(win32con.MOUSEEVENTF_LEFTDOWN, x, y, 0, 0)
-        time.sleep(0.02)
-        win32api.mouse_event(win32con.MOUSEEVENTF_LEFTUP, x, y, 0, 0)
+        self.input.click(x, y, hold=0.02)
         print(f"Clicked at ({x}, {y})")
 
     def press_ctrl_c(self) -> None:
         """
         Simulate pressing Ctrl+C key combination.
         """
-        # Virtual key codes: VK_CONTROL (0x11), 'C' (0x43)
-        CTRL_KEY = 0x11
         C_KEY = 0x43
         
         # Press Ctrl key
-        win32api.keybd_event(CTRL_KEY, 0, 0, 0)  # Ctrl down
+        self.input.key_down(VK_CONTROL)  # Ctrl down
         
         # Press C key while holding Ctrl
-        win32api.keybd_event(C_KEY, 0, 0, 0)  # C down
-        time.sleep(0.02)
-        win32api.keybd_event(C_KEY, 0, win32con.KEYEVENTF_KEYUP, 0)  # C up
+        self.input.key_press(C_KEY, hold=0.02)
         
         # Release Ctrl key
-        win32api.keybd_event(CTRL_KEY, 0, win32con.KEYEVENTF_KEYUP, 0)  # Ctrl up
+        self.input.key_up(VK_CONTROL)  # Ctrl up
         
         print("Pressed Ctrl+C")
 
@@ -287,11 +345,11 @@ class MouseController:
         """
         Perform a triple-click at the specified coordinates.
         """
-        win32api.SetCursorPos((x, y))
+        self.input.move(x, y)
         for _ in range(3):
-            win32api.mouse_event(win32con.MOUSEEVENTF_LEFTDOWN, x, y, 0, 0)
+            self.input.mouse_down(x, y)
             time.sleep(0.02)
-            win32api.mouse_event(win32con.MOUSEEVENTF_LEFTUP, x, y, 0, 0)
+            self.input.mouse_up(x, y)
             time.sleep(0.05)  # Delay between clicks
         print(f"Triple-clicked at ({x}, {y})")
 
@@ -360,16 +418,14 @@ class MouseController:
             vk_code, needs_shift = self.get_char_vk_and_shift(char)
             
             if needs_shift:
-                win32api.keybd_event(0x10, 0, 0, 0)  # Shift down
+                self.input.key_down(VK_SHIFT)  # Shift down
             
             # Press the key
-            win32api.keybd_event(vk_code, 0, 0, 0)  # Key down
-            if self.typing_delay > 0:
-                time.sleep(max(0.001, self.typing_delay * 0.5))  # Reduced internal delay
-            win32api.keybd_event(vk_code, 0, win32con.KEYEVENTF_KEYUP, 0)  # Key up
+            hold = max(0.001, self.typing_delay * 0.5) if self.typing_delay > 0 else 0.0  # Reduced internal delay
+            self.input.key_press(vk_code, hold=hold)
             
             if needs_shift:
-                win32api.keybd_event(0x10, 0, win32con.KEYEVENTF_KEYUP, 0)  # Shift up
+                self.input.key_up(VK_SHIFT)  # Shift up
             
             return True
         except Exception as e:
@@ -404,16 +460,19 @@ class MouseController:
         
         print("Finished typing!")
 
-    def execute_action_sequence(self) -> None:
+    def execute_action_sequence(self, metrics=None, text: Optional[str] = None) -> None:
         """
         Executes the defined sequence of actions:
-        1. Triple-click at the registered coordinate
+        1. Triple-click at the registered coordinate (steps 1-3 are skipped when
+           the passage text was already read from the screen)
         2. Press Ctrl+C (copy operation)
-        3. Print the copied text
+        3. Print the copied text (read as soon as the clipboard changes)
         4. Click at the same coordinate
         5. Wait 0.3 seconds
         6. Type out the copied text (ultra-fast or robust based on delay)
+        The text length, typing speed and clipboard waits are recorded to metrics (MetricsStore.MetricsSession).
         """
+        metrics = metrics or NullMetrics()
         if len(self.coords) < 1:
             print("Error: Need coordinate to perform actions.")
             return
@@ -421,23 +480,32 @@ class MouseController:
         # Get the coordinate
         x, y = self.coords[0]
         
-        # 1. Triple-click at the coordinate
-        print("\nPerforming triple-click operation...")
-        self.triple_click_at(x, y)
-        
-        # 2. Press Ctrl+C to copy the selected content
-        print("\nPressing Ctrl+C to copy selection...")
-        self.press_ctrl_c()
-        
-        # Small delay to ensure clipboard is updated
-        time.sleep(0.05)
-        
-        # 3. Inject typing script after copying
-        print("\nInjecting typing enabler script...")
-        self.inject_typing_script()
+        if text is None:
+            # The passage as shown, before the selection highlights it, to learn the page font from
+            area = self.passage_search_area()
+            frame = self.capture_passage_area(area)
+            
+            # 1. Triple-click at the coordinate
+            print("\nPerforming triple-click operation...")
+            self.triple_click_at(x, y)
+            
+            # 2. Press Ctrl+C to copy the selected content, returns once the clipboard has been written
+            print("\nPressing Ctrl+C to copy selection...")
+            copied_text = self.clipboard.copy(self.press_ctrl_c)
+            if copied_text is None:
+                print("Clipboard did not change after Ctrl+C, using what is on it")
+                copied_text = self.clipboard.read_text()
+            
+            # 3. Inject typing script after copying
+            print("\nInjecting typing enabler script...")
+            self.inject_typing_script()
+            
+            if copied_text and self.atlas is None:
+                self.learn_passage_font(frame, area, copied_text)
+        else:
+            copied_text = text
         
-        # 4. Get and print the copied text
-        copied_text = pyperclip.paste()
+        # 4. Print the copied text
         print(f"\nCopied text: '{copied_text}'")
         print(f"Text length: {len(copied_text)} characters")
         
@@ -457,10 +525,18 @@ class MouseController:
                 print("⚠️ ULTRA-FAST TYPING CURRENTLY UNDER CONSTRUCTION DUMBASS ⚠️")
             else:
                 # Regular mode: use robust character-by-character typing
+                start = time.perf_counter()
                 self.type_text(copied_text)
+                duration = time.perf_counter() - start
+                metrics.record("typed_chars", len(copied_text))
+                metrics.record("typing_s", duration)
+                metrics.record("chars_per_s", len(copied_text) / duration if duration > 0 else None)
         else:
             print("No text to type (clipboard empty)")
         
+        self.clipboard.report()
+        for what, seconds, ok in self.clipboard.waits:
+            metrics.record("clipboard_wait_ms", seconds * 1000, wait=what, ok=ok)
         print("\nAction sequence completed! Program ending.")
 
 
@@ -500,20 +576,29 @@ def main() -> None:
     print("=========================================")
     input("Press Enter to begin...")
     
-    # Wait for user to switch to the target page
-    controller.wait_for_page_switch(5)
+    # Wait for user to switch to the target page (no countdown if the cached layout shows up)
+    cached = controller.wait_for_cached_page()
+    if not cached:
+        controller.wait_for_page_switch(5)
     
-    # Run initial scripts to enable text selection and copying
-    controller.run_console_scripts()
+    # With the page font known for this zoom the passage is read off the screen, no console needed
+    text = controller.read_passage() if cached else None
     
-    print("\nNow please click on the text you want to select and copy.")
-    controller.collect_coordinates()
+    if text is None:
+        # Run initial scripts to enable text selection and copying
+        controller.run_console_scripts()
     
-    print("\nStarting action sequence in 3 seconds...")
-    print("Keep your mouse still during the process")
-    time.sleep(3)
+    if not cached:
+        print("\nNow please click on the text you want to select and copy.")
+        controller.collect_coordinates()
+        controller.save_calibration()
+        
+        print("\nStarting action sequence in 3 seconds...")
+        print("Keep your mouse still during the process")
+        time.sleep(3)
     
-    controller.execute_action_sequence()
+    with MetricsSession("TypingTest", params={"typing_delay": typing_delay, "screen_read": text is not None}) as metrics:
+        controller.execute_action_sequence(metrics=metrics, text=text)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,222 @@
+import mss
+import numpy as np
+import time
+from typing import Optional, Tuple
+from CalibrationCache import CalibrationCache
+from GameLocator import find_buttons, locate_scan_area, print_scan_area, reference_points, scan_region
+from CaptureMultiplexer import MssCapture
+from InputBackend import DeferredInput
+from DetectionKernels import white_mask, warm_up
+from MetricsStore import MetricsSession, NullMetrics
+from GlyphMatcher import split_columns, tallest_text_line
+from BitmapHash import MultiIndexHashSet, bitmap_hash
+from LatencyStats import LoopStats
+
+
+class VerbalMemory:
+    def __init__(self, capture=None, input_backend=None, min_text_height: int = 20, max_distance: int = 24) -> None:
+        self.coords = []  # List of (x, y) coordinates for corners
+        self.sct = mss.mss() if capture is None else None  # Locator and cache open their own when None
+        self.capture = capture if capture is not None else MssCapture(self.sct)  # Anything with grab(region)
+        self.input = input_backend if input_backend is not None else DeferredInput()  # Mouse and keyboard events
+        self.scan_area = None  # Will store (x1, y1, x2, y2)
+        self.min_text_height = min_text_height  # The word is the big text, the lives/score line is smaller
+        self.seen = MultiIndexHashSet(max_distance=max_distance)  # Hashes of every word shown so far
+        self.answers = {"seen": 0, "new": 0}
+        self.wrong_answers = 0  # Answers that cost a life
+        self.stats = LoopStats("Word loop")  # Page polls, capture to answer and answer clicks
+
+    def collect_coordinates(self, timeout: float = 10.0) -> list:
+        """Locate the play area from a full-screen capture, registering corners by hand if that fails."""
+        self.coords, self.scan_area = locate_scan_area(self.sct, timeout)
+        return self.coords
+
+    def scan_area_reference_points(self) -> list:
+        """Points just inside the scan area corners, used to check a cached layout."""
+        return reference_points(self.scan_area)
+
+    def load_or_collect_coordinates(self) -> list:
+        """Reuse the cached scan area if it still matches the screen, otherwise locate it again."""
+        cache = CalibrationCache("VerbalMemory", self.sct)
+        entry = cache.load_verified()
+        if entry is not None:
+            self.coords = [tuple(c) for c in entry["coords"]]
+            self.scan_area = tuple(entry["scan_area"])
+            print_scan_area(self.scan_area)
+            return self.coords
+
+        input("Press Enter, then switch to the Verbal Memory page...")
+        self.collect_coordinates()
+        cache.save({"coords": [list(c) for c in self.coords], "scan_area": list(self.scan_area)},
+                   self.scan_area_reference_points())
+        return self.coords
+
+    def capture_region(self) -> dict:
+        """Screen region this solver reads, for registering with a shared capture."""
+        return scan_region(self.scan_area)
+
+    def capture_scan_area(self) -> Optional[np.ndarray]:
+        """Capture the entire scan area as a single screenshot."""
+        if not self.scan_area:
+            return None
+
+        return self.capture.grab(self.capture_region())
+
+    def word_hash(self, img: np.ndarray) -> Optional[int]:
+        """
+        Perceptual hash of the word in a frame: the tallest line of white text,
+        binarised and normalised onto the hash grid. No text recognition.
+        """
+        mask = white_mask(img, 240)
+        line = tallest_text_line(mask, self.min_text_height)
+        if line is None:
+            return None
+        return bitmap_hash(mask[line[0]:line[1] + 1])
+
+    def lives_bitmap(self, img: np.ndarray) -> Optional[np.ndarray]:
+        """
+        Ink of the lives half of the "Lives | 3   Score | 12" line above the word
+        (the glyphs left of the line's widest gap), cropped so the line moving
+        as the score gets longer doesn't count as a change.
+        """
+        mask = white_mask(img, 240)
+        word = tallest_text_line(mask, self.min_text_height)
+        if word is None:
+            return None
+        ink_rows = np.flatnonzero(mask[:word[0]].any(axis=1))
+        if ink_rows.size == 0:
+            return None
+        gaps = np.flatnonzero(np.diff(ink_rows) > 1)
+        top = ink_rows[gaps[-1] + 1] if gaps.size else ink_rows[0]  # The text line right above the word
+        line = mask[top:ink_rows[-1] + 1]
+        boxes = split_columns(line)
+        if len(boxes) < 2:
+            return None
+        split = int(np.argmax(boxes[1:, 0] - boxes[:-1, 2]))
+        lives = line[:, boxes[0, 0]:boxes[split, 2] + 1]
+        rows = np.flatnonzero(lives.any(axis=1))
+        return lives[rows[0]:rows[-1] + 1]
+
+    def lost_life(self, before: np.ndarray, after: np.ndarray) -> bool:
+        """Whether the lives count changed between two frames, i.e. the answer in between was wrong."""
+        lives_before, lives_after = self.lives_bitmap(before), self.lives_bitmap(after)
+        if lives_before is None or lives_after is None:
+            return False
+        return lives_before.shape != lives_after.shape or not np.array_equal(lives_before, lives_after)
+
+    def answer(self, word: int) -> str:
+        """'seen' if the word (or a near-identical bitmap) was shown before, otherwise remember it and answer 'new'."""
+        return "seen" if self.seen.check_and_add(word) else "new"
+
+    def click_at(self, x: int, y: int) -> None:
+        """Simulate a mouse click at the specified (x, y) position."""
+        self.input.click(x, y)
+
+    def wait_for_word(self, timeout: float = 10.0) -> Optional[Tuple[np.ndarray, list]]:
+        """A frame showing a word with the SEEN and NEW buttons under it, and the two buttons."""
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            img = self.capture_scan_area()
+            buttons = find_buttons(img)
+            self.stats["frame"].record_seconds(time.perf_counter() - start)
+            if len(buttons) == 2:
+                return img, buttons
+            time.sleep(0.02)
+        return None
+
+    def wait_for_change(self, previous: np.ndarray, timeout: float = 1.0) -> Optional[np.ndarray]:
+        """
+        Wait until the white text changes after an answer and return that frame
+        (None on timeout). The score or lives line always changes, so this also
+        works when the same word comes twice.
+        """
+        before = white_mask(previous, 240)
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            img = self.capture_scan_area()
+            if not np.array_equal(white_mask(img, 240), before):
+                return img
+            time.sleep(0.005)
+        return None
+
+    def record_answer(self, level: int, answer: str, wrong: bool, metrics) -> None:
+        metrics.record("wrong_answers", int(wrong), level=level, answer=answer)
+        if wrong:
+            self.wrong_answers += 1
+            print(f"Word {level} was answered wrong ({answer}), a life lost")
+
+    def run(self, max_words: int = 1000, metrics=None) -> None:
+        """
+        Answer words until max_words, the game ends, or Ctrl+C. Start the test by hand first.
+        The hash + lookup time of every word and whether the answer cost a life are recorded to
+        metrics (MetricsStore.MetricsSession), poll, lookup and click percentiles are printed every few seconds.
+        """
+        metrics = metrics or NullMetrics()
+        print("Press Ctrl+C to exit.")
+        warm_up()  # Compile the detection kernels before the first word
+        x1, y1, _, _ = self.scan_area
+        pending = None  # (word number, answer, lost a life) of the last answer, scored once the next word is up
+        try:
+            while sum(self.answers.values()) < max_words:
+                found = self.wait_for_word()
+                if found is None:
+                    if pending is not None:  # The game only ends on a wrong answer with the last life
+                        self.record_answer(*pending[:2], True, metrics)
+                    print("No word on screen - stopping")
+                    break
+                if pending is not None:
+                    self.record_answer(*pending, metrics)
+                    pending = None
+                img, (seen_button, new_button) = found
+                start = time.perf_counter()
+                word = self.word_hash(img)
+                if word is None:
+                    continue
+                answer = self.answer(word)
+                answered = time.perf_counter()
+                self.stats["detect"].record_seconds(answered - start)
+                self.answers[answer] += 1
+                metrics.record("lookup_us", (answered - start) * 1e6, level=sum(self.answers.values()),
+                               answer=answer)
+
+                bx, by = seen_button if answer == "seen" else new_button
+                self.click_at(x1 + bx, y1 + by)
+                self.stats["dispatch"].record_seconds(time.perf_counter() - answered)
+                self.stats.tick()
+                after = self.wait_for_change(img)
+                if after is None:
+                    print("The page did not change after the answer - stopping")
+                    break
+                pending = (sum(self.answers.values()), answer, self.lost_life(img, after))
+        except KeyboardInterrupt:
+            print("\nStopped.")
+
+        lookup = self.stats["detect"]
+        if lookup.count:
+            print(f"Answered {sum(self.answers.values())} words ({self.answers['seen']} seen, {self.answers['new']} new, "
+                  f"{self.wrong_answers} wrong), "
+                  f"{len(self.seen)} distinct, hash + lookup mean {lookup.mean / 1e3:.0f}us, max {lookup.max / 1e3:.0f}us")
+            self.stats.report()
+            self.stats.save(metrics)
+
+def main() -> None:
+    print("===== Verbal Memory Solver =====")
+    print("Remembers every word as a perceptual hash of its pixels (no text recognition) and answers SEEN / NEW.")
+    print("Start the test on the page yourself, the solver takes over from the first word.")
+    print("================================")
+
+    solver = VerbalMemory()
+    solver.load_or_collect_coordinates()
+    try:
+        max_words = int(input("How many words to answer? (default 1000): ").strip() or "1000")
+    except ValueError:
+        max_words = 1000
+
+    print("\nWaiting for the first word...")
+    with MetricsSession("VerbalMemory", params={"max_words": max_words,
+                                                 "max_distance": solver.seen.max_distance}) as metrics:
+        solver.run(max_words=max_words, metrics=metrics)
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,86 @@
 import mss
 import numpy as np
-import win32api, win32con
 import time
 from collections import deque
+from CalibrationCache import CalibrationCache
+from GameLocator import GameLocator
+from CaptureMultiplexer import MssCapture
+from InputBackend import DeferredInput
+from DetectionKernels import count_color_runs, off_color_mask, white_mask
+from MetricsStore import MetricsSession, NullMetrics
+from LatencyStats import LoopStats
+
+try:
+    import win32api
+except ImportError:
+    win32api = None  # Detection and clicking through input_backend still work without it (benchmarks)
+
+SIGNATURE_SIZES = range(2, 13)  # Grid sizes whose gap lines the level signature samples
+
+class GridGeometry:
+    """
+    Everything about one grid size that stays the same while it's on screen:
+    cube centres (screen coordinates) and their row / column indices into a
+    capture of the grid region. The indices are shaped as one image row, so
+    frame[rows, cols] is a 1 x cubes image the 2-D kernels take as is, and a
+    whole scan is one grab and one gather.
+    """
+
+    def __init__(self, size: int, region: dict) -> None:
+        self.size = size
+        cell_width = (region['width'] - 1) / size
+        cell_height = (region['height'] - 1) / size
+        index = np.arange(size)
+        xs = (region['left'] + index * cell_width + cell_width / 2).astype(np.int64)
+        ys = (region['top'] + index * cell_height + cell_height / 2).astype(np.int64)
+        self.centers = [(int(x), int(y)) for y in ys for x in xs]  # Row by row, like the cube indices
+        self.rows = np.repeat(ys - region['top'], size)[None]
+        self.cols = np.tile(xs - region['left'], size)[None]
 
 class CubeGridCounter:
-    def __init__(self) -> None:
+    def __init__(self, capture=None, input_backend=None) -> None:
         self.coords = []  # List of 2 corner coordinates
-        self.sct = mss.mss()
+        self.sct = mss.mss() if capture is None else None  # Locator and cache open their own when None
+        self.capture = capture if capture is not None else MssCapture(self.sct)  # Anything with grab(region)
+        self.input = input_backend if input_backend is not None else DeferredInput()  # Mouse and keyboard events
         self.target_color = (0x2b, 0x87, 0xd1)  # RGB values for #2b87d1 (gap color)
         self.default_cube_color = (0x25, 0x73, 0xc1)  # RGB values for #2573c1 (default cube)
         self.clicked_cube_color = (0x15, 0x43, 0x68)  # RGB values for #154368 (clicked/wrong cube)
         self.tolerance = 5  # Increased tolerance for color matching
+        self.scan_x_offset = 0.05  # Scan line position, as a fraction of the grid width from the left edge
+        self.scan_margin = 0.1  # Part of the grid height left out of the scan line at the top and bottom
         self.grid_size = 0  # Store calculated grid size
         self.cube_centers = []  # Store calculated cube centers
+        self.geometry = None  # GridGeometry of the current grid size
+        self.geometries = {}  # (size, region) -> GridGeometry, built once per grid size
+        self.grid_signature = None  # Gap line pixels when the grid size was last detected
+        self.probes = {}  # region -> signature probe indices
+        self.signature_checks = 0
+        self.redetections = 0  # Full grid detections the signature asked for
+        self.wrong_cubes = 0  # Clicked cubes that showed the wrong colour afterwards
         
         # White detection variables
         self.white_cubes = set()  # Use set to avoid duplicates
         self.last_clicked_pattern = set()  # Store the last pattern of white cubes that were clicked
         self.consecutive_same_grids = 0  # Track consecutive same grid detections
+        self.metrics = NullMetrics()  # Set by run_detection_loop
+        self.stats = LoopStats("Cube loop")  # Capture and scan cycles, verifying scans, click batches
+
+    def collect_coordinates(self, timeout: float = 10.0) -> list:
+        """
+        Locate the cube grid from a full-screen capture.
+        Falls back to registering the corners by hand if it cannot be found.
+        """
+        locator = GameLocator(self.sct)
+        if locator.wait_for_play_area(timeout=timeout) is None or locator.grid_box() is None:
+            print("Could not locate the cube grid automatically.")
+            return self.register_corners()
+        
+        self.coords = locator.grid_box()
+        print(f"Cube grid located: {self.coords[0]} to {self.coords[1]}")
+        return self.coords
 
-    def collect_coordinates(self) -> list:
+    def register_corners(self) -> list:
         """
         Collect 2 corner coordinates using mouse position upon 'C' key press.
         """
@@ -42,10 +102,31 @@ class CubeGridCounter:
         print("Both corners registered!")
         return self.coords
 
-    def take_screenshot(self) -> np.ndarray:
+    def load_or_collect_coordinates(self) -> list:
         """
-        Take a fresh screenshot of the defined region.
-        Returns the screenshot as numpy array.
+        Reuse the cached grid corners if they still match the screen,
+        otherwise register them by hand and save them for the next run.
+        """
+        cache = CalibrationCache("VisualMemory", self.sct)
+        entry = cache.load_verified()
+        if entry is not None:
+            self.coords = [tuple(c) for c in entry["coords"]]
+            return self.coords
+
+        input("Press Enter, then switch to the Visual Memory page...")
+        self.collect_coordinates()
+        # Reference pixels sit just outside the grid, on the page background
+        x1, y1 = self.coords[0]
+        x2, y2 = self.coords[1]
+        min_x, max_x = min(x1, x2) - 4, max(x1, x2) + 4
+        min_y, max_y = min(y1, y2) - 4, max(y1, y2) + 4
+        cache.save({"coords": self.coords},
+                   [(min_x, min_y), (max_x, min_y), (min_x, max_y), (max_x, max_y)])
+        return self.coords
+
+    def capture_region(self) -> dict:
+        """
+        Screen region of the grid, for registering with a shared capture.
         """
         x1, y1 = self.coords[0]
         x2, y2 = self.coords[1]
@@ -54,73 +135,23 @@ class CubeGridCounter:
         min_x, max_x = min(x1, x2), max(x1, x2)
         min_y, max_y = min(y1, y2), max(y1, y2)
         
-        # Define the region to capture
-        region = {
+        # Include the far edge so every cube center and scan line pixel is inside
+        return {
             'top': min_y,
             'left': min_x,
-            'width': max_x - min_x,
-            'height': max_y - min_y
+            'width': max_x - min_x + 1,
+            'height': max_y - min_y + 1
         }
-        
-        screenshot = self.sct.grab(region)
-        screenshot_array = np.array(screenshot)
-        self.screenshot_offset = (min_x, min_y)  # Store offset for coordinate conversion
-        return screenshot_array
-
-    def is_color_match(self, r: int, g: int, b: int, target_color: tuple) -> bool:
-        """
-        Check if RGB values match target color within tolerance.
-        """
-        target_r, target_g, target_b = target_color
-        return (abs(int(r) - target_r) <= self.tolerance and 
-                abs(int(g) - target_g) <= self.tolerance and 
-                abs(int(b) - target_b) <= self.tolerance)
-
-    def get_pixel_color_from_screenshot(self, screenshot: np.ndarray, x: int, y: int) -> tuple:
-        """
-        Get the RGB color of pixel at global coordinates (x, y) from screenshot.
-        """
-        # Convert global coordinates to screenshot local coordinates
-        local_x = x - self.screenshot_offset[0]
-        local_y = y - self.screenshot_offset[1]
-        
-        # Check bounds
-        if (local_x < 0 or local_x >= screenshot.shape[1] or 
-            local_y < 0 or local_y >= screenshot.shape[0]):
-            raise IndexError(f"Coordinates ({x}, {y}) -> ({local_x}, {local_y}) out of screenshot bounds")
-        
-        # Extract RGB values (screenshot is in BGRA format)
-        b, g, r = screenshot[local_y, local_x, 0], screenshot[local_y, local_x, 1], screenshot[local_y, local_x, 2]
-        return (r, g, b)
 
-    def is_pixel_white(self, x: int, y: int, threshold: int = 240) -> bool:
-        """
-        Check if pixel at (x, y) is white using fresh screenshot.
-        """
-        try:
-            region = {'top': y, 'left': x, 'width': 1, 'height': 1}
-            screenshot = self.sct.grab(region)
-            img = np.array(screenshot)
-            b, g, r = img[0, 0, 0], img[0, 0, 1], img[0, 0, 2]
-            return all(channel >= threshold for channel in (r, g, b))
-        except:
-            return False
-
-    def is_cube_clickable(self, x: int, y: int) -> bool:
+    def take_screenshot(self) -> np.ndarray:
         """
-        Check if cube at position is safe to click (not already clicked/wrong).
-        Returns False if cube is the clicked color (#154368).
+        Take a fresh screenshot of the defined region.
+        Returns the screenshot as numpy array.
         """
-        try:
-            region = {'top': y, 'left': x, 'width': 1, 'height': 1}
-            screenshot = self.sct.grab(region)
-            img = np.array(screenshot)
-            b, g, r = img[0, 0, 0], img[0, 0, 1], img[0, 0, 2]
-            
-            # Check if it's the clicked/wrong cube color
-            return not self.is_color_match(r, g, b, self.clicked_cube_color)
-        except:
-            return False
+        region = self.capture_region()
+        screenshot_array = self.capture.grab(region)
+        self.screenshot_offset = (region['left'], region['top'])  # Store offset for coordinate conversion
+        return screenshot_array
 
     def calculate_scan_line(self) -> tuple:
         """
@@ -135,48 +166,83 @@ class CubeGridCounter:
         width = max_x - min_x
         height = max_y - min_y
         
-        # 5% offset to the right from left edge
-        x_position = min_x + int(width * 0.05)
+        # Offset to the right from left edge (5% by default)
+        x_position = min_x + int(width * self.scan_x_offset)
         
-        # Reduce height by ~10% on each side to avoid edge artifacts
-        height_reduction = int(height * 0.1)
+        # Reduce height on each side to avoid edge artifacts (10% by default)
+        height_reduction = int(height * self.scan_margin)
         y_start = min_y + height_reduction
         y_end = max_y - height_reduction
         
         return x_position, y_start, y_end
 
-    def detect_grid_size(self) -> int:
+    def detect_grid_size(self, screenshot: np.ndarray = None) -> int:
         """
-        Detect current grid size by counting gaps.
+        Detect current grid size by counting gaps (in screenshot, a fresh one when None).
         Returns grid size (gaps + 1) or 0 if detection failed.
         """
-        screenshot = self.take_screenshot()
+        if screenshot is None:
+            screenshot = self.take_screenshot()
         x_pos, y_start, y_end = self.calculate_scan_line()
         
-        gap_count = 0
-        in_gap = False
-        
-        for y in range(y_start, y_end + 1):
-            try:
-                r, g, b = self.get_pixel_color_from_screenshot(screenshot, x_pos, y)
-                is_gap = self.is_color_match(r, g, b, self.target_color)
-                
-                if is_gap and not in_gap:
-                    gap_count += 1
-                    in_gap = True
-                elif not is_gap and in_gap:
-                    in_gap = False
-            except:
-                continue
+        # Scan line as a column of the screenshot, clipped to its bounds
+        local_x = x_pos - self.screenshot_offset[0]
+        if not 0 <= local_x < screenshot.shape[1]:
+            return 0
+        top = max(y_start - self.screenshot_offset[1], 0)
+        bottom = min(y_end - self.screenshot_offset[1] + 1, screenshot.shape[0])
         
+        gap_count = count_color_runs(screenshot[top:bottom, local_x], self.target_color, self.tolerance)
         return gap_count + 1 if gap_count > 0 else 0
 
-    def force_grid_update(self) -> bool:
+    def signature_probes(self) -> tuple:
+        """
+        (rows, column) in the grid capture of the scan line pixels on the gap
+        lines of every grid size in SIGNATURE_SIZES. Whatever size is showing,
+        its own gap lines read as gap colour and the rest as cubes, so a level
+        change flips some of them.
+        """
+        region = self.capture_region()
+        key = (region['left'], region['top'], region['width'], region['height'])
+        if key not in self.probes:
+            x_pos, y_start, y_end = self.calculate_scan_line()
+            height = region['height'] - 1
+            rows = {round(height * k / size) for size in SIGNATURE_SIZES for k in range(1, size)}
+            rows = [row for row in sorted(rows) if y_start <= region['top'] + row <= y_end]
+            self.probes[key] = (np.array(rows)[None], np.full((1, len(rows)), x_pos - region['left']))
+        return self.probes[key]
+
+    def gap_signature(self, screenshot: np.ndarray) -> bytes:
+        """
+        Which signature probes are gap coloured, packed into bytes.
+        """
+        rows, cols = self.signature_probes()
+        gaps = ~off_color_mask(screenshot[rows, cols], self.target_color, self.tolerance)
+        return np.packbits(gaps).tobytes()
+
+    def check_grid(self, screenshot: np.ndarray) -> bool:
+        """
+        Re-detect the grid size only when the gap signature of screenshot
+        differs from the one the current size was detected on.
+        Returns True if grid was updated.
+        """
+        self.signature_checks += 1
+        if self.gap_signature(screenshot) == self.grid_signature:
+            self.consecutive_same_grids += 1
+            return False
+        self.redetections += 1
+        return self.force_grid_update(screenshot)
+
+    def force_grid_update(self, screenshot: np.ndarray = None) -> bool:
         """
         Force detection of current grid size and update cube centers.
         Returns True if grid was updated, False otherwise.
         """
-        new_grid_size = self.detect_grid_size()
+        if screenshot is None:
+            screenshot = self.take_screenshot()
+        new_grid_size = self.detect_grid_size(screenshot)
+        # Also when detection failed (mid transition), the next frame then differs and is detected again
+        self.grid_signature = self.gap_signature(screenshot)
         
         if new_grid_size > 0 and new_grid_size != self.grid_size:
             print(f"Grid size changed: {self.grid_size}x{self.grid_size} -> {new_grid_size}x{new_grid_size}")
@@ -192,49 +258,48 @@ class CubeGridCounter:
 
     def calculate_cube_centers(self) -> list:
         """
-        Calculate center coordinates of all cubes in current grid.
+        Calculate center coordinates of all cubes in current grid
+        (the geometry of each grid size is only built the first time it shows up).
         """
         if self.grid_size == 0:
             return []
         
-        x1, y1 = self.coords[0]
-        x2, y2 = self.coords[1]
-        
-        min_x, max_x = min(x1, x2), max(x1, x2)
-        min_y, max_y = min(y1, y2), max(y1, y2)
-        
-        total_width = max_x - min_x
-        total_height = max_y - min_y
-        
-        cell_width = total_width / self.grid_size
-        cell_height = total_height / self.grid_size
-        
-        centers = []
-        for row in range(self.grid_size):
-            for col in range(self.grid_size):
-                center_x = min_x + (col * cell_width) + (cell_width / 2)
-                center_y = min_y + (row * cell_height) + (cell_height / 2)
-                centers.append((int(center_x), int(center_y)))
-        
-        self.cube_centers = centers
-        print(f"Updated cube centers for {self.grid_size}x{self.grid_size} grid ({len(centers)} cubes)")
-        return centers
+        region = self.capture_region()
+        key = (self.grid_size, region['left'], region['top'], region['width'], region['height'])
+        if key not in self.geometries:
+            self.geometries[key] = GridGeometry(self.grid_size, region)
+        self.geometry = self.geometries[key]
+        self.cube_centers = self.geometry.centers
+        print(f"Updated cube centers for {self.grid_size}x{self.grid_size} grid ({len(self.cube_centers)} cubes)")
+        return self.cube_centers
 
-    def scan_for_white_cubes(self) -> set:
+    def clickable_mask(self, screenshot: np.ndarray) -> np.ndarray:
         """
-        Scan all cube centers for white pixels.
+        Per cube of the current grid, whether its centre isn't the clicked/wrong colour.
+        """
+        pixels = screenshot[self.geometry.rows, self.geometry.cols]
+        return off_color_mask(pixels, self.clicked_cube_color, self.tolerance)[0]
+
+    def count_wrong_cubes(self, screenshot: np.ndarray) -> int:
+        """
+        Cubes of the current grid showing the clicked/wrong colour: a cube that
+        wasn't in the pattern turns that colour when it is clicked.
+        """
+        return int(np.count_nonzero(~self.clickable_mask(screenshot)))
+
+    def scan_for_white_cubes(self, screenshot: np.ndarray = None) -> set:
+        """
+        Scan all cube centers for white pixels (in screenshot, a fresh one when None).
         Returns set of cube indices that are white.
         """
-        white_indices = set()
-        
         if not self.cube_centers:
-            return white_indices
+            return set()
+        if screenshot is None:
+            screenshot = self.take_screenshot()
         
-        for i, (x, y) in enumerate(self.cube_centers):
-            if self.is_pixel_white(x, y) and self.is_cube_clickable(x, y):
-                white_indices.add(i)
-        
-        return white_indices
+        pixels = screenshot[self.geometry.rows, self.geometry.cols]
+        white = white_mask(pixels)[0] & off_color_mask(pixels, self.clicked_cube_color, self.tolerance)[0]
+        return set(np.flatnonzero(white).tolist())
 
     def click_white_cubes(self) -> bool:
         """
@@ -253,12 +318,12 @@ class CubeGridCounter:
             return False
         
         # Validate all cubes are still clickable before clicking any
+        clickable = self.clickable_mask(self.take_screenshot())
         valid_cubes = []
         for cube_index in self.white_cubes:
-            if cube_index < len(self.cube_centers):
+            if cube_index < len(self.cube_centers) and clickable[cube_index]:
                 x, y = self.cube_centers[cube_index]
-                if self.is_cube_clickable(x, y):
-                    valid_cubes.append((cube_index, x, y))
+                valid_cubes.append((cube_index, x, y))
         
         if not valid_cubes:
             print("No valid white cubes to click")
@@ -266,21 +331,26 @@ class CubeGridCounter:
         
         print(f"Clicking {len(valid_cubes)} white cubes...")
         
-        # Click all valid cubes rapidly
-        for cube_index, x, y in valid_cubes:
-            win32api.SetCursorPos((x, y))
-            win32api.mouse_event(win32con.MOUSEEVENTF_LEFTDOWN, x, y, 0, 0)
-            win32api.mouse_event(win32con.MOUSEEVENTF_LEFTUP, x, y, 0, 0)
+        # Click all valid cubes rapidly, sent together where the backend can batch
+        start = time.perf_counter_ns()
+        with self.input.batch():
+            for cube_index, x, y in valid_cubes:
+                self.input.click(x, y)
+        self.stats["dispatch"].record(time.perf_counter_ns() - start)
         
         # Store clicked pattern
         self.last_clicked_pattern = current_pattern.copy()
+        self.metrics.record("cubes_clicked", len(valid_cubes), level=self.grid_size)
         print(f"Successfully clicked {len(valid_cubes)} cubes")
         return True
 
-    def run_detection_loop(self) -> None:
+    def run_detection_loop(self, metrics=None) -> None:
         """
         Main detection loop with improved grid change detection.
+        Every clicked pattern, the scan that confirmed it and the cubes it got wrong are recorded to metrics
+        (MetricsStore.MetricsSession), cycle, scan and click percentiles are printed every few seconds.
         """
+        self.metrics = metrics or NullMetrics()
         print("Starting white cube detection with improved grid tracking...")
         
         # Initial grid detection
@@ -291,16 +361,17 @@ class CubeGridCounter:
                 print("Could not detect grid - exiting")
                 return
         
-        no_whites_count = 0
-        
         try:
             while True:
-                # Check for grid changes more frequently
-                if no_whites_count % 10 == 0:  # Every 10 cycles when no whites found
-                    self.force_grid_update()
+                # One capture per cycle, read by both the level signature check and the cube scan
+                start = time.perf_counter()
+                screenshot = self.take_screenshot()
+                self.check_grid(screenshot)
                 
                 # Scan for white cubes
-                self.white_cubes = self.scan_for_white_cubes()
+                self.white_cubes = self.scan_for_white_cubes(screenshot)
+                self.stats["frame"].record_seconds(time.perf_counter() - start)
+                self.stats.tick()
                 
                 if self.white_cubes:
                     print(f"Found {len(self.white_cubes)} white cubes: {sorted(self.white_cubes)}")
@@ -309,7 +380,13 @@ class CubeGridCounter:
                     time.sleep(0.05)
                     
                     # Re-verify white cubes before clicking
-                    verified_whites = self.scan_for_white_cubes()
+                    start = time.perf_counter()
+                    screenshot = self.take_screenshot()
+                    self.check_grid(screenshot)
+                    verified_whites = self.scan_for_white_cubes(screenshot)
+                    scan_time = time.perf_counter() - start
+                    self.stats["detect"].record_seconds(scan_time)
+                    self.metrics.record("scan_ms", scan_time * 1000, level=self.grid_size)
                     self.white_cubes = verified_whites
                     
                     time.sleep(2)
@@ -317,20 +394,27 @@ class CubeGridCounter:
                     if self.white_cubes:
                         clicked = self.click_white_cubes()
                         if clicked:
-                            # Force grid check after successful click
+                            # Misclicks show on the grid that was clicked, then the grid check
                             time.sleep(0.1)
-                            self.force_grid_update()
-                            no_whites_count = 0
+                            screenshot = self.take_screenshot()
+                            wrong = self.count_wrong_cubes(screenshot)
+                            self.wrong_cubes += wrong
+                            self.metrics.record("wrong_cubes", wrong, level=self.grid_size)
+                            if wrong:
+                                print(f"{wrong} clicked cubes were wrong")
+                            self.check_grid(screenshot)
                     
                     self.white_cubes.clear()
-                else:
-                    no_whites_count += 1
                 
                 # Short sleep to prevent excessive CPU usage
                 time.sleep(0.02)  # 50 FPS checking
                 
         except KeyboardInterrupt:
             print("\nDetection stopped by user.")
+            print(f"Grid re-detected {self.redetections} times over {self.signature_checks} signature checks, "
+                  f"{self.wrong_cubes} wrong cubes clicked")
+            self.stats.report()
+            self.stats.save(self.metrics)
 
 def main() -> None:
     counter = CubeGridCounter()
@@ -342,11 +426,12 @@ def main() -> None:
     print("- Removed unused functions")
     print("=====================================")
     
-    counter.collect_coordinates()
+    counter.load_or_collect_coordinates()
     print(f"\nRegistered area: {counter.coords[0]} to {counter.coords[1]}")
     print("\nStarting improved detection mode...")
     
-    counter.run_detection_loop()
+    with MetricsSession("VisualMemory") as metrics:
+        counter.run_detection_loop(metrics=metrics)
     print("Program complete!")
 
 if __name__ == "__main__":
@@ -0,0 +1,157 @@
+import ctypes
+import ctypes.util
+from typing import Optional, Tuple
+
+# Minimal ctypes bindings for the bits of Xlib and XTest the solvers use on Linux.
+# The structure layouts and constants match the C headers (checked with gcc: XImage,
+# the XEvent size, keysyms). XTestInput checks the server takes its events when it
+# is opened and PixelProbe only picks the XGetImage probe when it reads the same
+# pixels as mss.
+
+ALL_PLANES = ctypes.c_ulong(-1).value  # AllPlanes is ~0UL
+Z_PIXMAP = 2
+BUTTON1_MASK = 1 << 8
+
+
+class XImage(ctypes.Structure):
+    _fields_ = [
+        ('width', ctypes.c_int),
+        ('height', ctypes.c_int),
+        ('xoffset', ctypes.c_int),
+        ('format', ctypes.c_int),
+        ('data', ctypes.POINTER(ctypes.c_ubyte)),
+        ('byte_order', ctypes.c_int),
+        ('bitmap_unit', ctypes.c_int),
+        ('bitmap_bit_order', ctypes.c_int),
+        ('bitmap_pad', ctypes.c_int),
+        ('depth', ctypes.c_int),
+        ('bytes_per_line', ctypes.c_int),
+        ('bits_per_pixel', ctypes.c_int),
+        ('red_mask', ctypes.c_ulong),
+        ('green_mask', ctypes.c_ulong),
+        ('blue_mask', ctypes.c_ulong),
+    ]
+
+
+class XEvent(ctypes.Structure):
+    # XEvent is a union padded to 24 longs, only the type is read directly
+    _fields_ = [('type', ctypes.c_int), ('pad', ctypes.c_long * 24)]
+
+
+def _load(name: str):
+    path = ctypes.util.find_library(name)
+    if path is None:
+        raise OSError(f"lib{name} not found")
+    return ctypes.cdll.LoadLibrary(path)
+
+
+_xlib = None
+_xtst = None
+
+
+def xlib():
+    """
+    Load libX11 once and declare the functions used here.
+    """
+    global _xlib
+    if _xlib is None:
+        lib = _load('X11')
+        lib.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        lib.XOpenDisplay.restype = ctypes.c_void_p
+        lib.XCloseDisplay.argtypes = [ctypes.c_void_p]
+        lib.XDefaultScreen.argtypes = [ctypes.c_void_p]
+        lib.XDefaultScreen.restype = ctypes.c_int
+        lib.XRootWindow.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        lib.XRootWindow.restype = ctypes.c_ulong
+        lib.XDisplayWidth.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        lib.XDisplayHeight.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        lib.XConnectionNumber.argtypes = [ctypes.c_void_p]
+        lib.XGetImage.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.c_int, ctypes.c_int,
+                                  ctypes.c_uint, ctypes.c_uint, ctypes.c_ulong, ctypes.c_int]
+        lib.XGetImage.restype = ctypes.POINTER(XImage)
+        lib.XDestroyImage.argtypes = [ctypes.POINTER(XImage)]
+        lib.XQueryPointer.argtypes = [ctypes.c_void_p, ctypes.c_ulong,
+                                      ctypes.POINTER(ctypes.c_ulong), ctypes.POINTER(ctypes.c_ulong),
+                                      ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_int),
+                                      ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_int),
+                                      ctypes.POINTER(ctypes.c_uint)]
+        lib.XPending.argtypes = [ctypes.c_void_p]
+        lib.XNextEvent.argtypes = [ctypes.c_void_p, ctypes.POINTER(XEvent)]
+        lib.XFlush.argtypes = [ctypes.c_void_p]
+        lib.XSync.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        lib.XKeysymToKeycode.argtypes = [ctypes.c_void_p, ctypes.c_ulong]
+        lib.XKeysymToKeycode.restype = ctypes.c_ubyte
+        _xlib = lib
+    return _xlib
+
+
+def xtst():
+    global _xtst
+    if _xtst is None:
+        lib = _load('Xtst')
+        lib.XTestFakeMotionEvent.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_ulong]
+        lib.XTestFakeButtonEvent.argtypes = [ctypes.c_void_p, ctypes.c_uint, ctypes.c_int, ctypes.c_ulong]
+        lib.XTestFakeKeyEvent.argtypes = [ctypes.c_void_p, ctypes.c_uint, ctypes.c_int, ctypes.c_ulong]
+        lib.XTestQueryExtension.argtypes = [ctypes.c_void_p, ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_int),
+                                            ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_int)]
+        _xtst = lib
+    return _xtst
+
+
+class X11Display:
+    """
+    One Xlib connection to the display (DISPLAY env var unless a name is given).
+    Not thread safe, give every thread its own instance.
+    """
+
+    def __init__(self, name: Optional[str] = None) -> None:
+        self.lib = xlib()
+        self.dpy = self.lib.XOpenDisplay(name.encode() if name else None)
+        if not self.dpy:
+            raise OSError(f"Cannot open X display {name or '(DISPLAY)'}")
+        self.screen = self.lib.XDefaultScreen(self.dpy)
+        self.root = self.lib.XRootWindow(self.dpy, self.screen)
+        self.width = self.lib.XDisplayWidth(self.dpy, self.screen)
+        self.height = self.lib.XDisplayHeight(self.dpy, self.screen)
+        self.fd = self.lib.XConnectionNumber(self.dpy)
+
+    def get_image(self, x: int, y: int, width: int, height: int) -> bytes:
+        """
+        Read a BGRA block of the root window with XGetImage (tightly packed rows).
+        """
+        image = self.lib.XGetImage(self.dpy, self.root, x, y, width, height, ALL_PLANES, Z_PIXMAP)
+        if not image:
+            raise OSError(f"XGetImage failed for ({x}, {y}, {width}, {height})")
+        try:
+            img = image.contents
+            row = width * 4
+            if img.bytes_per_line == row:
+                return ctypes.string_at(img.data, row * height)
+            base = ctypes.cast(img.data, ctypes.c_void_p).value
+            return b"".join(ctypes.string_at(base + i * img.bytes_per_line, row) for i in range(height))
+        finally:
+            self.lib.XDestroyImage(image)
+
+    def pixel(self, x: int, y: int) -> Tuple[int, int, int]:
+        """
+        RGB colour of one screen pixel.
+        """
+        b, g, r, _ = self.get_image(x, y, 1, 1)
+        return (r, g, b)
+
+    def pointer(self) -> Tuple[int, int, int]:
+        """
+        Current pointer position and button/modifier mask.
+        """
+        root_ret, child_ret = ctypes.c_ulong(), ctypes.c_ulong()
+        rx, ry, wx, wy = ctypes.c_int(), ctypes.c_int(), ctypes.c_int(), ctypes.c_int()
+        mask = ctypes.c_uint()
+        self.lib.XQueryPointer(self.dpy, self.root, ctypes.byref(root_ret), ctypes.byref(child_ret),
+                               ctypes.byref(rx), ctypes.byref(ry), ctypes.byref(wx), ctypes.byref(wy),
+                               ctypes.byref(mask))
+        return rx.value, ry.value, mask.value
+
+    def close(self) -> None:
+        if self.dpy:
+            self.lib.XCloseDisplay(self.dpy)
+            self.dpy = None
@@ -1,18 +1,281 @@
 import mss
 import numpy as np
-import win32api, win32con
 import time
 from collections import deque
+from typing import Optional, Tuple
+from CalibrationCache import CalibrationCache
+from GameLocator import GameLocator
+from CaptureMultiplexer import MssCapture
+from InputBackend import DeferredInput
+from DetectionKernels import white_mask
+from MetricsStore import MetricsSession, NullMetrics
+from LatencyStats import LoopStats
+from PerfMode import JitterRecorder
+
+try:
+    import win32api
+except ImportError:
+    win32api = None  # Flash detection and clicking through input_backend still work without it (benchmarks)
+
+class FlashSampler:
+    """
+    Edge-triggered flash detector for a set of tiles.
+
+    Each update takes one brightness sample per tile. A tile turns on when it
+    stays above on_threshold for `debounce` samples and off when it stays below
+    off_threshold for `debounce` samples (hysteresis), so a tile flashing twice
+    in a row gives two rising edges. Edge times are taken from the first sample
+    of the transition, not the sample that confirmed it.
+    """
+
+    def __init__(self, num_tiles: int, on_threshold: int = 240, off_threshold: int = 200,
+                 debounce: int = 2, gap_factor: float = 1.8) -> None:
+        self.num_tiles = num_tiles
+        self.on_threshold = on_threshold
+        self.off_threshold = off_threshold
+        self.debounce = debounce
+        self.gap_factor = gap_factor  # Interval this many times the median counts as a missed flash
+        self.reset()
+
+    def reset(self, brightness: Optional[np.ndarray] = None) -> None:
+        """
+        Forget all state, ready for the next playback.
+        Tiles that are bright in `brightness` start as already on (no rising edge).
+        """
+        self.state = np.zeros(self.num_tiles, dtype=bool)  # Debounced on/off state
+        if brightness is not None:
+            self.state = brightness >= self.on_threshold
+        self.pending = np.zeros(self.num_tiles, dtype=np.int32)  # Samples disagreeing with state
+        self.pending_since = np.zeros(self.num_tiles)  # Time of the first disagreeing sample
+        self.on_since = np.zeros(self.num_tiles)
+        self.flashes = []  # [tile, start, duration or None] in rising-edge order
+        self.rising_edges = 0
+        self.falling_edges = 0
+        self.samples = 0
+        self.last_sample = 0.0
+        self.max_sample_gap = 0.0
+
+    def update(self, brightness: np.ndarray, now: float) -> list:
+        """
+        Feed one brightness sample per tile (minimum RGB channel).
+        Returns the tiles whose flash started with this sample.
+        """
+        if self.samples:
+            self.max_sample_gap = max(self.max_sample_gap, now - self.last_sample)
+        self.samples += 1
+        self.last_sample = now
+
+        disagree = np.where(self.state, brightness < self.off_threshold, brightness >= self.on_threshold)
+        started = disagree & (self.pending == 0)
+        self.pending_since[started] = now
+        self.pending = np.where(disagree, self.pending + 1, 0)
+
+        flips = np.flatnonzero(self.pending >= self.debounce)
+        if flips.size == 0:
+            return []
+        self.pending[flips] = 0
+
+        rising = []
+        for tile in flips:
+            tile = int(tile)
+            edge_time = float(self.pending_since[tile])
+            if self.state[tile]:
+                self.falling_edges += 1
+                for flash in reversed(self.flashes):
+                    if flash[0] == tile and flash[2] is None:
+                        flash[2] = edge_time - flash[1]
+                        break
+            else:
+                self.rising_edges += 1
+                self.on_since[tile] = edge_time
+                self.flashes.append([tile, edge_time, None])
+                rising.append(tile)
+            self.state[tile] = not self.state[tile]
+        # Keep the sequence in flash order when several tiles confirm on the same sample
+        rising.sort(key=lambda t: self.on_since[t])
+        return rising
+
+    def any_on(self) -> bool:
+        return bool(self.state.any())
+
+    def sequence(self) -> list:
+        return [tile for tile, _, _ in self.flashes]
+
+    def durations(self) -> list:
+        return [duration for _, _, duration in self.flashes if duration is not None]
+
+    def intervals(self) -> list:
+        starts = [start for _, start, _ in self.flashes]
+        return [b - a for a, b in zip(starts, starts[1:])]
+
+    def suspected_misses(self) -> list:
+        """
+        Indices i where a flash was probably missed between flash i and i + 1:
+        the gap between their starts is much longer than the usual cadence, or
+        flash i lasted much longer than usual (a repeat merged into one flash).
+        """
+        intervals = self.intervals()
+        durations = self.durations()
+        suspects = set()
+        if len(intervals) >= 2:
+            typical = float(np.median(intervals))
+            suspects.update(i for i, gap in enumerate(intervals) if gap > typical * self.gap_factor)
+        if len(durations) >= 2:
+            typical = float(np.median(durations))
+            suspects.update(i for i, (_, _, d) in enumerate(self.flashes)
+                            if d is not None and d > typical * self.gap_factor)
+        return sorted(suspects)
+
+    def idle_timeout(self, default: float) -> float:
+        """
+        How long to wait after the last flash before the playback counts as finished.
+        """
+        intervals = self.intervals()
+        if len(intervals) >= 2:
+            return min(default, float(np.median(intervals)) * 2.5)
+        return default
+
+    def report(self) -> None:
+        durations = self.durations()
+        print(f"Flashes: {len(self.flashes)} ({self.rising_edges} rising / {self.falling_edges} falling edges), "
+              f"{self.samples} samples, worst sample gap {self.max_sample_gap * 1000:.1f}ms")
+        if durations:
+            print(f"Flash duration: min {min(durations) * 1000:.0f}ms, "
+                  f"median {float(np.median(durations)) * 1000:.0f}ms, max {max(durations) * 1000:.0f}ms")
+        for i in self.suspected_misses():
+            print(f"WARNING: probable missed flash between step {i + 1} and step {i + 2}")
+
+
+def feedback_results(clicks: list, flashes: list, timeout: float) -> list:
+    """
+    Match clicks [(tile, sent, observable)] with the flashes a FlashSampler saw
+    ([tile, start, duration]). A click is confirmed (True) by a flash of its
+    tile starting within `timeout` after it was sent, each flash confirming one
+    click. Unconfirmed clicks are dropped (False), or unknown (None) when the
+    tile was still lit from an earlier click and a new flash couldn't show.
+    """
+    used = set()
+    results = []
+    for tile, sent, observable in clicks:
+        match = next((i for i, (flashed, start, _) in enumerate(flashes)
+                      if i not in used and flashed == tile and sent <= start <= sent + timeout), None)
+        if match is not None:
+            used.add(match)
+            results.append(True)
+        else:
+            results.append(False if observable else None)
+    return results
+
+
+class PacingTuner:
+    """
+    Finds the fastest click pacing the game still takes.
+
+    Pacing is `start` (hold, gap) times a scale. Every level whose clicks all
+    flashed back counts as clean; after `confirmations` clean levels the scale
+    shrinks by `shrink`. A dropped click marks the scale as too fast and from
+    then on the next try is the geometric middle of the fastest clean scale
+    and the slowest failing one, until those are within `precision` of each
+    other (or the pacing is down to nothing and still clean).
+    """
+
+    def __init__(self, start: Tuple[float, float] = (0.05, 0.05), shrink: float = 0.6, confirmations: int = 2,
+                 precision: float = 1.2, floor: float = 0.0005) -> None:
+        self.start = start
+        self.shrink = shrink
+        self.confirmations = confirmations
+        self.precision = precision
+        self.floor = floor  # Intervals shorter than this are sent as no wait at all
+        self.scale = 1.0
+        self.safe: Optional[float] = None  # Smallest scale that passed
+        self.failed: Optional[float] = None  # Largest scale that dropped a click
+        self.clean = 0
+        self.levels = 0
+        self.dropped = 0
+
+    def pacing(self, scale: Optional[float] = None) -> Tuple[float, float]:
+        scale = self.scale if scale is None else scale
+        return tuple(value * scale if value * scale >= self.floor else 0.0 for value in self.start)
+
+    @property
+    def done(self) -> bool:
+        if self.safe is None:
+            return False
+        if self.failed is not None:
+            return self.safe / self.failed <= self.precision
+        return not any(self.pacing(self.safe))
+
+    def record(self, results: list) -> None:
+        """
+        Feedback of one level's clicks (from feedback_results), moves the scale.
+        """
+        self.levels += 1
+        dropped = results.count(False)
+        self.dropped += dropped
+        if dropped:
+            self.failed = max(self.failed or 0.0, self.scale)
+            self.clean = 0
+            if self.safe is None:
+                self.scale /= self.shrink  # Even the start was too fast
+                return
+        elif True not in results:
+            return  # Nothing could be confirmed either way
+        else:
+            self.clean += 1
+            if self.clean < self.confirmations:
+                return
+            self.clean = 0
+            self.safe = self.scale if self.safe is None else min(self.safe, self.scale)
+        if self.failed is None:
+            self.scale = self.safe * self.shrink
+        else:
+            self.scale = (self.safe * self.failed) ** 0.5
+
+    def report(self) -> None:
+        hold, gap = self.pacing(self.safe) if self.safe is not None else (float('nan'), float('nan'))
+        print(f"Pacing tuner: {self.levels} levels, {self.dropped} dropped clicks, fastest safe hold "
+              f"{hold * 1000:.1f}ms gap {gap * 1000:.1f}ms" + ("" if self.done else " (not finished)"))
+
 
 class PixelChecker:
-    def __init__(self, num_coords: int = 9) -> None:
+    def __init__(self, num_coords: int = 9, capture=None, input_backend=None) -> None:
         self.num_coords = num_coords
         self.coords = []  # List of (x, y) coordinates
-        self.sct = mss.mss()
+        self.sct = mss.mss() if capture is None else None  # Locator and cache open their own when None
+        self.capture = capture if capture is not None else MssCapture(self.sct)  # Anything with grab(region)
+        self.input = input_backend if input_backend is not None else DeferredInput()  # Mouse and keyboard events
         self.white_sequence = deque()  # Queue of indices of white coordinates
         self.last_white_detection = 0.0
+        self.tile_region = None  # Bounding box of all coordinates, captured in one grab
+        self.tile_index = None  # (rows, cols) of each coordinate inside that capture
+        self.levels_executed = 0
+        self.metrics = NullMetrics()  # Set by monitor_flashes
+        self.click_hold = 0.05  # Seconds between button down and up
+        self.click_gap = 0.0  # Seconds between clicks
+        self.return_cursor = True  # Put the pointer back once the sequence is clicked
+        self.tuner: Optional[PacingTuner] = None  # Tunes the two above while playing, see tune_pacing
+        self.feedback_timeout = 0.25  # How long after a click its tile may take to flash back
+        self.cache: Optional[CalibrationCache] = None
+        self.stats = LoopStats("Flash loop")  # Sample period, first sample of a flash to its edge, clicks
 
-    def collect_coordinates(self) -> list:
+    def collect_coordinates(self, timeout: float = 10.0) -> list:
+        """
+        Locate the 3x3 board from a full-screen capture and use the tile centres.
+        Falls back to registering the points by hand if the board cannot be found.
+        """
+        grid = int(round(self.num_coords ** 0.5))
+        locator = GameLocator(self.sct)
+        if (grid * grid == self.num_coords and
+                locator.wait_for_play_area(timeout=timeout) is not None and
+                locator.board is not None):
+            self.coords = locator.sequence_tile_centers(grid)
+            print(f"Board located at {locator.board}, using {len(self.coords)} tile centres")
+            return self.coords
+        
+        print("Could not locate the board automatically.")
+        return self.register_coordinates()
+
+    def register_coordinates(self) -> list:
         """
         Collect coordinates using mouse position upon 'C' key press.
         Prompts the user to register the required number of points.
@@ -35,17 +298,62 @@ class PixelChecker:
         print("All coordinates registered!")
         return self.coords
 
+    def load_or_collect_coordinates(self) -> list:
+        """
+        Reuse the cached tile coordinates if they still match the screen,
+        otherwise register them by hand and save them for the next run.
+        """
+        cache = self.cache = CalibrationCache("SequenceMemory", self.sct)
+        entry = cache.load_verified()
+        if entry is not None and len(entry["coords"]) == self.num_coords:
+            self.coords = [tuple(c) for c in entry["coords"]]
+            self.apply_pacing(entry.get("pacing"))
+            return self.coords
+
+        previous = cache.load() or {}
+        input("Press Enter, then switch to the Sequence Memory board...")
+        self.collect_coordinates()
+        data = {"coords": self.coords}
+        if "pacing" in previous:  # Pacing belongs to the machine, not the layout
+            data["pacing"] = previous["pacing"]
+            self.apply_pacing(previous["pacing"])
+        cache.save(data, self.coords)
+        return self.coords
+
+    def apply_pacing(self, pacing: Optional[dict]) -> None:
+        if pacing:
+            self.click_hold, self.click_gap = pacing["hold"], pacing["gap"]
+            print(f"Using tuned click pacing: hold {self.click_hold * 1000:.1f}ms, gap {self.click_gap * 1000:.1f}ms")
+
+    def tune_pacing(self, tuner: Optional[PacingTuner] = None) -> None:
+        """
+        Tune the click pacing while playing: every executed sequence is clicked
+        with the tuner's pacing and checked against the tiles' click flashes.
+        The result is saved with the calibration once the tuner is done.
+        """
+        self.tuner = tuner or PacingTuner()  # From the slow default, a saved pacing may be too fast by now
+        self.click_hold, self.click_gap = self.tuner.pacing()
+
+    def finish_tuning(self) -> None:
+        tuner, self.tuner = self.tuner, None
+        tuner.report()
+        if tuner.safe is None:
+            self.click_hold, self.click_gap = tuner.start
+            return
+        self.click_hold, self.click_gap = tuner.pacing(tuner.safe)
+        if tuner.done and self.cache is not None:
+            self.cache.update({"pacing": {"hold": self.click_hold, "gap": self.click_gap, "tuned_at": time.time()}})
+            print("Click pacing saved")
+
     def is_pixel_white(self, x: int, y: int, threshold: int = 240) -> bool:
         """
         Check if the pixel at (x, y) is approximately white.
         """
         region = {'top': y, 'left': x, 'width': 1, 'height': 1}
-        screenshot = self.sct.grab(region)
-        img = np.array(screenshot)
-        b, g, r = img[0, 0, 0], img[0, 0, 1], img[0, 0, 2]
+        img = self.capture.grab(region)
         
         # Check if the pixel is approximately white
-        return all(channel >= threshold for channel in (r, g, b))
+        return bool(white_mask(img[0], threshold)[0])
 
     def check_all_coordinates(self) -> bool:
         """
@@ -64,12 +372,9 @@ class PixelChecker:
         """
         Simulate a mouse click at the specified (x, y) position.
         """
-        old_x, old_y = win32api.GetCursorPos()  # Save current position
-        win32api.SetCursorPos((x, y))
-        win32api.mouse_event(win32con.MOUSEEVENTF_LEFTDOWN, x, y, 0, 0)
-        time.sleep(0.05)
-        win32api.mouse_event(win32con.MOUSEEVENTF_LEFTUP, x, y, 0, 0)
-        win32api.SetCursorPos((old_x, old_y)) # make Optional: move mouse back to original position
+        sent = time.perf_counter_ns()
+        self.input.click(x, y, hold=self.click_hold)
+        self.stats["dispatch"].record(time.perf_counter_ns() - sent)
         print(f"Clicked at ({x}, {y})")
 
     def execute_white_sequence(self) -> None:
@@ -77,65 +382,160 @@ class PixelChecker:
         Click each coordinate in the white sequence in order, then clear the sequence.
         """
         print(f"Executing sequence of {len(self.white_sequence)} clicks...")
+        old_x, old_y = self.input.cursor_pos()  # Save current position
         sequence_copy = list(self.white_sequence)
         for i, coord_index in enumerate(sequence_copy):
             x, y = self.coords[coord_index]
             print(f"Clicking sequence step {i+1}: Coord {coord_index+1} at ({x}, {y})")
             self.click_at(x, y)
-            # time.sleep(0.2)  # Short delay between clicks
+            if self.click_gap > 0 and i + 1 < len(sequence_copy):
+                time.sleep(self.click_gap)
+        if self.return_cursor:
+            self.input.move(old_x, old_y)
         
         # Clear the sequence after execution
         self.white_sequence.clear()
         print("Sequence executed and cleared")
 
-    def monitor_coordinates(self, interval: float = 0.1, timeout: float = 3.0) -> None:
+    def execute_watched_sequence(self, sampler: FlashSampler) -> list:
         """
-        Continuously monitor coordinates for changes to white.
-        Executes the recorded click sequence if no new white pixels are detected within the timeout.
+        Click the white sequence like execute_white_sequence, sampling the tiles
+        between clicks (at least once, for the click gap) and for
+        feedback_timeout after the last one. Returns feedback_results per click.
         """
-        print(f"Monitoring coordinates. Will click sequence if no new white pixels for {timeout} seconds.")
+        old_x, old_y = self.input.cursor_pos()
+        sampler.reset(self.capture_tiles())
+        clicks = []
+        last_click = {}
+        for coord_index in self.white_sequence:
+            # A new flash can only show once the tile's flash from our previous click on it is over
+            previous = last_click.get(coord_index)
+            observable = previous is None or any(tile == coord_index and start >= previous and duration is not None
+                                                 for tile, start, duration in sampler.flashes)
+            x, y = self.coords[coord_index]
+            sent = time.perf_counter()
+            self.input.click(x, y, hold=self.click_hold)
+            self.stats["dispatch"].record_seconds(time.perf_counter() - sent)
+            clicks.append((coord_index, sent, observable))
+            last_click[coord_index] = sent
+            deadline = time.perf_counter() + self.click_gap
+            while True:
+                now = time.perf_counter()
+                sampler.update(self.capture_tiles(), now)
+                if now >= deadline:
+                    break
+        deadline = time.perf_counter() + self.feedback_timeout
+        while time.perf_counter() < deadline:
+            sampler.update(self.capture_tiles(), time.perf_counter())
+        if self.return_cursor:
+            self.input.move(old_x, old_y)
+        self.white_sequence.clear()
+        return feedback_results(clicks, sampler.flashes, self.feedback_timeout)
+
+    def capture_region(self) -> dict:
+        """
+        Bounding box of all coordinates, for registering with a shared capture.
+        """
+        if self.tile_region is None:
+            xs = np.array([x for x, _ in self.coords])
+            ys = np.array([y for _, y in self.coords])
+            left, top = int(xs.min()), int(ys.min())
+            self.tile_region = {'top': top, 'left': left,
+                                'width': int(xs.max()) - left + 1, 'height': int(ys.max()) - top + 1}
+            self.tile_index = (ys - top, xs - left)
+        return self.tile_region
+
+    def capture_tiles(self) -> np.ndarray:
+        """
+        Capture the bounding box of all coordinates once and return the
+        per-tile brightness (minimum of the RGB channels).
+        """
+        img = self.capture.grab(self.capture_region())
+        return img[self.tile_index[0], self.tile_index[1], :3].min(axis=1)
+
+    def monitor_flashes(self, timeout: float = 3.0, metrics=None) -> None:
+        """
+        Sample all tiles at capture rate with the edge-triggered FlashSampler and
+        execute the sequence once playback has gone quiet.
+        The length of every executed sequence is recorded to metrics (MetricsStore.MetricsSession),
+        sample, detection and click percentiles are printed between sequences.
+        """
+        self.metrics = metrics or NullMetrics()
+        print(f"Monitoring tiles at capture rate. Will click sequence after playback goes quiet (max {timeout} seconds).")
         print("Press Ctrl+C to exit.")
-        previous_states = [False] * len(self.coords)
+        sampler = FlashSampler(len(self.coords))
+        jitter = JitterRecorder(self.stats["frame"])
         try:
             while True:
-                any_new_white = False
-                for i, (x, y) in enumerate(self.coords):
-                    is_white_now = self.is_pixel_white(x, y)
-                    if not previous_states[i] and is_white_now:
-                        print(f"Coord {i+1} is now white")
-                        self.white_sequence.append(i)
-                        self.last_white_detection = time.time()
-                        any_new_white = True
-                    
-                    previous_states[i] = is_white_now # Update the previous state
-                
-                if (not any_new_white and 
-                    self.white_sequence and # checks if there are any white coordinates
-                    time.time() - self.last_white_detection > timeout):
-                    self.execute_white_sequence()
-                time.sleep(interval)
+                jitter.tick()
+                if self.monitor_tick(sampler, time.perf_counter(), timeout):
+                    jitter.pause()  # Clicking the sequence is not a sample gap
+                    self.stats.tick()
         except KeyboardInterrupt:
             print("\nMonitoring stopped.")
+            if self.tuner is not None:
+                self.finish_tuning()  # Keeps the fastest safe pacing found so far for this run, unsaved
+        self.stats.report()
+        self.stats.save(self.metrics)
+
+    def monitor_tick(self, sampler: FlashSampler, now: float, timeout: float = 3.0) -> bool:
+        """
+        One iteration of monitor_flashes: sample every tile from one capture,
+        queue the flashes that started and execute the sequence if playback
+        has gone quiet. Returns True when a sequence was executed.
+        """
+        for tile in sampler.update(self.capture_tiles(), now):
+            self.stats["detect"].record_seconds(now - sampler.on_since[tile])  # Debounce, in samples' time
+            print(f"Coord {tile+1} flashed")
+            self.white_sequence.append(tile)
+            self.last_white_detection = now
+
+        if not (self.white_sequence and not sampler.any_on() and
+                now - self.last_white_detection > sampler.idle_timeout(timeout)):
+            return False
+        sampler.report()
+        self.levels_executed += 1
+        self.metrics.record("sequence_length", len(self.white_sequence), level=self.levels_executed,
+                            suspected_misses=len(sampler.suspected_misses()))
+        if self.tuner is None:
+            self.execute_white_sequence()
+        else:
+            pacing = (self.click_hold, self.click_gap)
+            results = self.execute_watched_sequence(FlashSampler(len(self.coords)))
+            print(f"Pacing hold {pacing[0] * 1000:.1f}ms gap {pacing[1] * 1000:.1f}ms: "
+                  f"{results.count(True)} clicks confirmed, {results.count(False)} dropped")
+            self.metrics.record("dropped_clicks", results.count(False), level=self.levels_executed,
+                                hold_ms=pacing[0] * 1000, gap_ms=pacing[1] * 1000)
+            self.tuner.record(results)
+            self.click_hold, self.click_gap = self.tuner.pacing()
+            if self.tuner.done:
+                self.finish_tuning()
+        # Click feedback may still be showing, don't count it as the next playback
+        sampler.reset(self.capture_tiles())
+        return True
 
 def main() -> None:
     checker = PixelChecker()
     print("===== Sequence Memory AI =====")
     print("This tool will remember which coordinates turn white and then click them in order.")
-    print("1. Register 9 coordinates to monitor (mouse over + 'C' key)")
-    print("2. The program monitors these spots for white pixels")
-    print("3. After 3 seconds with no new white pixels, clicks will be performed in sequence")
+    print("1. Locate the 9 tiles automatically (or register them with mouse over + 'C' key)")
+    print("2. The program samples these spots for white flashes as fast as it can capture")
+    print("3. Once the playback goes quiet, clicks will be performed in sequence")
     print("4. Press Ctrl+C to exit (probably)")
     print("====================================")
-    input("Press Enter to begin coordinate registration...")
     
-    checker.collect_coordinates()
+    checker.load_or_collect_coordinates()
+    if input("Tune the click pacing while playing? A dropped click ends the game (y/N): ").strip().lower() == "y":
+        checker.tune_pacing()
     
     print("\nChecking coordinates:")
     checker.check_all_coordinates()
     
     print("\nStarting monitoring mode with automatic sequence execution.")
-    print("If no new white pixels are detected for 3 seconds, the recorded sequence will be clicked in order.")
-    checker.monitor_coordinates(interval=0.1, timeout=3.0)
+    print("Once no new flashes show up (3 seconds at most), the recorded sequence will be clicked in order.")
+    params = {"timeout": 3.0, "hold": checker.click_hold, "gap": checker.click_gap, "tuning": checker.tuner is not None}
+    with MetricsSession("SequenceMemory", params=params) as metrics:
+        checker.monitor_flashes(timeout=3.0, metrics=metrics)
 
 if __name__ == "__main__":
     main()